@@ -2,6 +2,7 @@
 Custom JWT authentication for NextCRM that uses HttpOnly cookies.
 """
 
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import UntypedToken
@@ -33,6 +34,53 @@ class CookieJWTAuthentication(JWTAuthentication):
             # This allows endpoints with @permission_classes([AllowAny]) to work
             return None
 
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of ``authenticate`` for ASGI views. Reads the token
+        from the cookie or the Authorization header and loads the user with
+        the async ORM. Returns None instead of raising for any invalid token.
+        """
+        raw_token = request.COOKIES.get('access_token')
+
+        if raw_token is None:
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+        try:
+            validated_token = self.get_validated_token(raw_token)
+            user = await self.aget_user(validated_token)
+            return (user, validated_token)
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+
+    async def aget_user(self, validated_token):
+        """
+        Async counterpart of ``get_user``. The profile is fetched in the same
+        query because most read endpoints serialize it.
+        """
+        from rest_framework_simplejwt.settings import api_settings
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        try:
+            user = await self.user_model.objects.select_related('profile').aget(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        return user
+
     def get_validated_token(self, raw_token):
         """
         Validates an encoded JSON web token and returns a validated token
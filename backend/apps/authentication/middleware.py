@@ -4,20 +4,44 @@ Authentication middleware for security and audit logging.
 
 import json
 import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
 from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.core.cache import cache
-from .models import SecurityLog, AuditLog
+from .detection import arecord_alert, awrite_security_log, match_query, record_alert, write_security_log
+from .models import AuditLog
+
+
+async def aget_authenticated_user(request):
+    """
+    Resolve request.user from async code. Views that authenticated the
+    request already replaced the lazy object; otherwise load the session
+    user through request.auser() instead of the sync ORM.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        user = await request.auser()
+    if user is not None and user.is_authenticated:
+        return user
+    return None
 
 
 class SecurityLoggingMiddleware:
     """Middleware for security event logging and rate limiting"""
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Get client IP
         ip_address = self.get_client_ip(request)
         
@@ -32,8 +56,26 @@ class SecurityLoggingMiddleware:
         response = self.get_response(request)
         
         # Log suspicious activity
-        if self.is_suspicious_activity(request, response):
-            self.log_suspicious_activity(request, response)
+        rule = self.detect_suspicious_activity(request, response)
+        if rule is not None:
+            self.log_suspicious_activity(request, response, rule)
+        
+        return response
+
+    async def __acall__(self, request):
+        ip_address = self.get_client_ip(request)
+        
+        if await self.ais_rate_limited(ip_address):
+            return JsonResponse(
+                {'error': 'Rate limit exceeded. Please try again later.'},
+                status=429
+            )
+        
+        response = await self.get_response(request)
+        
+        rule = self.detect_suspicious_activity(request, response)
+        if rule is not None:
+            await self.alog_suspicious_activity(request, response, rule)
         
         return response
 
@@ -46,69 +88,107 @@ class SecurityLoggingMiddleware:
             ip = request.META.get('REMOTE_ADDR')
         return ip
 
-    def is_rate_limited(self, ip_address):
-        """Check if IP is rate limited"""
+    def get_rate_limit(self):
+        """Return the per-minute request budget, or None when rate limiting is disabled"""
         from django.conf import settings
         
         # Skip rate limiting if disabled in settings
         if hasattr(settings, 'RATELIMIT_ENABLE') and not settings.RATELIMIT_ENABLE:
+            return None
+        
+        # Allow more requests in development
+        return 500 if settings.DEBUG else 100  # 500 requests per minute in debug mode
+
+    def is_rate_limited(self, ip_address):
+        """Check if IP is rate limited"""
+        max_requests = self.get_rate_limit()
+        if max_requests is None:
             return False
             
         cache_key = f"rate_limit_{ip_address}"
         requests = cache.get(cache_key, 0)
         
-        # Allow more requests in development
-        max_requests = 500 if settings.DEBUG else 100  # 500 requests per minute in debug mode
-        
         if requests >= max_requests:
             return True
         
         cache.set(cache_key, requests + 1, 60)  # 1 minute window
         return False
 
-    def is_suspicious_activity(self, request, response):
-        """Detect suspicious activity patterns"""
-        # Multiple failed login attempts
-        if (request.path.startswith('/api/auth/') and 
-            response.status_code in [401, 403]):
-            return True
+    async def ais_rate_limited(self, ip_address):
+        """Async counterpart of is_rate_limited"""
+        max_requests = self.get_rate_limit()
+        if max_requests is None:
+            return False
+            
+        cache_key = f"rate_limit_{ip_address}"
+        requests = await cache.aget(cache_key, 0)
         
-        # SQL injection attempts
-        suspicious_patterns = ['union', 'select', 'drop', 'insert', '--', ';']
-        query_string = request.GET.urlencode().lower()
-        if any(pattern in query_string for pattern in suspicious_patterns):
+        if requests >= max_requests:
             return True
         
+        await cache.aset(cache_key, requests + 1, 60)  # 1 minute window
         return False
 
-    def log_suspicious_activity(self, request, response):
-        """Log suspicious activity"""
-        user = request.user if request.user.is_authenticated else None
-        ip_address = self.get_client_ip(request)
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        
-        SecurityLog.objects.create(
-            user=user,
-            event_type='SUSPICIOUS_ACTIVITY',
-            ip_address=ip_address,
-            user_agent=user_agent,
-            metadata={
+    def detect_suspicious_activity(self, request, response):
+        """Name of the suspicious activity rule the request matches, or None (see detection.py)"""
+        # Multiple failed login attempts
+        if (response.status_code in (401, 403) and
+            request.path.startswith('/api/auth/')):
+            return 'auth_failure'
+        
+        # SQL injection, path traversal and script injection attempts
+        return match_query(request.META.get('QUERY_STRING', ''))
+
+    def get_suspicious_activity_fields(self, request, response, rule, repeats, user):
+        """Build the SecurityLog fields for a suspicious request"""
+        return {
+            'user': user,
+            'event_type': 'SUSPICIOUS_ACTIVITY',
+            'ip_address': self.get_client_ip(request),
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+            'metadata': {
+                'rule': rule,
                 'path': request.path,
                 'method': request.method,
                 'status_code': response.status_code,
-                'query_params': dict(request.GET),
+                'query_string': request.META.get('QUERY_STRING', '')[:1024],
+                # Earlier alerts of this rule from the IP in the window, mostly not logged
+                'repeats': repeats,
                 'timestamp': timezone.now().isoformat(),
-            }
-        )
+            },
+        }
+
+    def log_suspicious_activity(self, request, response, rule):
+        """Log suspicious activity, unless it repeats an alert logged recently"""
+        repeats = record_alert(self.get_client_ip(request), rule)
+        if repeats is None:
+            return
+        user = request.user if request.user.is_authenticated else None
+        write_security_log(self.get_suspicious_activity_fields(request, response, rule, repeats, user))
+
+    async def alog_suspicious_activity(self, request, response, rule):
+        """Async counterpart of log_suspicious_activity"""
+        repeats = await arecord_alert(self.get_client_ip(request), rule)
+        if repeats is None:
+            return
+        user = await aget_authenticated_user(request)
+        await awrite_security_log(self.get_suspicious_activity_fields(request, response, rule, repeats, user))
 
 
 class AuditLogMiddleware:
     """Middleware for audit logging of business operations"""
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Skip audit logging for certain paths
         if self.should_skip_audit(request):
             return self.get_response(request)
@@ -122,11 +202,32 @@ class AuditLogMiddleware:
         # Log audit trail for successful operations
         if (request.user.is_authenticated and 
             response.status_code in [200, 201, 204] and
-            request.method in ['POST', 'PUT', 'PATCH', 'DELETE']):
+            request.method in ['POST', 'PUT', 'PATCH', 'DELETE'] and
+            not self.already_audited(request)):
             self.create_audit_log(request, response, original_data)
         
         return response
 
+    async def __acall__(self, request):
+        if self.should_skip_audit(request):
+            return await self.get_response(request)
+        
+        original_data = self.get_request_data(request)
+        
+        response = await self.get_response(request)
+        
+        # Only write methods are audited, so read requests never resolve the user here
+        if (response.status_code in [200, 201, 204] and
+            request.method in ['POST', 'PUT', 'PATCH', 'DELETE'] and
+            not self.already_audited(request)):
+            user = await aget_authenticated_user(request)
+            if user is not None:
+                await AuditLog.objects.acreate(
+                    **self.get_audit_log_fields(request, original_data, user)
+                )
+        
+        return response
+
     def should_skip_audit(self, request):
         """Check if request should be skipped from audit logging"""
         skip_paths = [
@@ -139,6 +240,10 @@ class AuditLogMiddleware:
         ]
         return any(request.path.startswith(path) for path in skip_paths)
 
+    def already_audited(self, request):
+        """Views that write their own, more specific audit entry set request.audit_logged"""
+        return getattr(request, 'audit_logged', False)
+
     def get_request_data(self, request):
         """Extract request data for audit logging"""
         try:
@@ -150,7 +255,12 @@ class AuditLogMiddleware:
 
     def create_audit_log(self, request, response, original_data):
         """Create audit log entry"""
-        user = request.user
+        AuditLog.objects.create(
+            **self.get_audit_log_fields(request, original_data, request.user)
+        )
+
+    def get_audit_log_fields(self, request, original_data, user):
+        """Build the AuditLog fields for a business operation"""
         ip_address = self.get_client_ip(request)
         
         # Determine action
@@ -172,16 +282,15 @@ class AuditLogMiddleware:
             if len(path_parts) >= 4 and path_parts[3].isdigit():
                 object_id = path_parts[3]
         
-        # Create audit log
-        AuditLog.objects.create(
-            user=user,
-            action=action,
-            model_name=model_name,
-            object_id=object_id,
-            object_repr=f"{model_name} {object_id}" if object_id else model_name,
-            changes=original_data,
-            ip_address=ip_address,
-        )
+        return {
+            'user': user,
+            'action': action,
+            'model_name': model_name,
+            'object_id': object_id,
+            'object_repr': f"{model_name} {object_id}" if object_id else model_name,
+            'changes': original_data,
+            'ip_address': ip_address,
+        }
 
     def get_client_ip(self, request):
         """Get client IP address"""
@@ -2,10 +2,12 @@
 Tests for authentication functionality
 """
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
+from apps.authentication.detection import SecurityLogWriter, match_query
 from apps.authentication.models import UserProfile, SecurityLog, AuditLog
 
 
@@ -143,7 +145,7 @@ class AuthenticationAPITestCase(TestCase):
         """Test health check endpoint"""
         response = self.client.get('/api/auth/health/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['status'], 'healthy')
+        self.assertEqual(response.json()['status'], 'healthy')
 
     def test_user_profile_endpoint_unauthenticated(self):
         """Test user profile endpoint without authentication"""
@@ -167,4 +169,86 @@ class AuthenticationAPITestCase(TestCase):
         """Test audit logs endpoint with authentication"""
         self.client.force_authenticate(user=self.user)
         response = self.client.get('/api/auth/audit-logs/')
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class SuspiciousQueryTestCase(SimpleTestCase):
+    """Test the suspicious query matcher"""
+
+    def test_benign_queries(self):
+        """Test that searches containing SQL words or separators are not flagged"""
+        for query in ['', 'page=2', 'search=select+grade+wheat', 'q=a%3Bb', 'search=O%27Neil+and+Sons',
+                      'search=union+pacific', 'notes=10--20', 'q=%ff%fe']:
+            self.assertIsNone(match_query(query), query)
+
+    def test_malicious_queries(self):
+        """Test that encoded, double encoded and commented injections are flagged by rule"""
+        cases = {
+            'id=1+UNION+SELECT+password+FROM+auth_user': 'sql_union',
+            'id=1%27%20OR%20%271%27%3D%271': 'sql_tautology',
+            'id=1%2527%2520or%25201%253D1': 'sql_tautology',
+            'q=1;DROP+TABLE+contracts': 'sql_stacked',
+            'search=x%27--': 'sql_comment',
+            'id=1+AND+SLEEP(5)': 'sql_timing',
+            'file=../../etc/passwd': 'path_traversal',
+            'q=%3Cscript%3Ealert(1)%3C/script%3E': 'script',
+        }
+        for query, rule in cases.items():
+            self.assertEqual(match_query(query), rule, query)
+
+    def test_rules_do_not_span_parameters(self):
+        """Test that a quote and a comment in different parameters are not combined"""
+        self.assertIsNone(match_query('a=%27&b=--'))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SECURITY_LOG_ASYNC=False,
+    SECURITY_ALERT_SAMPLE_EVERY=2,
+)
+class SuspiciousActivityLoggingTestCase(TestCase):
+    """Test suspicious activity logging in SecurityLoggingMiddleware"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def suspicious_logs(self):
+        return SecurityLog.objects.filter(event_type='SUSPICIOUS_ACTIVITY')
+
+    def test_injection_is_logged_with_rule(self):
+        """Test that a flagged request is logged with its rule and raw query"""
+        self.client.get('/api/auth/health/?id=1%27+or+%271%27%3D%271')
+        log = self.suspicious_logs().get()
+        self.assertEqual(log.metadata['rule'], 'sql_tautology')
+        self.assertEqual(log.metadata['query_string'], 'id=1%27+or+%271%27%3D%271')
+        self.assertEqual(log.metadata['repeats'], 0)
+
+    def test_benign_search_is_not_logged(self):
+        """Test that a search for SQL words is not logged"""
+        self.client.get('/api/auth/health/?search=select+grade')
+        self.assertFalse(self.suspicious_logs().exists())
+
+    def test_repeated_alerts_are_sampled(self):
+        """Test that repeats from one IP are counted and only every second one is logged"""
+        for _ in range(4):
+            self.client.get('/api/auth/health/?q=1;drop+table+contracts')
+        self.assertEqual([log.metadata['repeats'] for log in self.suspicious_logs().order_by('id')], [0, 2])
+
+        self.client.get('/api/auth/health/?q=1;drop+table+contracts', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(self.suspicious_logs().filter(ip_address='10.0.0.2').count(), 1)
+
+
+class SecurityLogWriterTestCase(TransactionTestCase):
+    """Test the background SecurityLog writer"""
+
+    def test_rows_are_written_in_background(self):
+        """Test that queued rows are written in batches"""
+        writer = SecurityLogWriter(max_size=10, batch_size=4)
+        for i in range(6):
+            self.assertTrue(writer.submit({
+                'event_type': 'SUSPICIOUS_ACTIVITY', 'ip_address': '127.0.0.1',
+                'user_agent': '', 'metadata': {'i': i},
+            }))
+        writer.flush()
+        self.assertEqual(SecurityLog.objects.count(), 6)
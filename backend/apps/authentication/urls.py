@@ -7,7 +7,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     LoginView, LogoutView, RegisterView, UserProfileView,
     ChangePasswordView, SecurityLogViewSet, AuditLogViewSet,
-    UserViewSet, me, health_check, ping, CustomTokenObtainPairView,
+    UserViewSet, me, me_async, health_check, readiness_check, ping, db_pool_stats, CustomTokenObtainPairView,
     CustomTokenRefreshView, csrf_token
 )
 
@@ -26,13 +26,16 @@ urlpatterns = [
     
     # User profile endpoints
     path('me/', me, name='me'),
+    path('async/me/', me_async, name='me_async'),
     path('profile/', UserProfileView.as_view(), name='user_profile'),
     path('change-password/', ChangePasswordView.as_view(), name='change_password'),
     
     # Utility endpoints
     path('health/', health_check, name='health_check'),
+    path('ready/', readiness_check, name='readiness_check'),
     path('ping/', ping, name='ping'),
     path('csrf/', csrf_token, name='csrf_token'),
+    path('db-pool/', db_pool_stats, name='db_pool_stats'),
     
     # Include router URLs
     path('', include(router.urls)),
@@ -4,19 +4,24 @@ Authentication views for NextCRM.
 
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from django.conf import settings
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.http import JsonResponse
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
+from django.views.decorators.http import require_GET
 from django_ratelimit.decorators import ratelimit
 
+from core.db import get_pool_stats
+from core.probes import auth_ping_payload, health_payload, readiness, readiness_response
+from .decorators import async_login_required
 from .models import UserProfile, SecurityLog, AuditLog
 from .serializers import (
     UserSerializer, RegisterSerializer, LoginSerializer,
@@ -288,15 +293,35 @@ def me(request):
     return Response(serializer.data)
 
 
+@require_GET
+@async_login_required
+async def me_async(request):
+    """Get current user information without occupying a worker thread"""
+    user = request.user
+    if not User.profile.related.is_cached(user):
+        user = await User.objects.select_related('profile').aget(pk=user.pk)
+    return JsonResponse(UserSerializer(user).data)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
-    """Health check endpoint"""
+    """Health check endpoint (answered by ProbeMiddleware)"""
+    return Response(health_payload(request))
+
+
+@require_GET
+def readiness_check(request):
+    """Database and cache readiness probe (answered by ProbeMiddleware)"""
+    return readiness_response(readiness())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    """Connection pool saturation for this worker process (staff only)"""
     return Response({
-        'status': 'healthy',
-        'timestamp': timezone.now().isoformat(),
-        'cors_origin': request.META.get('HTTP_ORIGIN', 'no-origin'),
-        'user_agent': request.META.get('HTTP_USER_AGENT', 'no-user-agent')[:100]
+        alias: get_pool_stats(alias) for alias in settings.DATABASES
     })
 
 
@@ -304,15 +329,7 @@ def health_check(request):
 @permission_classes([AllowAny])
 def ping(request):
     """Simple ping endpoint for network testing"""
-    return Response({
-        'message': 'pong',
-        'timestamp': timezone.now().isoformat(),
-        'server': 'Django Backend',
-        'origin': request.META.get('HTTP_ORIGIN', 'unknown'),
-        'host': request.META.get('HTTP_HOST', 'unknown'),
-        'remote_addr': request.META.get('REMOTE_ADDR', 'unknown'),
-        'user_agent': request.META.get('HTTP_USER_AGENT', 'unknown')[:100]
-    })
+    return Response(auth_ping_payload(request))
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -7,7 +7,8 @@ from .models import (
     Currency, Cost_Center, Trader, Commodity_Group, Commodity_Type,
     Commodity_Subtype, Commodity, Counterparty, Broker, ICOTERM,
     Delivery_Format, Additive, Sociedad, Trade_Operation_Type,
-    Contract, Counterparty_Facility, Trade_Setting
+    Contract, Contract_Status_History, Counterparty_Facility, Counterparty_Position, Exchange_Rate,
+    Trade_Setting
 )
 
 
@@ -112,7 +113,7 @@ class SociedadAdmin(admin.ModelAdmin):
 
 @admin.register(Trade_Operation_Type)
 class TradeOperationTypeAdmin(admin.ModelAdmin):
-    list_display = ('trade_operation_type_name', 'operation_code')
+    list_display = ('trade_operation_type_name', 'operation_code', 'position_sign')
     search_fields = ('trade_operation_type_name', 'operation_code')
     ordering = ('trade_operation_type_name',)
 
@@ -166,6 +167,52 @@ class ContractAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(Contract_Status_History)
+class ContractStatusHistoryAdmin(admin.ModelAdmin):
+    list_display = ('contract', 'from_status', 'to_status', 'transition', 'changed_by', 'changed_at')
+    list_filter = ('to_status', 'transition', 'changed_at')
+    search_fields = ('contract__contract_number',)
+    ordering = ('-changed_at',)
+
+    # History is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Exchange_Rate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('rate_date', 'currency', 'quote_currency', 'rate', 'source')
+    list_filter = ('currency', 'quote_currency', 'source')
+    date_hierarchy = 'rate_date'
+    list_select_related = ('currency', 'quote_currency')
+    ordering = ('-rate_date', 'currency__currency_code')
+
+
+@admin.register(Counterparty_Position)
+class CounterpartyPositionAdmin(admin.ModelAdmin):
+    list_display = ('counterparty', 'commodity', 'delivery_month', 'net_quantity', 'net_value', 'contract_count')
+    list_filter = ('delivery_month', 'commodity')
+    search_fields = ('counterparty__counterparty_name',)
+    list_select_related = ('counterparty', 'commodity')
+    ordering = ('counterparty__counterparty_name', 'delivery_month')
+
+    # Positions are derived from contracts
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Counterparty_Facility)
 class CounterpartyFacilityAdmin(admin.ModelAdmin):
     list_display = ('counterparty', 'counterparty_facility_name', 'facility_type', 'city', 'country')
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class NextcrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.nextcrm'
-    verbose_name = 'NextCRM'
\ No newline at end of file
+    verbose_name = 'NextCRM'
+
+    def ready(self):
+        import apps.nextcrm.signals
@@ -0,0 +1,152 @@
+"""
+Async (ASGI-native) read endpoints for the NextCRM hot paths.
+
+These views reuse the querysets, filters and serializers of the DRF
+viewsets in views.py but await the database through Django's async ORM,
+so a single ASGI worker can serve many concurrent dashboard loads without
+holding a thread per request. Writes stay on the sync viewsets.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from apps.authentication.decorators import async_login_required
+from core.renderers import dumps
+from .dashboard import aget_dashboard_stats
+from .models import Contract
+from .serializers import ContractListSerializer, ContractSerializer, DashboardStatsSerializer
+from .views import (
+    CurrencyViewSet, CostCenterViewSet, TraderViewSet,
+    CommodityGroupViewSet, CommodityTypeViewSet, CommoditySubtypeViewSet,
+    CommodityViewSet, BrokerViewSet, ICOTERMViewSet, DeliveryFormatViewSet,
+    AdditiveViewSet, SociedadViewSet, TradeOperationTypeViewSet,
+    ContractViewSet
+)
+
+# Reference lists served asynchronously. Their viewset querysets select every
+# relation the serializers render, so serialization never touches the database.
+REFERENCE_VIEWSETS = {
+    'currencies': CurrencyViewSet,
+    'cost-centers': CostCenterViewSet,
+    'traders': TraderViewSet,
+    'commodity-groups': CommodityGroupViewSet,
+    'commodity-types': CommodityTypeViewSet,
+    'commodity-subtypes': CommoditySubtypeViewSet,
+    'commodities': CommodityViewSet,
+    'brokers': BrokerViewSet,
+    'icoterms': ICOTERMViewSet,
+    'delivery-formats': DeliveryFormatViewSet,
+    'additives': AdditiveViewSet,
+    'sociedades': SociedadViewSet,
+    'trade-operation-types': TradeOperationTypeViewSet,
+}
+
+
+def api_response(data, status=200):
+    """JSON response encoded like the API's default renderer"""
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+def get_viewset(viewset_class, request, action):
+    """Instantiate a viewset so its queryset and filter configuration can be reused"""
+    return viewset_class(
+        request=Request(request, authenticators=()),
+        action=action,
+        format_kwarg=None,
+        args=(),
+        kwargs={},
+    )
+
+
+def filter_viewset_queryset(view):
+    """
+    Apply the viewset's filter backends. Runs in a worker thread because
+    django-filter validates model choice filters against the database.
+    """
+    return view.filter_queryset(view.get_queryset())
+
+
+async def paginated_response(request, queryset, serializer_class):
+    """Async equivalent of PageNumberPagination.get_paginated_response"""
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        page_number = 0
+
+    count = await queryset.acount()
+    offset = (page_number - 1) * page_size
+    if page_number < 1 or (offset >= count and page_number != 1):
+        return api_response({'detail': 'Invalid page.'}, status=404)
+
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_url = None
+    if offset + page_size < count:
+        next_url = replace_query_param(url, 'page', page_number + 1)
+    previous_url = None
+    if page_number == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page_number > 2:
+        previous_url = replace_query_param(url, 'page', page_number - 1)
+
+    return api_response({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': serializer_class(objects, many=True).data,
+    })
+
+
+async def list_response(request, viewset_class, serializer_class=None):
+    view = get_viewset(viewset_class, request, 'list')
+    try:
+        queryset = await sync_to_async(filter_viewset_queryset)(view)
+    except ValidationError as exc:
+        return api_response(exc.detail, status=400)
+    return await paginated_response(
+        request, queryset, serializer_class or view.get_serializer_class()
+    )
+
+
+@require_GET
+@async_login_required
+async def contract_list(request):
+    """Filtered, paginated contract list (same query parameters as /contracts/)"""
+    return await list_response(request, ContractViewSet, ContractListSerializer)
+
+
+@require_GET
+@async_login_required
+async def contract_detail(request, pk):
+    """Single contract with all display fields"""
+    view = get_viewset(ContractViewSet, request, 'retrieve')
+    try:
+        contract = await view.get_queryset().aget(pk=pk)
+    except Contract.DoesNotExist:
+        return api_response({'detail': 'No Contract matches the given query.'}, status=404)
+    return api_response(ContractSerializer(contract).data)
+
+
+@require_GET
+@async_login_required
+async def dashboard_stats(request):
+    """Dashboard statistics computed with the async ORM"""
+    stats = await aget_dashboard_stats()
+    return api_response(DashboardStatsSerializer(stats).data)
+
+
+@require_GET
+@async_login_required
+async def reference_list(request, resource):
+    """Paginated reference data list for any entry of REFERENCE_VIEWSETS"""
+    viewset_class = REFERENCE_VIEWSETS.get(resource)
+    if viewset_class is None:
+        return api_response({'detail': 'Not found.'}, status=404)
+    return await list_response(request, viewset_class)
@@ -0,0 +1,71 @@
+"""
+Cache tags for NextCRM models, and the metrics of cached endpoints.
+
+Every model write invalidates (see signals.py):
+
+- ``<model>:<pk>``, the row itself, e.g. ``contract:123``
+- the model's collection tag: ``refdata:<model>`` for reference data,
+  e.g. ``refdata:currency``, and ``<model>`` for the rest, e.g. ``contract``
+- ``<parent>:<pk>`` of the rows it belongs to (PARENT_FIELDS), so a
+  contract write also invalidates ``counterparty:7`` and ``trader:3``
+
+Cached views declare the tags of the data they render (collection tags
+for lists). Writes that bypass model signals - bulk transitions, COPY
+loads, bulk imports and reference data syncs - invalidate explicitly.
+"""
+
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.response_cache import invalidate
+
+from .models import (
+    Additive, Broker, Commodity, Commodity_Group, Commodity_Subtype, Commodity_Type, Cost_Center,
+    Currency, Delivery_Format, Exchange_Rate, ICOTERM, Sociedad, Trade_Operation_Type, Trade_Setting,
+    Trader,
+)
+
+REFERENCE_MODELS = {
+    Currency, Exchange_Rate, Cost_Center, Trader, Commodity_Group, Commodity_Type, Commodity_Subtype,
+    Commodity, Broker, ICOTERM, Delivery_Format, Additive, Sociedad, Trade_Operation_Type, Trade_Setting,
+}
+
+# Foreign keys whose targets a row is part of: model name -> field names
+PARENT_FIELDS = {
+    'contract': ['counterparty', 'trader'],
+    'contract_status_history': ['contract'],
+    'counterparty_facility': ['counterparty'],
+    'counterparty_position': ['counterparty'],
+}
+
+# Hit/miss counters reported by the cache-stats endpoint
+METRICS = ['contract_list', 'contract_report', 'dashboard_stats', 'reference_list']
+
+
+def collection_tag(model):
+    name = model._meta.model_name
+    return f'refdata:{name}' if model in REFERENCE_MODELS else name
+
+
+def instance_tags(instance):
+    """Tags a write to instance invalidates"""
+    model = type(instance)
+    name = model._meta.model_name
+    tags = [collection_tag(model), f'{name}:{instance.pk}']
+    for field_name in PARENT_FIELDS.get(name, ()):
+        field = model._meta.get_field(field_name)
+        parent_pk = getattr(instance, field.attname)
+        if parent_pk is not None:
+            tags.append(f'{field.related_model._meta.model_name}:{parent_pk}')
+    return tags
+
+
+def invalidate_on_commit(tags, using=DEFAULT_DB_ALIAS):
+    """Invalidate tags once the current transaction commits (at once outside one)"""
+    transaction.on_commit(partial(invalidate, list(tags)), using=using)
+
+
+def invalidate_models(models, using=DEFAULT_DB_ALIAS):
+    """Invalidate the collection tags of models, e.g. after a bulk write"""
+    invalidate_on_commit({collection_tag(model) for model in models}, using)
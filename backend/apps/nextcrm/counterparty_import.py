@@ -0,0 +1,325 @@
+"""
+Bulk counterparty import with duplicate detection.
+
+Rows are streamed from CSV or XLSX; each row is one counterparty, with an
+optional facility. Rows for a counterparty that already exists (or appeared
+earlier in the file) add their facility to it instead of creating a
+duplicate. Names and tax ids are compared in normalized form:
+
+- exact: same normalized tax id, or same normalized name
+- fuzzy: a similar normalized name (difflib ratio >= threshold) among
+  counterparties sharing a rare name token; reported for review and not
+  imported unless create_fuzzy is set
+
+New counterparties and facilities are inserted with bulk_create, one
+transaction per batch.
+"""
+
+import csv
+import io
+import re
+import time
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from django.db import transaction
+
+from .caching import invalidate_models
+from .models import Counterparty, Counterparty_Facility
+from .normalization import normalize_name, normalize_tax_id
+
+COUNTERPARTY_COLUMNS = {
+    name: name for name in (
+        'counterparty_name', 'counterparty_code', 'tax_id', 'city', 'country',
+        'phone', 'email', 'contact_person',
+    )
+}
+# Import column -> Counterparty_Facility field
+FACILITY_COLUMNS = {
+    'facility_name': 'counterparty_facility_name',
+    'facility_type': 'facility_type',
+    'facility_address': 'address',
+    'facility_city': 'city',
+    'facility_country': 'country',
+}
+COLUMN_ALIASES = {'name': 'counterparty_name', 'code': 'counterparty_code'}
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'x'}
+
+# Fuzzy candidates are drawn from the rarest name tokens only
+FUZZY_BLOCKING_TOKENS = 2
+FUZZY_MAX_CANDIDATES = 500
+
+
+class CounterpartyImportError(Exception):
+    pass
+
+
+def read_rows(file, filename):
+    """Yield one dict per data row of a CSV or XLSX file, keyed by lower-cased header"""
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise CounterpartyImportError('XLSX import requires openpyxl')
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+            for values in rows:
+                yield {
+                    name: '' if value is None else str(value).strip()
+                    for name, value in zip(header, values)
+                }
+        finally:
+            workbook.close()
+    else:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        try:
+            for row in csv.DictReader(text):
+                yield {
+                    (name or '').strip().lower(): (value or '').strip()
+                    for name, value in row.items()
+                }
+        finally:
+            # Leave the underlying upload open for its owner
+            text.detach()
+
+
+def tokens(normalized_name):
+    return {token for token in normalized_name.split() if len(token) > 2}
+
+
+class DuplicateIndex:
+    """In-memory normalized-name/tax-id index over existing and pending counterparties"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.by_tax_id = {}
+        self.by_name = {}
+        self.by_token = defaultdict(set)
+        self.names = {}
+
+    @classmethod
+    def load(cls, threshold):
+        index = cls(threshold)
+        rows = Counterparty.objects.values_list('pk', 'normalized_name', 'normalized_tax_id')
+        for pk, name, tax_id in rows.iterator(chunk_size=5000):
+            index.add(pk, name, tax_id)
+        return index
+
+    def add(self, key, name, tax_id):
+        if tax_id:
+            self.by_tax_id.setdefault(tax_id, key)
+        if name:
+            self.by_name.setdefault(name, key)
+            self.names[key] = name
+            for token in tokens(name):
+                self.by_token[token].add(key)
+
+    def exact(self, name, tax_id):
+        """(key, 'tax_id' | 'name') of an exact match, or None"""
+        if tax_id and tax_id in self.by_tax_id:
+            return self.by_tax_id[tax_id], 'tax_id'
+        if name and name in self.by_name:
+            return self.by_name[name], 'name'
+        return None
+
+    def fuzzy(self, name):
+        """(key, score) of the most similar name at or above the threshold, or None"""
+        name_tokens = [token for token in tokens(name) if token in self.by_token]
+        blocks = sorted((self.by_token[token] for token in name_tokens), key=len)[:FUZZY_BLOCKING_TOKENS]
+        candidates = set().union(*blocks) if blocks else set()
+        # Score the candidates sharing the most tokens with name first (then by
+        # name, so the cut at FUZZY_MAX_CANDIDATES is repeatable)
+        ranked = sorted(candidates, key=lambda key: (
+            -sum(key in self.by_token[token] for token in name_tokens), self.names[key]
+        ))
+
+        best = None
+        for key in ranked[:FUZZY_MAX_CANDIDATES]:
+            score = SequenceMatcher(None, name, self.names[key]).ratio()
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+
+def parse_bool(value, default):
+    return value.strip().lower() in TRUE_VALUES if value else default
+
+
+def clean_values(row, columns, model):
+    """Pick a model's fields out of a row, rejecting values that do not fit"""
+    values = {}
+    for column, field_name in columns.items():
+        value = row.get(column, '')
+        if not value:
+            continue
+        max_length = model._meta.get_field(field_name).max_length
+        if max_length and len(value) > max_length:
+            raise CounterpartyImportError(f'{column} is longer than {max_length} characters')
+        values[field_name] = value
+    return values
+
+
+class PendingCounterparty:
+    """A counterparty created from the file; it has a pk once its batch is written"""
+
+    def __init__(self, instance, row_number):
+        self.instance = instance
+        self.row_number = row_number
+
+
+def target_pk(target):
+    """pk of an index entry: an existing counterparty id or a PendingCounterparty"""
+    return target.instance.pk if isinstance(target, PendingCounterparty) else target
+
+
+def target_row(target):
+    return target.row_number if isinstance(target, PendingCounterparty) else None
+
+
+class CounterpartyImporter:
+    def __init__(self, batch_size=500, fuzzy_threshold=0.9, create_fuzzy=False):
+        self.batch_size = batch_size
+        self.create_fuzzy = create_fuzzy
+        self.index = DuplicateIndex.load(fuzzy_threshold)
+        self.codes = set(Counterparty.objects.values_list('counterparty_code', flat=True))
+        self.report = {
+            'rows': 0,
+            'created': 0,
+            'matched': 0,
+            'facilities_created': 0,
+            'counterparties': [],
+            'possible_duplicates': [],
+            'errors': [],
+        }
+        self.pending = []
+        self.facilities = []  # (PendingCounterparty or existing pk, Counterparty_Facility)
+
+    def run(self, rows):
+        started = time.perf_counter()
+        for row_number, row in enumerate(rows, start=2):  # Row 1 is the header
+            self.report['rows'] += 1
+            row = {COLUMN_ALIASES.get(name, name): value for name, value in row.items()}
+            try:
+                self.import_row(row_number, row)
+            except CounterpartyImportError as exc:
+                self.report['errors'].append({'row': row_number, 'error': str(exc)})
+            if len(self.pending) + len(self.facilities) >= self.batch_size:
+                self.flush()
+        self.flush()
+        self.report['seconds'] = round(time.perf_counter() - started, 3)
+        return self.report
+
+    def import_row(self, row_number, row):
+        values = clean_values(row, COUNTERPARTY_COLUMNS, Counterparty)
+        facility_values = clean_values(row, FACILITY_COLUMNS, Counterparty_Facility)
+        if not values.get('counterparty_name'):
+            raise CounterpartyImportError('counterparty_name is required')
+
+        name = normalize_name(values['counterparty_name'])
+        tax_id = normalize_tax_id(values.get('tax_id', ''))
+        match = self.index.exact(name, tax_id)
+        if match is not None:
+            target, matched_on = match
+            self.report['matched'] += 1
+            self.report['counterparties'].append({
+                'row': row_number, 'action': 'matched', 'match': matched_on,
+                'counterparty': target_pk(target), 'first_row': target_row(target),
+            })
+        else:
+            fuzzy = self.index.fuzzy(name)
+            if fuzzy is not None and not self.create_fuzzy:
+                key, score = fuzzy
+                self.report['possible_duplicates'].append({
+                    'row': row_number, 'counterparty_name': values['counterparty_name'],
+                    'candidate': target_pk(key), 'candidate_row': target_row(key),
+                    'score': round(score, 3),
+                })
+                return
+            target = self.add_counterparty(row_number, row, values, name, tax_id)
+
+        if facility_values.get('counterparty_facility_name'):
+            self.facilities.append((target, Counterparty_Facility(**facility_values)))
+
+    def add_counterparty(self, row_number, row, values, name, tax_id):
+        if not values.get('counterparty_code'):
+            values['counterparty_code'] = self.make_code(name)
+        elif values['counterparty_code'] in self.codes:
+            raise CounterpartyImportError(f"counterparty_code {values['counterparty_code']} is already used")
+        self.codes.add(values['counterparty_code'])
+
+        instance = Counterparty(
+            is_supplier=parse_bool(row.get('is_supplier'), False),
+            is_customer=parse_bool(row.get('is_customer'), True),
+            **values
+        )
+        instance.set_normalized_fields()
+        pending = PendingCounterparty(instance, row_number)
+        self.pending.append(pending)
+        self.index.add(pending, name, tax_id)
+        return pending
+
+    def make_code(self, normalized_name):
+        base = re.sub(r'[^A-Z0-9]', '', normalized_name.upper())[:8] or 'CP'
+        number = 1
+        while f'{base}{number:03d}' in self.codes:
+            number += 1
+        return f'{base}{number:03d}'
+
+    def flush(self):
+        if not self.pending and not self.facilities:
+            return
+
+        with transaction.atomic():
+            Counterparty.objects.bulk_create([pending.instance for pending in self.pending])
+            for pending in self.pending:
+                self.report['counterparties'].append({
+                    'row': pending.row_number, 'action': 'created',
+                    'counterparty': pending.instance.pk, 'code': pending.instance.counterparty_code,
+                })
+            self.report['created'] += len(self.pending)
+
+            facilities = self.new_facilities()
+            Counterparty_Facility.objects.bulk_create(facilities)
+            self.report['facilities_created'] += len(facilities)
+            # bulk_create does not send the signals that invalidate cache tags
+            invalidate_models([Counterparty, Counterparty_Facility])
+
+        self.pending = []
+        self.facilities = []
+
+    def new_facilities(self):
+        """Facilities of this batch, minus those their counterparty already has"""
+        seen = set(
+            (counterparty_id, normalize_name(name))
+            for counterparty_id, name in Counterparty_Facility.objects.filter(
+                counterparty_id__in={target_pk(target) for target, _ in self.facilities}
+            ).values_list('counterparty_id', 'counterparty_facility_name')
+        )
+
+        facilities = []
+        for target, facility in self.facilities:
+            facility.counterparty_id = target_pk(target)
+            key = (facility.counterparty_id, normalize_name(facility.counterparty_facility_name))
+            if key not in seen:
+                seen.add(key)
+                facilities.append(facility)
+        return facilities
+
+
+def import_counterparties(rows, batch_size=500, fuzzy_threshold=0.9, create_fuzzy=False, dry_run=False):
+    """
+    Import rows and return the merge report. Each batch commits on its own,
+    so an interrupted import keeps the batches already written; with
+    dry_run everything runs in one transaction that is rolled back.
+    """
+    importer = CounterpartyImporter(batch_size, fuzzy_threshold, create_fuzzy)
+    if dry_run:
+        with transaction.atomic():
+            report = importer.run(rows)
+            transaction.set_rollback(True)
+    else:
+        report = importer.run(rows)
+    report['dry_run'] = dry_run
+    return report
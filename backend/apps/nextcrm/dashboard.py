@@ -0,0 +1,228 @@
+"""
+Dashboard statistics for NextCRM contracts.
+
+The dashboard is split into independent blocks that are evaluated
+concurrently on a bounded thread pool, each task on its own database
+connection. A block that does not finish within DASHBOARD_BLOCK_TIMEOUT
+(or fails) is served from the last good value in the cache and reported
+in ``stale_blocks`` instead of failing the whole response.
+
+The dashboard_stats endpoint serves the rendered response from the
+response cache (DASHBOARD_CACHE_KEY) for DASHBOARD_CACHE_TIMEOUT seconds,
+or until a change to one of DASHBOARD_CACHE_TAGS.
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Count, Q
+from django.utils import timezone
+
+from .fx import base_currency, rate_to_base
+from .models import Contract
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_KEY = 'dashboard:stats'
+DASHBOARD_CACHE_TAGS = ['contract', 'counterparty', 'refdata:commodity', 'refdata:exchange_rate']
+STALE_CACHE_PREFIX = 'dashboard:block:'
+STALE_CACHE_TIMEOUT = 24 * 3600
+
+
+def base_value():
+    """
+    Contract value (price * quantity) in the base currency, converted in SQL
+    with the trade currency's rate on the contract date; NULL without a rate
+    """
+    return ExpressionWrapper(
+        F('price') * F('quantity') * rate_to_base('trade_currency', 'date'),
+        output_field=DecimalField(max_digits=30, decimal_places=2)
+    )
+
+
+def top_counterparties_queryset():
+    """Top counterparties by contract value in the base currency"""
+    return (
+        Contract.objects.values('counterparty__counterparty_name')
+        .annotate(total_value=Sum(base_value()), contract_count=Count('id'))
+        .order_by(F('total_value').desc(nulls_last=True))[:5]
+    )
+
+
+def top_commodities_queryset():
+    """Top commodities by volume"""
+    return (
+        Contract.objects.values('commodity__commodity_name_short')
+        .annotate(total_quantity=Sum('quantity'), contract_count=Count('id'))
+        .order_by('-total_quantity')[:5]
+    )
+
+
+def monthly_values_queryset():
+    """Monthly contract values in the base currency for the last 12 months"""
+    twelve_months_ago = timezone.now().date() - timedelta(days=365)
+    return (
+        Contract.objects.filter(date__gte=twelve_months_ago)
+        .extra({'month': 'date_trunc(\'month\', date)'})
+        .values('month')
+        .annotate(total_value=Sum(base_value()), contract_count=Count('id'))
+        .order_by('month')
+    )
+
+
+def status_distribution_queryset():
+    """Contract status distribution"""
+    return (
+        Contract.objects.values('status')
+        .annotate(count=Count('id'))
+        .order_by('-count')
+    )
+
+
+def summary_block():
+    """Headline counters in a single aggregate query"""
+    summary = Contract.objects.alias(value=base_value()).aggregate(
+        total_contracts=Count('id'),
+        total_value=Sum('value'),
+        unconverted_contracts=Count('id', filter=Q(value__isnull=True)),
+        active_contracts=Count('id', filter=Q(status__in=['approved', 'executed'])),
+        pending_contracts=Count('id', filter=Q(status='draft')),
+    )
+    summary['total_value'] = summary['total_value'] or 0
+    return summary
+
+
+# Independent blocks and the value served when a block has never succeeded
+BLOCKS = {
+    'summary': (summary_block, {
+        'total_contracts': 0, 'total_value': 0, 'unconverted_contracts': 0,
+        'active_contracts': 0, 'pending_contracts': 0,
+    }),
+    'top_counterparties': (lambda: list(top_counterparties_queryset()), []),
+    'top_commodities': (lambda: list(top_commodities_queryset()), []),
+    'monthly_contract_values': (lambda: list(monthly_values_queryset()), []),
+    'contract_status_distribution': (lambda: list(status_distribution_queryset()), []),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide pool shared by all dashboard requests"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.DASHBOARD_MAX_WORKERS,
+                    thread_name_prefix='dashboard',
+                )
+    return _executor
+
+
+def get_block_timeout():
+    return settings.DASHBOARD_BLOCK_TIMEOUT
+
+
+def evaluate_block(name):
+    """
+    Evaluate one block on the pool thread's own connection. The statement
+    timeout makes PostgreSQL cancel a query the response no longer waits for;
+    it is SET LOCAL inside the block's transaction, so a pooled connection
+    goes back with DB_STATEMENT_TIMEOUT_MS.
+    """
+    build_block, _ = BLOCKS[name]
+    alias = router.db_for_read(Contract)
+    connection = connections[alias]
+    try:
+        with transaction.atomic(using=alias):
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SET LOCAL statement_timeout = %s', [int(get_block_timeout() * 1000)]
+                    )
+            return build_block()
+    finally:
+        connections.close_all()
+
+
+def submit_block(executor, name):
+    """Run a block on the pool with the caller's context (replica routing)"""
+    return executor.submit(contextvars.copy_context().run, evaluate_block, name)
+
+
+def assemble_stats(results, stale_blocks):
+    """Flatten block results into the DashboardStatsSerializer shape"""
+    stats = dict(results.pop('summary'))
+    stats.update(results)
+    stats['base_currency'] = base_currency()
+    stats['stale_blocks'] = stale_blocks
+    return stats
+
+
+def collect_results(names, futures):
+    """
+    Split block futures into fresh results and failed block names. Works for
+    both concurrent.futures and asyncio futures; timed-out blocks are cancelled.
+    """
+    results, failed = {}, []
+    for name, future in zip(names, futures):
+        if not future.done():
+            future.cancel()
+            logger.warning('Dashboard block %s timed out', name)
+            failed.append(name)
+        elif isinstance(future.exception(), DatabaseError):
+            logger.warning('Dashboard block %s failed: %r', name, future.exception())
+            failed.append(name)
+        else:
+            results[name] = future.result()
+    return results, failed
+
+
+def fresh_cache_entries(results):
+    return {STALE_CACHE_PREFIX + name: value for name, value in results.items()}
+
+
+def apply_fallbacks(results, failed, cached):
+    """Fill failed blocks with their last good value, or the block default"""
+    for name in failed:
+        results[name] = cached.get(STALE_CACHE_PREFIX + name, BLOCKS[name][1])
+    return results
+
+
+def get_dashboard_stats():
+    """Compute dashboard statistics, fanning the blocks out to the pool"""
+    executor = get_executor()
+    names = list(BLOCKS)
+    futures = [submit_block(executor, name) for name in names]
+    wait(futures, timeout=get_block_timeout())
+
+    results, failed = collect_results(names, futures)
+    cache.set_many(fresh_cache_entries(results), STALE_CACHE_TIMEOUT)
+    if failed:
+        cached = cache.get_many([STALE_CACHE_PREFIX + name for name in failed])
+        apply_fallbacks(results, failed, cached)
+    return assemble_stats(results, failed)
+
+
+async def aget_dashboard_stats():
+    """Async counterpart of get_dashboard_stats; awaits the pool futures"""
+    executor = get_executor()
+    names = list(BLOCKS)
+    futures = [asyncio.wrap_future(submit_block(executor, name)) for name in names]
+    await asyncio.wait(futures, timeout=get_block_timeout())
+
+    results, failed = collect_results(names, futures)
+    await cache.aset_many(fresh_cache_entries(results), STALE_CACHE_TIMEOUT)
+    if failed:
+        cached = await cache.aget_many([STALE_CACHE_PREFIX + name for name in failed])
+        apply_fallbacks(results, failed, cached)
+    return assemble_stats(results, failed)
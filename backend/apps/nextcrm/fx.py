@@ -0,0 +1,224 @@
+"""
+Foreign exchange rates and conversion to the base currency.
+
+Rates live in the exchange_rates table (one row per currency pair and
+date), loaded from local CSV/JSON/YAML files by load_fx_rates. The rate
+that applies on a day is the latest one on or before it.
+
+Two lookup paths share that rule:
+
+- rate_to_base() is a SQL expression for aggregations, so totals in the
+  base currency are computed by the database in the same query
+- RateTable is an in-memory, date-indexed copy for converting single
+  amounts in Python; each process reloads it when load_rates() bumps the
+  version in the cache
+
+Both convert into the base currency with direct currency -> base rows only
+(load_rates() stores those for base -> currency rows too), so a contract
+gets a value in the base currency exactly when the aggregates count it.
+Inverted and cross rates are used for conversions between other currencies.
+"""
+
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, OuterRef, Subquery, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .caching import invalidate_models
+from .models import Currency, Exchange_Rate
+from .reference_data import read_fixture
+
+VERSION_CACHE_KEY = 'fx:version'
+RATE_PRECISION = Decimal('1e-10')
+
+_table_lock = threading.Lock()
+_loaded = {'version': None, 'table': None}
+
+
+class FxError(Exception):
+    pass
+
+
+class MissingRate(FxError):
+    pass
+
+
+def base_currency():
+    return settings.FX_BASE_CURRENCY
+
+
+def rate_to_base(currency_field, date_field, base=None):
+    """
+    SQL expression for the rate converting currency_field into the base
+    currency on date_field (both lookups on the outer query's model).
+    NULL when no rate is known, so converted sums skip those rows.
+    """
+    base = base or base_currency()
+    latest = Exchange_Rate.objects.filter(
+        currency=OuterRef(currency_field),
+        quote_currency__currency_code=base,
+        rate_date__lte=OuterRef(date_field),
+    ).order_by('-rate_date').values('rate')[:1]
+    output_field = DecimalField(max_digits=20, decimal_places=10)
+    return Case(
+        When(**{f'{currency_field}__currency_code': base}, then=Value(Decimal(1), output_field=output_field)),
+        default=Subquery(latest, output_field=output_field),
+        output_field=output_field,
+    )
+
+
+class RateTable:
+    """Rates per (currency, quote) pair as parallel sorted date/rate lists"""
+
+    def __init__(self, rows, base=None):
+        self.base = base or base_currency()
+        self.series = defaultdict(lambda: ([], []))
+        for currency, quote, rate_date, rate in sorted(rows, key=lambda row: row[2]):
+            dates, rates = self.series[(currency, quote)]
+            dates.append(rate_date)
+            rates.append(rate)
+
+    def direct(self, currency, quote, on):
+        """Latest currency -> quote rate on or before on, or None"""
+        if currency == quote:
+            return Decimal(1)
+        if (currency, quote) in self.series:
+            dates, rates = self.series[(currency, quote)]
+            index = bisect_right(dates, on)
+            if index:
+                return rates[index - 1]
+        return None
+
+    def lookup(self, currency, quote, on):
+        """Latest direct or inverted rate on or before on, or None"""
+        rate = self.direct(currency, quote, on)
+        if rate is None:
+            inverse = self.direct(quote, currency, on)
+            if inverse is not None:
+                rate = (1 / inverse).quantize(RATE_PRECISION)
+        return rate
+
+    def rate(self, currency, quote, on):
+        """
+        Rate from currency to quote on a date. Into the base currency only
+        direct rows count, as in rate_to_base(); between other currencies
+        inverted rates and crossing through the base currency are used.
+        """
+        if quote == self.base:
+            rate = self.direct(currency, quote, on)
+        else:
+            rate = self.lookup(currency, quote, on)
+        if rate is None and self.base not in (currency, quote):
+            to_base = self.lookup(currency, self.base, on)
+            from_base = self.lookup(self.base, quote, on)
+            if to_base is not None and from_base is not None:
+                rate = to_base * from_base
+        if rate is None:
+            raise MissingRate(f'No {currency}/{quote} rate on or before {on}')
+        return rate
+
+
+def current_version():
+    return cache.get_or_set(VERSION_CACHE_KEY, 1, None)
+
+
+def get_rate_table():
+    """This process's RateTable, reloaded after rates change anywhere"""
+    version = current_version()
+    if _loaded['version'] != version:
+        with _table_lock:
+            if _loaded['version'] != version:
+                rows = Exchange_Rate.objects.values_list(
+                    'currency__currency_code', 'quote_currency__currency_code', 'rate_date', 'rate'
+                )
+                _loaded['table'] = RateTable(rows)
+                _loaded['version'] = version
+    return _loaded['table']
+
+
+def convert(amount, currency, quote=None, on=None):
+    """amount in currency expressed in quote (default: the base currency) on a date (default: today)"""
+    quote = quote or base_currency()
+    rate = get_rate_table().rate(currency, quote, on or timezone.now().date())
+    return Decimal(amount) * rate
+
+
+def bump_version():
+    if not cache.add(VERSION_CACHE_KEY, 2, None):
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 2, None)
+
+
+def parse_rate_rows(rows):
+    """(currency, quote, date, rate) tuples from file rows with date/currency/quote/rate columns"""
+    parsed = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            rate_date = row['date'] if isinstance(row['date'], date) else parse_date(str(row['date']))
+            rate = Decimal(str(row['rate']))
+            currency, quote = str(row['currency']).upper(), str(row['quote']).upper()
+        except (KeyError, ArithmeticError, ValueError) as exc:
+            raise FxError(f'Row {number}: {exc!r}')
+        if rate_date is None or rate <= 0:
+            raise FxError(f'Row {number}: invalid date or rate')
+        parsed.append((currency, quote, rate_date, rate))
+    return parsed
+
+
+def with_base_inverses(rates, base=None):
+    """
+    Add currency -> base rates implied by base -> currency ones, so that
+    rate_to_base() finds a direct row for files quoted the other way round.
+    """
+    base = base or base_currency()
+    given = {(currency, quote, rate_date) for currency, quote, rate_date, _ in rates}
+    inverses = [
+        (quote, currency, rate_date, (1 / rate).quantize(RATE_PRECISION))
+        for currency, quote, rate_date, rate in rates
+        if currency == base and (quote, currency, rate_date) not in given
+    ]
+    return rates + inverses
+
+
+def load_rates(rates, source=''):
+    """Upsert (currency, quote, date, rate) tuples; returns the number of rows written"""
+    # The last rate given for a pair and date wins
+    rates = list({row[:3]: row for row in with_base_inverses(rates)}.values())
+    currency_ids = dict(Currency.objects.values_list('currency_code', 'pk'))
+    unknown = sorted({code for row in rates for code in row[:2]} - currency_ids.keys())
+    if unknown:
+        raise FxError(f'Unknown currencies: {", ".join(unknown)}')
+
+    objects = [
+        Exchange_Rate(
+            currency_id=currency_ids[currency], quote_currency_id=currency_ids[quote],
+            rate_date=rate_date, rate=rate, source=source[:50],
+        )
+        for currency, quote, rate_date, rate in rates
+    ]
+    with transaction.atomic():
+        Exchange_Rate.objects.bulk_create(
+            objects,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['currency', 'quote_currency', 'rate_date'],
+            update_fields=['rate', 'source', 'updated_at'],
+        )
+        transaction.on_commit(bump_version)
+        invalidate_models([Exchange_Rate])
+    return len(objects)
+
+
+def load_rate_file(path):
+    return load_rates(parse_rate_rows(read_fixture(path)), source=Path(path).name)
@@ -0,0 +1,89 @@
+"""
+Management command to benchmark connection setup latency with and without
+a psycopg connection pool under concurrent load.
+
+Run against a local PostgreSQL, e.g.:
+    python manage.py benchmark_db_pool --threads 32 --requests 2000
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg
+from psycopg_pool import ConnectionPool
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request connection latency of direct connections vs. a connection pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to connect to')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent client threads')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario')
+        parser.add_argument('--pool-size', type=int, default=10, help='Pool max_size for the pooled scenario')
+
+    def handle(self, *args, **options):
+        params = dict(connections[options['database']].get_connection_params())
+        params.pop('pool', None)
+
+        self.stdout.write(
+            f"{options['requests']} requests, {options['threads']} threads, "
+            f"pool size {options['pool_size']}"
+        )
+
+        direct = self.run_scenario(
+            lambda: self.direct_request(params), options['threads'], options['requests']
+        )
+        self.report('direct connect', direct)
+
+        pool = ConnectionPool(
+            kwargs=params,
+            min_size=options['pool_size'],
+            max_size=options['pool_size'],
+            open=True,
+        )
+        try:
+            pool.wait()
+            pooled = self.run_scenario(
+                lambda: self.pooled_request(pool), options['threads'], options['requests']
+            )
+            self.report('pooled', pooled)
+            self.stdout.write(f"pool stats: {pool.get_stats()}")
+        finally:
+            pool.close()
+
+        speedup = statistics.mean(direct['latencies']) / statistics.mean(pooled['latencies'])
+        self.stdout.write(self.style.SUCCESS(f'Mean latency improvement with pooling: {speedup:.1f}x'))
+
+    def direct_request(self, params):
+        with psycopg.connect(**params) as conn:
+            conn.execute('SELECT 1').fetchone()
+
+    def pooled_request(self, pool):
+        with pool.connection() as conn:
+            conn.execute('SELECT 1').fetchone()
+
+    def run_scenario(self, request, threads, total):
+        def timed():
+            start = time.perf_counter()
+            request()
+            return time.perf_counter() - start
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(lambda _: timed(), range(total)))
+        elapsed = time.perf_counter() - started
+        return {'latencies': latencies, 'elapsed': elapsed}
+
+    def report(self, label, result):
+        latencies_ms = sorted(latency * 1000 for latency in result['latencies'])
+        percentiles = statistics.quantiles(latencies_ms, n=100)
+        self.stdout.write(
+            f"{label:>15}: mean {statistics.mean(latencies_ms):7.2f} ms  "
+            f"p50 {percentiles[49]:7.2f} ms  p95 {percentiles[94]:7.2f} ms  "
+            f"p99 {percentiles[98]:7.2f} ms  "
+            f"{len(latencies_ms) / result['elapsed']:8.0f} req/s"
+        )
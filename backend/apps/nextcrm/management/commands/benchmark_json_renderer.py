@@ -0,0 +1,83 @@
+"""
+Management command to compare the orjson renderer/parser against DRF's
+stock JSONRenderer/JSONParser on ContractSerializer payloads, and check
+that both produce the same document.
+
+Best run on a large book, e.g. after generate_synthetic_data:
+    python manage.py benchmark_json_renderer --contracts 5000 --runs 10
+"""
+
+import io
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.nextcrm.models import Contract
+from apps.nextcrm.serializers import ContractSerializer
+from core.renderers import ORJSONParser, ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the orjson API renderer and parser against the stdlib-based DRF ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=1000, help='Contracts in the payload')
+        parser.add_argument('--runs', type=int, default=10, help='Timed runs per renderer')
+
+    def handle(self, *args, **options):
+        contracts = list(Contract.objects.select_related(
+            'trader', 'counterparty', 'broker', 'trade_currency', 'broker_fee_currency',
+            'commodity__commodity_subtype__commodity_type__commodity_group',
+        ).order_by('id')[:options['contracts']])
+        if not contracts:
+            raise CommandError('No contracts found; generate some with generate_synthetic_data')
+
+        started = time.perf_counter()
+        payload = {'count': len(contracts), 'results': ContractSerializer(contracts, many=True).data}
+        self.stdout.write(
+            f"{len(contracts):,} contracts serialized in {(time.perf_counter() - started) * 1000:.1f} ms, "
+            f"{options['runs']} runs per renderer"
+        )
+
+        stock, stock_body = self.time_runs(lambda: JSONRenderer().render(payload), options['runs'])
+        fast, fast_body = self.time_runs(lambda: ORJSONRenderer().render(payload), options['runs'])
+        self.report('render json', stock, len(stock_body))
+        self.report('render orjson', fast, len(fast_body))
+
+        stock_parse, parsed = self.time_runs(
+            lambda: JSONParser().parse(io.BytesIO(stock_body)), options['runs']
+        )
+        fast_parse, fast_parsed = self.time_runs(
+            lambda: ORJSONParser().parse(io.BytesIO(stock_body)), options['runs']
+        )
+        self.report('parse json', stock_parse, len(stock_body))
+        self.report('parse orjson', fast_parse, len(stock_body))
+
+        if json.loads(fast_body) != parsed or fast_parsed != parsed:
+            self.stdout.write(self.style.WARNING('orjson output differs from the stock renderer'))
+        else:
+            self.stdout.write('Rendered and parsed documents agree')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"orjson renders {statistics.median(stock) / statistics.median(fast):.2f}x and parses "
+            f"{statistics.median(stock_parse) / statistics.median(fast_parse):.2f}x the speed of the stock classes"
+        ))
+
+    def time_runs(self, run, runs):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = run()
+            timings.append(time.perf_counter() - started)
+        return timings, result
+
+    def report(self, label, timings, size):
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"{label:>14}: median {median * 1000:8.2f} ms  min {min(timings) * 1000:8.2f} ms  "
+            f"{size / median / 2 ** 20:8.1f} MiB/s"
+        )
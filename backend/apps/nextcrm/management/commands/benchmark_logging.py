@@ -0,0 +1,127 @@
+"""
+Management command to measure request latency under heavy logging with the
+previous synchronous file handler against the queued pipeline (core/log.py),
+optionally with INFO sampling and a simulated disk stall on every write.
+
+Requests go through RequestLogMiddleware to a view that logs --records
+INFO lines, all written as JSON to a temporary rotating log file; no
+database or cache is touched, e.g.:
+    python manage.py benchmark_logging --requests 2000 --records 20 --stall-ms 1
+"""
+
+import logging
+import logging.handlers
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from core.log import InfoSampler, JsonFormatter, QueueHandler, RequestContextFilter, RequestLogMiddleware
+
+LOGGER_NAMES = ['core.requests', 'benchmark.logging']
+
+
+class StallingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that sleeps on every write, like a slow disk"""
+
+    def __init__(self, *args, stall=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stall = stall
+
+    def emit(self, record):
+        if self.stall:
+            time.sleep(self.stall)
+        super().emit(record)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark request latency under heavy logging, synchronous vs queued'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per setup')
+        parser.add_argument('--records', type=int, default=20, help='INFO records logged by each request')
+        parser.add_argument('--stall-ms', type=float, default=0.0, help='Simulated delay of every log write')
+        parser.add_argument('--sample-rate', type=float, default=0.1, help='LOG_INFO_SAMPLE_RATE of the sampled setup')
+
+    def handle(self, *args, **options):
+        records = options['records']
+        view_logger = logging.getLogger('benchmark.logging')
+
+        def view(request):
+            for index in range(records):
+                view_logger.info('Record %d of %s', index, request.path, extra={'index': index})
+            return HttpResponse('ok')
+
+        middleware = RequestLogMiddleware(view)
+        requests = [RequestFactory().get(f'/api/contracts/{index}/') for index in range(options['requests'])]
+
+        with tempfile.TemporaryDirectory() as directory:
+            setups = [
+                ('synchronous', None),
+                ('queued', 1.0),
+                (f"queued, {options['sample_rate']:.0%} INFO", options['sample_rate']),
+            ]
+            medians = {}
+            for index, (label, sample_rate) in enumerate(setups):
+                path = Path(directory) / f'benchmark-{index}.log'
+                file_handler = StallingFileHandler(
+                    path, maxBytes=50 * 1024 * 1024, backupCount=1, stall=options['stall_ms'] / 1000
+                )
+                file_handler.setFormatter(JsonFormatter())
+                if sample_rate is None:
+                    handler = file_handler
+                    handler.addFilter(RequestContextFilter())
+                else:
+                    file_handler.set_name(f'benchmark-{label}')
+                    handler = QueueHandler([file_handler.name], queue_size=len(requests) * (records + 1))
+                    handler.addFilter(RequestContextFilter())
+                    handler.addFilter(InfoSampler(sample_rate))
+
+                latencies = self.time_requests(middleware, requests, handler)
+                started = time.perf_counter()
+                # Writes out what the queued setups still hold
+                handler.close()
+                drained = time.perf_counter() - started
+                file_handler.close()
+                self.report(label, latencies, path, drained)
+                medians[label] = statistics.median(latencies)
+
+        synchronous, queued = medians['synchronous'], medians['queued']
+        message = f'queued median {queued:.3f} ms against {synchronous:.3f} ms synchronous'
+        if queued <= synchronous:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(message))
+
+    def time_requests(self, middleware, requests, handler):
+        """Milliseconds per request with handler as the only handler of the benchmark loggers"""
+        loggers = [logging.getLogger(name) for name in LOGGER_NAMES]
+        saved = [(logger.handlers, logger.level, logger.propagate) for logger in loggers]
+        for logger in loggers:
+            logger.handlers, logger.propagate = [handler], False
+            logger.setLevel(logging.INFO)
+        try:
+            latencies = []
+            for request in requests:
+                started = time.perf_counter()
+                middleware(request)
+                latencies.append((time.perf_counter() - started) * 1000)
+            return latencies
+        finally:
+            for logger, (handlers, level, propagate) in zip(loggers, saved):
+                logger.handlers, logger.propagate = handlers, propagate
+                logger.setLevel(level)
+
+    def report(self, label, latencies, path, drained):
+        latencies.sort()
+        with open(path, 'rb') as log_file:
+            written = sum(1 for _ in log_file)
+        self.stdout.write(
+            f"{label:>22}: median {statistics.median(latencies):7.3f} ms  "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.3f} ms  max {latencies[-1]:7.3f} ms  "
+            f"{written} lines, drained {drained * 1000:.0f} ms after the last request"
+        )
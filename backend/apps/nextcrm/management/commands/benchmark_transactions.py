@@ -0,0 +1,108 @@
+"""
+Management command to compare contract write throughput under whole-
+transaction SERIALIZABLE isolation against READ COMMITTED with row locks.
+
+Every operation increments the quantity of one of a few "hot" contracts,
+so the final quantities show whether any update was lost. The "unlocked"
+mode (read committed, no locks) is included to show the lost updates the
+row locks prevent.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.nextcrm.models import (
+    Currency, Cost_Center, Trader, Commodity, Counterparty, Broker, ICOTERM,
+    Delivery_Format, Additive, Sociedad, Trade_Operation_Type, Contract
+)
+from apps.nextcrm.transactions import retry_on_conflict
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent contract updates: serializable vs. read committed with row locks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=1000, help='Operations per mode')
+        parser.add_argument('--hot-contracts', type=int, default=4, help='Contracts contended for')
+
+    def handle(self, *args, **options):
+        contracts = self.create_contracts(options['hot_contracts'])
+        try:
+            for mode in ('serializable', 'locked', 'unlocked'):
+                self.run_mode(mode, contracts, options['threads'], options['operations'])
+        finally:
+            Contract.objects.filter(pk__in=[contract.pk for contract in contracts]).delete()
+
+    def create_contracts(self, count):
+        references = {
+            'trader': Trader, 'trade_operation_type': Trade_Operation_Type, 'sociedad': Sociedad,
+            'counterparty': Counterparty, 'commodity': Commodity, 'delivery_format': Delivery_Format,
+            'additive': Additive, 'broker': Broker, 'icoterm': ICOTERM, 'cost_center': Cost_Center,
+            'broker_fee_currency': Currency, 'trade_currency': Currency,
+        }
+        fields = {name: model.objects.first() for name, model in references.items()}
+        missing = [name for name, value in fields.items() if value is None]
+        if missing:
+            raise CommandError(f'Missing reference data ({", ".join(missing)}); run populate_reference_data first')
+
+        today = timezone.now().date()
+        return [
+            Contract.objects.create(
+                broker_fee=0, freight_cost=0, forex=1, price=1, payment_days=0,
+                quantity=0, entrega='benchmark', delivery_period=today, date=today,
+                notes='benchmark_transactions', **fields
+            )
+            for _ in range(count)
+        ]
+
+    def run_mode(self, mode, contracts, threads, operations):
+        Contract.objects.filter(pk__in=[c.pk for c in contracts]).update(quantity=0)
+        attempts = []
+        lock = threading.Lock()
+
+        def increment(pk):
+            with lock:
+                attempts.append(pk)
+            if mode == 'locked':
+                contract = Contract.objects.select_for_update().get(pk=pk)
+                contract.quantity = contract.quantity + 1
+                contract.save(update_fields=['quantity', 'updated_at'])
+            else:
+                # Whole-row read-modify-write, as a plain serializer update does
+                contract = Contract.objects.get(pk=pk)
+                contract.quantity = contract.quantity + 1
+                contract.save()
+
+        guarded = retry_on_conflict(increment, serializable=(mode == 'serializable'))
+        failures = []
+
+        def operation(index):
+            try:
+                guarded(contracts[index % len(contracts)].pk)
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(operation, range(operations)))
+        elapsed = time.perf_counter() - started
+
+        total = Contract.objects.filter(
+            pk__in=[c.pk for c in contracts]
+        ).aggregate(total=Sum('quantity'))['total'] or Decimal('0')
+        lost = operations - len(failures) - int(total)
+        self.stdout.write(
+            f"{mode:>12}: {operations / elapsed:8.0f} ops/s  "
+            f"retries {len(attempts) - operations:5d}  "
+            f"failed {len(failures):4d}  lost updates {lost:4d}"
+        )
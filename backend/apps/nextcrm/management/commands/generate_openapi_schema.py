@@ -0,0 +1,33 @@
+"""
+Management command to pre-render the OpenAPI schema served at /api/schema/
+for the current code version (see core/openapi.py).
+
+Run it at build or deploy time so no request pays for generation:
+    python manage.py generate_openapi_schema --prune
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import openapi
+
+
+class Command(BaseCommand):
+    help = 'Render the OpenAPI schema as JSON/YAML in every content coding for the current code version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Delete schema files of other code versions')
+
+    def handle(self, *args, **options):
+        version = openapi.code_version()
+        started = time.perf_counter()
+        written = openapi.generate(version)
+        self.stdout.write(f"Code version {version}, generated in {time.perf_counter() - started:.2f} s")
+        for path, size in sorted(written.items()):
+            self.stdout.write(f"  {path.name}: {size:,} bytes")
+
+        if options['prune']:
+            removed = openapi.prune(version)
+            self.stdout.write(f"Removed {len(removed)} files of other versions")
+        self.stdout.write(self.style.SUCCESS(f"Schema written to {openapi.schema_path(version, 'json').parent}"))
@@ -0,0 +1,146 @@
+"""
+Management command to generate high volumes of realistic synthetic data
+for capacity planning and reproducing performance problems.
+
+Rows are streamed into PostgreSQL with COPY from parallel worker processes.
+The same --seed always produces the same rows, e.g.:
+    python manage.py generate_synthetic_data --contracts 5000000 --workers 8 --seed 7
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from apps.nextcrm import positions, synthetic
+from apps.nextcrm.caching import invalidate_models
+from apps.nextcrm.models import (
+    Currency, Cost_Center, Trader, Commodity, Counterparty, Broker, ICOTERM,
+    Delivery_Format, Additive, Sociedad, Trade_Operation_Type, Contract, Contract_Status_History,
+    Counterparty_Facility
+)
+
+REFERENCE_MODELS = {
+    'currency': Currency, 'cost_center': Cost_Center, 'trader': Trader, 'commodity': Commodity,
+    'broker': Broker, 'icoterm': ICOTERM, 'delivery_format': Delivery_Format,
+    'additive': Additive, 'sociedad': Sociedad, 'trade_operation_type': Trade_Operation_Type,
+}
+
+# Every synthetic contract starts its status history at creation
+STATUS_HISTORY_SQL = """
+    INSERT INTO contract_status_history (contract_id, from_status, to_status, transition, changed_at)
+    SELECT id, '', status, 'create', created_at FROM contracts
+     WHERE contract_number LIKE %s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic contracts, counterparties and logs through parallel COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counterparties', type=int, default=10000)
+        parser.add_argument('--facilities', type=int, default=20000)
+        parser.add_argument('--contracts', type=int, default=1000000)
+        parser.add_argument('--audit-logs', type=int, default=2000000)
+        parser.add_argument('--security-logs', type=int, default=1000000)
+        parser.add_argument('--years', type=int, default=5, help='Years of history to spread dates over')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per COPY')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('generate_synthetic_data requires PostgreSQL')
+
+        seed = options['seed']
+        references = {
+            name: list(model.objects.order_by('pk').values_list('pk', flat=True))
+            for name, model in REFERENCE_MODELS.items()
+        }
+        missing = [name for name, ids in references.items() if not ids]
+        if missing:
+            raise CommandError(f'Missing reference data ({", ".join(missing)}); run populate_reference_data first')
+
+        context = {
+            'today': timezone.now().date(),
+            'years': options['years'],
+            'references': references,
+            'user_ids': list(User.objects.order_by('pk').values_list('pk', flat=True)),
+        }
+        counterparty_prefix = f"S{seed % 10000:04d}"
+        contract_prefix = f"SYN-{seed}"
+        if Contract.objects.filter(contract_number__startswith=f"{contract_prefix}-").exists():
+            raise CommandError(f'Synthetic data for seed {seed} already exists; use another --seed')
+
+        started = time.perf_counter()
+        total = 0
+
+        total += self.load('counterparties', options['counterparties'], options,
+                           dict(context, prefix=counterparty_prefix))
+        context['counterparty_ids'] = list(
+            Counterparty.objects.filter(counterparty_code__startswith=counterparty_prefix)
+            .order_by('pk').values_list('pk', flat=True)
+        ) or list(Counterparty.objects.order_by('pk').values_list('pk', flat=True))
+        if not context['counterparty_ids']:
+            raise CommandError('No counterparties to attach contracts to')
+
+        total += self.load('counterparty_facilities', options['facilities'], options, context)
+        total += self.load('contracts', options['contracts'], options, dict(context, prefix=contract_prefix))
+
+        with connection.cursor() as cursor:
+            cursor.execute(STATUS_HISTORY_SQL, [f"{contract_prefix}-%"])
+        ids = Contract.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        context['contract_id_range'] = (ids['low'] or 1, ids['high'] or 1)
+
+        total += self.load('audit_logs', options['audit_logs'], options, context)
+        total += self.load('security_logs', options['security_logs'], options, context)
+
+        # COPY bypasses the signals that maintain positions and cache tags
+        positions.rebuild()
+        invalidate_models([Counterparty, Counterparty_Facility, Contract, Contract_Status_History])
+
+        with connection.cursor() as cursor:
+            for table in synthetic.COLUMNS:
+                cursor.execute(f'ANALYZE {table}')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s overall)'
+        ))
+
+    def load(self, table, rows, options, context):
+        if rows <= 0:
+            return 0
+
+        chunk_size = options['chunk_size']
+        tasks = [
+            (table, options['seed'], chunk, start, min(chunk_size, rows - start))
+            for chunk, start in enumerate(range(0, rows, chunk_size))
+        ]
+        # Plain libpq parameters only: Django's pool and cursor classes stay here
+        params = {
+            key: value for key, value in connections['default'].get_connection_params().items()
+            if key not in ('pool', 'cursor_factory')
+        }
+
+        started = time.perf_counter()
+        # Spawned workers do not inherit this process's open connections
+        with ProcessPoolExecutor(
+            max_workers=min(options['workers'], len(tasks)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=synthetic.init_worker,
+            initargs=(params, context),
+        ) as executor:
+            written = sum(count for count, _ in executor.map(synthetic.copy_chunk, tasks))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{table:>24}: {written:>10,} rows in {elapsed:7.1f}s  {written / elapsed:>10,.0f} rows/s"
+        )
+        return written
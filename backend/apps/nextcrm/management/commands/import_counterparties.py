@@ -0,0 +1,54 @@
+"""
+Management command to bulk import counterparties and their facilities
+from a CSV or XLSX file, e.g.:
+    python manage.py import_counterparties suppliers.xlsx --dry-run
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.nextcrm.counterparty_import import CounterpartyImportError, import_counterparties, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import counterparties from CSV/XLSX, merging duplicates by normalized name and tax id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per transaction')
+        parser.add_argument('--fuzzy-threshold', type=float, default=0.9,
+                            help='Name similarity (0-1) reported as a possible duplicate')
+        parser.add_argument('--create-fuzzy', action='store_true',
+                            help='Import possible duplicates instead of skipping them')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without applying them')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_counterparties(
+                    read_rows(file, options['path']),
+                    batch_size=options['batch_size'],
+                    fuzzy_threshold=options['fuzzy_threshold'],
+                    create_fuzzy=options['create_fuzzy'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, CounterpartyImportError) as exc:
+            raise CommandError(str(exc))
+
+        for duplicate in report['possible_duplicates']:
+            candidate = duplicate['candidate'] or f"row {duplicate['candidate_row']}"
+            self.stdout.write(self.style.WARNING(
+                f"Row {duplicate['row']}: '{duplicate['counterparty_name']}' looks like "
+                f"counterparty {candidate} (score {duplicate['score']}), skipped"
+            ))
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(f"Row {error['row']}: {error['error']}"))
+
+        summary = (
+            f"{report['rows']} rows: {report['created']} created, {report['matched']} matched, "
+            f"{report['facilities_created']} facilities, {len(report['possible_duplicates'])} possible duplicates, "
+            f"{len(report['errors'])} errors ({report['seconds']:.2f}s)"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, no changes applied. {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
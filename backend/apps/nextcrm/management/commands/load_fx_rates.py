@@ -0,0 +1,33 @@
+"""
+Management command to load exchange rates from local files.
+
+Files are CSV, JSON or YAML rows with date, currency, quote and rate
+columns, meaning 1 currency = rate quote on that date, e.g.:
+    date,currency,quote,rate
+    2025-06-30,EUR,USD,1.0718
+Existing rates for the same pair and date are replaced.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.nextcrm.fx import FxError, load_rate_file
+from apps.nextcrm.reference_data import ReferenceDataError
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates (date, currency, quote, rate) from CSV/JSON/YAML files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Rate files')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            started = time.perf_counter()
+            try:
+                loaded = load_rate_file(path)
+            except (OSError, FxError, ReferenceDataError) as exc:
+                raise CommandError(f'{path}: {exc}')
+            self.stdout.write(f"{path}: {loaded} rates in {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS('Exchange rates loaded'))
@@ -0,0 +1,74 @@
+"""
+Management command to profile worker startup in a fresh process: the
+settings import, django.setup() per app (module and AppConfig import,
+models import, ready()), the modules with the largest import time, and
+each cache warmup step (core/startup.py), e.g.:
+    python manage.py profile_startup --top 25
+    DJANGO_SETTINGS_MODULE=core.settings.production python manage.py profile_startup
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.startup import package_totals, parse_importtime
+
+
+class Command(BaseCommand):
+    help = 'Profile import time, app loading and cache warmup of a fresh worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Packages and modules to list')
+        parser.add_argument('--skip-warm', action='store_true', help='Do not run the warmup steps')
+
+    def handle(self, *args, **options):
+        command = [sys.executable, '-X', 'importtime', '-c', 'from core.startup import main; main()']
+        if options['skip_warm']:
+            command.append('--skip-warm')
+        environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        result = subprocess.run(
+            command, cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup failed:\n{result.stderr[-4000:]}')
+
+        timings = json.loads(result.stdout)
+        modules = parse_importtime(result.stderr)
+        top = options['top']
+
+        self.stdout.write(f'Settings module: {settings.SETTINGS_MODULE}')
+        self.stdout.write(f"  {'settings import':<26} {timings['settings'] * 1000:8.1f} ms")
+        self.stdout.write(f"  {'django.setup()':<26} {timings['setup'] * 1000:8.1f} ms")
+
+        self.stdout.write(f"\n{'Apps (ms)':<28} {'import':>8} {'models':>8} {'ready':>8} {'total':>8}")
+        apps = sorted(timings['apps'].items(), key=lambda item: -sum(item[1].values()))
+        for label, phases in apps:
+            self.stdout.write(
+                f"  {label:<26} {phases.get('import', 0) * 1000:8.1f} {phases.get('models', 0) * 1000:8.1f} "
+                f"{phases.get('ready', 0) * 1000:8.1f} {sum(phases.values()) * 1000:8.1f}"
+            )
+
+        self.stdout.write(f'\nTop {top} packages by import time (ms, self time summed over their modules)')
+        packages = sorted(package_totals(modules).items(), key=lambda item: -item[1][0])
+        for package, (self_seconds, count) in packages[:top]:
+            self.stdout.write(f'  {package:<40} {self_seconds * 1000:8.1f}  ({count} modules)')
+
+        self.stdout.write(f'\nTop {top} modules by cumulative import time (ms)')
+        for module, _, cumulative, _ in sorted(modules, key=lambda module: -module[2])[:top]:
+            self.stdout.write(f'  {module:<60} {cumulative * 1000:8.1f}')
+
+        total_import = sum(self_seconds for _, self_seconds, _, _ in modules)
+        self.stdout.write(f'\n{len(modules)} modules imported in {total_import * 1000:.1f} ms')
+
+        if timings['warm']:
+            self.stdout.write('\nWarmup')
+            for step, (seconds, detail) in timings['warm'].items():
+                if seconds is None:
+                    self.stdout.write(self.style.WARNING(f'  {step:<26} failed: {detail}'))
+                else:
+                    self.stdout.write(f'  {step:<26} {seconds * 1000:8.1f} ms  {detail}')
+        self.stdout.write(self.style.SUCCESS('Startup profile complete'))
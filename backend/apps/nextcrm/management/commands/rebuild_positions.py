@@ -0,0 +1,25 @@
+"""
+Management command to recompute all counterparty positions from contracts.
+Positions are kept up to date on every contract write; run this after
+loading contracts outside the ORM (COPY, raw SQL) or changing which trade
+operation types open positions.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.nextcrm import positions
+from apps.nextcrm.models import Counterparty_Position
+
+
+class Command(BaseCommand):
+    help = 'Recompute the counterparty_positions table from approved and executed contracts'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        positions.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {Counterparty_Position.objects.count()} positions in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nextcrm", "0004_remove_contract_commodity_group"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
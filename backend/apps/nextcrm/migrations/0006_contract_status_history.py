@@ -0,0 +1,59 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Existing contracts have no recorded history. Every contract is seeded as a
+# draft at created_at; one that has moved on gets a second row with its
+# current status at updated_at, named after the workflow transition when a
+# single one leads there from draft and 'backfill' otherwise. Intermediate
+# statuses (e.g. approved before executed) were never recorded, so "as of"
+# queries report such a contract as draft until its last update.
+BACKFILL_SQL = [
+    """
+    INSERT INTO contract_status_history (contract_id, from_status, to_status, transition, changed_at)
+    SELECT id, '', 'draft', 'create', created_at FROM contracts
+    """,
+    """
+    INSERT INTO contract_status_history (contract_id, from_status, to_status, transition, changed_at)
+    SELECT id, 'draft', status,
+           CASE status WHEN 'approved' THEN 'approve' WHEN 'cancelled' THEN 'cancel' ELSE 'backfill' END,
+           GREATEST(updated_at, created_at)
+    FROM contracts WHERE status <> 'draft'
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("nextcrm", "0005_contract_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Contract_Status_History",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("from_status", models.CharField(blank=True, choices=[("draft", "Draft"), ("approved", "Approved"), ("executed", "Executed"), ("completed", "Completed"), ("cancelled", "Cancelled")], max_length=20)),
+                ("to_status", models.CharField(choices=[("draft", "Draft"), ("approved", "Approved"), ("executed", "Executed"), ("completed", "Completed"), ("cancelled", "Cancelled")], max_length=20)),
+                ("transition", models.CharField(max_length=20)),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("changed_by", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ("contract", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="status_history", to="nextcrm.contract")),
+            ],
+            options={
+                "verbose_name": "Contract Status History",
+                "verbose_name_plural": "Contract Status History",
+                "db_table": "contract_status_history",
+                "ordering": ["-changed_at", "-id"],
+                "indexes": [
+                    models.Index(fields=["contract", "-changed_at", "-id"], name="status_history_as_of_idx"),
+                    models.Index(fields=["changed_at"], name="status_history_changed_idx"),
+                ],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
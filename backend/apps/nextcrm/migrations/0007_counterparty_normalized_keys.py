@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from apps.nextcrm.normalization import normalize_name, normalize_tax_id
+
+
+def fill_normalized_keys(apps, schema_editor):
+    Counterparty = apps.get_model('nextcrm', 'Counterparty')
+    counterparties = list(Counterparty.objects.only('counterparty_name', 'tax_id'))
+    for counterparty in counterparties:
+        counterparty.normalized_name = normalize_name(counterparty.counterparty_name)[:100]
+        counterparty.normalized_tax_id = normalize_tax_id(counterparty.tax_id)[:30]
+    Counterparty.objects.bulk_update(
+        counterparties, ['normalized_name', 'normalized_tax_id'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nextcrm", "0006_contract_status_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="counterparty",
+            name="normalized_name",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="counterparty",
+            name="normalized_tax_id",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=30),
+        ),
+        migrations.RunPython(fill_normalized_keys, migrations.RunPython.noop),
+    ]
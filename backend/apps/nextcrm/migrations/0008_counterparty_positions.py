@@ -0,0 +1,83 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_position_signs(apps, schema_editor):
+    Trade_Operation_Type = apps.get_model('nextcrm', 'Trade_Operation_Type')
+    Trade_Operation_Type.objects.filter(operation_code='BUY').update(position_sign=1)
+    Trade_Operation_Type.objects.filter(operation_code='SELL').update(position_sign=-1)
+
+
+# Same aggregation as positions.REBUILD_SQL, for the contracts that already exist
+BACKFILL_SQL = """
+    INSERT INTO counterparty_positions
+           (counterparty_id, commodity_id, delivery_month, long_quantity, short_quantity,
+            net_quantity, long_value, short_value, net_value, contract_count, updated_at)
+    SELECT counterparty_id, commodity_id, delivery_month, long_quantity, short_quantity,
+           long_quantity - short_quantity, long_value, short_value, long_value - short_value,
+           contract_count, now()
+      FROM (
+        SELECT c.counterparty_id, c.commodity_id, date_trunc('month', c.delivery_period)::date AS delivery_month,
+               COALESCE(SUM(c.quantity) FILTER (WHERE t.position_sign > 0), 0) AS long_quantity,
+               COALESCE(SUM(c.quantity) FILTER (WHERE t.position_sign < 0), 0) AS short_quantity,
+               COALESCE(ROUND(SUM(c.quantity * c.price * c.forex) FILTER (WHERE t.position_sign > 0), 2), 0) AS long_value,
+               COALESCE(ROUND(SUM(c.quantity * c.price * c.forex) FILTER (WHERE t.position_sign < 0), 2), 0) AS short_value,
+               COUNT(*) AS contract_count
+          FROM contracts AS c
+          JOIN trade_operation_types AS t ON t.id = c.trade_operation_type_id AND t.position_sign <> 0
+         WHERE c.status IN ('approved', 'executed') AND c.is_active
+         GROUP BY 1, 2, 3
+      ) AS totals
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nextcrm", "0007_counterparty_normalized_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trade_operation_type",
+            name="position_sign",
+            field=models.SmallIntegerField(choices=[(1, "Long (buy)"), (-1, "Short (sell)"), (0, "No position")], default=0),
+        ),
+        migrations.RunPython(set_position_signs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(fields=["counterparty", "commodity", "delivery_period"], name="contract_position_key_idx"),
+        ),
+        migrations.CreateModel(
+            name="Counterparty_Position",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("delivery_month", models.DateField()),
+                ("long_quantity", models.DecimalField(decimal_places=3, default=0, max_digits=20)),
+                ("short_quantity", models.DecimalField(decimal_places=3, default=0, max_digits=20)),
+                ("net_quantity", models.DecimalField(decimal_places=3, default=0, max_digits=20)),
+                ("long_value", models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ("short_value", models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ("net_value", models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ("contract_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("commodity", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="positions", to="nextcrm.commodity")),
+                ("counterparty", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="positions", to="nextcrm.counterparty")),
+            ],
+            options={
+                "verbose_name": "Counterparty Position",
+                "verbose_name_plural": "Counterparty Positions",
+                "db_table": "counterparty_positions",
+                "ordering": ["counterparty", "commodity", "delivery_month"],
+                "indexes": [
+                    models.Index(fields=["commodity", "delivery_month"], name="position_commodity_month_idx"),
+                    models.Index(fields=["delivery_month"], name="position_month_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(fields=("counterparty", "commodity", "delivery_month"), name="counterparty_position_key"),
+                ],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
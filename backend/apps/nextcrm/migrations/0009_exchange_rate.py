@@ -0,0 +1,34 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nextcrm", "0008_counterparty_positions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Exchange_Rate",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("rate_date", models.DateField()),
+                ("rate", models.DecimalField(decimal_places=10, max_digits=20)),
+                ("source", models.CharField(blank=True, max_length=50)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("currency", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="exchange_rates", to="nextcrm.currency")),
+                ("quote_currency", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="quoted_exchange_rates", to="nextcrm.currency")),
+            ],
+            options={
+                "verbose_name": "Exchange Rate",
+                "verbose_name_plural": "Exchange Rates",
+                "db_table": "exchange_rates",
+                "ordering": ["currency", "quote_currency", "-rate_date"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("currency", "quote_currency", "rate_date"), name="exchange_rate_pair_date"),
+                ],
+            },
+        ),
+    ]
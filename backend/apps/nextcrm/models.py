@@ -2,9 +2,13 @@
 Core business models for NextCRM commodity trading system.
 """
 
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 from django.utils import timezone
 
+from .normalization import normalize_name, normalize_tax_id
+from .transactions import advisory_xact_lock
+
 
 class Currency(models.Model):
     currency_code = models.CharField(max_length=3, unique=True)  # EUR, USD
@@ -23,6 +27,34 @@ class Currency(models.Model):
         return f"{self.currency_code} - {self.currency_name}"
 
 
+class Exchange_Rate(models.Model):
+    """Units of quote_currency per unit of currency on rate_date, loaded by load_fx_rates"""
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='exchange_rates')
+    quote_currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='quoted_exchange_rates')
+    rate_date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    source = models.CharField(max_length=50, blank=True)  # File the rate was loaded from
+
+    # Audit fields
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'exchange_rates'
+        verbose_name = 'Exchange Rate'
+        verbose_name_plural = 'Exchange Rates'
+        ordering = ['currency', 'quote_currency', '-rate_date']
+        constraints = [
+            # Also serves "latest rate on or before a date" lookups
+            models.UniqueConstraint(
+                fields=['currency', 'quote_currency', 'rate_date'], name='exchange_rate_pair_date'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.rate_date} {self.currency_id}/{self.quote_currency_id} {self.rate}"
+
+
 class Cost_Center(models.Model):
     cost_center_name = models.CharField(max_length=50)
     description = models.TextField(blank=True)
@@ -149,10 +181,16 @@ class Counterparty(models.Model):
     is_supplier = models.BooleanField(default=False)
     is_customer = models.BooleanField(default=True)
     
+    # Duplicate detection keys, derived from counterparty_name and tax_id
+    normalized_name = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
+    normalized_tax_id = models.CharField(max_length=30, blank=True, editable=False, db_index=True)
+    
     # Audit fields
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    NORMALIZED_FIELDS = ['normalized_name', 'normalized_tax_id']
+    
     class Meta:
         db_table = 'counterparties'
         verbose_name_plural = 'Counterparties'
@@ -160,6 +198,17 @@ class Counterparty(models.Model):
     def __str__(self):
         return self.counterparty_name
 
+    def set_normalized_fields(self):
+        self.normalized_name = normalize_name(self.counterparty_name)[:100]
+        self.normalized_tax_id = normalize_tax_id(self.tax_id)[:30]
+
+    def save(self, *args, **kwargs):
+        self.set_normalized_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'counterparty_name', 'tax_id'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(self.NORMALIZED_FIELDS)
+        super().save(*args, **kwargs)
+
 
 class Broker(models.Model):
     broker_name = models.CharField(max_length=100)
@@ -249,9 +298,17 @@ class Sociedad(models.Model):
 
 
 class Trade_Operation_Type(models.Model):
+    POSITION_SIGN_CHOICES = [
+        (1, 'Long (buy)'),
+        (-1, 'Short (sell)'),
+        (0, 'No position'),
+    ]
+
     trade_operation_type_name = models.CharField(max_length=50)
     operation_code = models.CharField(max_length=10, unique=True, blank=True)
     description = models.TextField(blank=True)
+    # How contracts of this type count towards counterparty positions
+    position_sign = models.SmallIntegerField(choices=POSITION_SIGN_CHOICES, default=0)
     
     # Audit fields
     created_at = models.DateTimeField(auto_now_add=True)
@@ -319,6 +376,7 @@ class Contract(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    version = models.PositiveIntegerField(default=1)  # Bumped on every update, for optimistic concurrency
     
     class Meta:
         db_table = 'contracts'
@@ -327,28 +385,41 @@ class Contract(models.Model):
             models.Index(fields=['status', 'date']),
             models.Index(fields=['trader', 'date']),
             models.Index(fields=['counterparty', 'date']),
+            # Contracts of one counterparty position (see positions.py)
+            models.Index(fields=['counterparty', 'commodity', 'delivery_period'], name='contract_position_key_idx'),
         ]
     
     def save(self, *args, **kwargs):
-        # Auto-generate contract number
-        if not self.contract_number:
-            year = timezone.now().year
-            last_contract = Contract.objects.filter(
-                contract_number__startswith=f"CONT-{year}"
-            ).order_by('-id').first()
-            
-            if last_contract and last_contract.contract_number:
-                try:
-                    last_number = int(last_contract.contract_number.split('-')[-1])
-                    new_number = last_number + 1
-                except (ValueError, IndexError):
-                    new_number = 1
-            else:
-                new_number = 1
+        if self.contract_number:
+            return super().save(*args, **kwargs)
+
+        # Auto-generate contract number. Concurrent creators are serialized on
+        # an advisory lock held until the new row is committed, so two
+        # contracts can never be given the same number.
+        using = kwargs.get('using') or DEFAULT_DB_ALIAS
+        try:
+            with transaction.atomic(using=using):
+                year = timezone.now().year
+                advisory_xact_lock(f"contract-number-{year}", using=using)
+                last_contract = Contract.objects.using(using).filter(
+                    contract_number__startswith=f"CONT-{year}"
+                ).order_by('-id').first()
                 
-            self.contract_number = f"CONT-{year}-{new_number:06d}"
-        
-        super().save(*args, **kwargs)
+                if last_contract and last_contract.contract_number:
+                    try:
+                        last_number = int(last_contract.contract_number.split('-')[-1])
+                        new_number = last_number + 1
+                    except (ValueError, IndexError):
+                        new_number = 1
+                else:
+                    new_number = 1
+                    
+                self.contract_number = f"CONT-{year}-{new_number:06d}"
+                super().save(*args, **kwargs)
+        except Exception:
+            # The number was never committed; let a retry allocate a fresh one
+            self.contract_number = ''
+            raise
     
     @property
     def commodity_group(self):
@@ -380,6 +451,76 @@ class Contract(models.Model):
         return f"{self.contract_number} - {self.counterparty.counterparty_name}"
 
 
+class Contract_Status_History(models.Model):
+    """Append-only log of contract status changes, one row per transition"""
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=20, choices=Contract.STATUS_CHOICES, blank=True)  # Blank on creation
+    to_status = models.CharField(max_length=20, choices=Contract.STATUS_CHOICES)
+    transition = models.CharField(max_length=20)  # Workflow transition name, 'create' or 'backfill'
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'contract_status_history'
+        verbose_name = 'Contract Status History'
+        verbose_name_plural = 'Contract Status History'
+        ordering = ['-changed_at', '-id']
+        indexes = [
+            # Latest row per contract at or before a given time ("status as of T")
+            models.Index(fields=['contract', '-changed_at', '-id'], name='status_history_as_of_idx'),
+            models.Index(fields=['changed_at'], name='status_history_changed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Contract status history is append-only')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Contract status history is append-only')
+
+    def __str__(self):
+        return f"{self.contract_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class Counterparty_Position(models.Model):
+    """
+    Open position with a counterparty in one commodity and delivery month,
+    aggregated from its approved and executed contracts. Maintained by
+    positions.refresh() on every contract write; never edited directly.
+    Values are quantity * price * forex.
+    """
+    counterparty = models.ForeignKey(Counterparty, on_delete=models.CASCADE, related_name='positions')
+    commodity = models.ForeignKey(Commodity, on_delete=models.CASCADE, related_name='positions')
+    delivery_month = models.DateField()  # First day of the contracts' delivery_period month
+    long_quantity = models.DecimalField(max_digits=20, decimal_places=3, default=0)
+    short_quantity = models.DecimalField(max_digits=20, decimal_places=3, default=0)
+    net_quantity = models.DecimalField(max_digits=20, decimal_places=3, default=0)
+    long_value = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    short_value = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    net_value = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    contract_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'counterparty_positions'
+        verbose_name = 'Counterparty Position'
+        verbose_name_plural = 'Counterparty Positions'
+        ordering = ['counterparty', 'commodity', 'delivery_month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['counterparty', 'commodity', 'delivery_month'], name='counterparty_position_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['commodity', 'delivery_month'], name='position_commodity_month_idx'),
+            models.Index(fields=['delivery_month'], name='position_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.counterparty_id}/{self.commodity_id}/{self.delivery_month:%Y-%m}: {self.net_quantity}"
+
+
 class Counterparty_Facility(models.Model):
     """Counterparty facilities/locations"""
     counterparty = models.ForeignKey(Counterparty, on_delete=models.CASCADE, related_name='facilities')
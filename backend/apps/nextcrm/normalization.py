@@ -0,0 +1,38 @@
+"""
+Normalization of counterparty names and tax ids for duplicate detection.
+
+Kept free of model imports so migrations can use it.
+"""
+
+import re
+import unicodedata
+
+# Legal-form words that do not distinguish one company from another
+LEGAL_SUFFIXES = {
+    'ag', 'bv', 'co', 'company', 'corp', 'corporation', 'gmbh', 'inc', 'incorporated',
+    'limited', 'llc', 'llp', 'ltd', 'nv', 'plc', 'pte', 'sa', 'sarl', 'sas', 'sl', 'spa', 'srl',
+}
+
+_non_alphanumeric = re.compile(r'[^0-9a-z]+')
+
+
+def strip_accents(value):
+    return ''.join(
+        char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char)
+    )
+
+
+def normalize_name(name):
+    """'Acme Trading Corp.' and 'ACME  TRADING, Inc' both become 'acme trading'"""
+    value = strip_accents(name or '').casefold().replace('&', ' and ')
+    # Join dotted abbreviations first so 'S.A.' becomes 'sa', not 's a'
+    value = value.replace('.', '')
+    words = _non_alphanumeric.sub(' ', value).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def normalize_tax_id(tax_id):
+    """Upper-case alphanumerics only: 'b-12.345.678' becomes 'B12345678'"""
+    return re.sub(r'[^0-9A-Z]', '', strip_accents(tax_id or '').upper())
@@ -0,0 +1,157 @@
+"""
+Counterparty positions: open exposure per counterparty, commodity and
+delivery month, kept in the counterparty_positions table.
+
+A position key is (counterparty_id, commodity_id, delivery month). Every
+contract write refreshes the keys it touches by re-aggregating only the
+contracts of those keys (contract_position_key_idx), so the cost of a
+write does not grow with the contract history and reads are a plain
+indexed scan of the positions table.
+
+Only approved and executed contracts open a position. Trade operation
+types give the direction: position_sign 1 is long (buy), -1 short (sell)
+and 0 types do not count.
+"""
+
+from datetime import date
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Contract, Counterparty_Position, Trade_Operation_Type
+from .transactions import advisory_xact_locks
+
+OPEN_STATUSES = ['approved', 'executed']
+
+# Contract fields that can move a contract into, out of or between positions
+POSITION_FIELDS = {
+    'counterparty', 'commodity', 'delivery_period', 'status', 'is_active',
+    'trade_operation_type', 'quantity', 'price', 'forex',
+}
+
+# Totals per position key over open contracts; {month} is the key's month
+# expression and {join} narrows the contracts to the requested keys.
+POSITION_TOTALS = f"""
+    SELECT c.counterparty_id, c.commodity_id, {{month}} AS delivery_month,
+           COALESCE(SUM(c.quantity) FILTER (WHERE t.position_sign > 0), 0) AS long_quantity,
+           COALESCE(SUM(c.quantity) FILTER (WHERE t.position_sign < 0), 0) AS short_quantity,
+           COALESCE(ROUND(SUM(c.quantity * c.price * c.forex) FILTER (WHERE t.position_sign > 0), 2), 0) AS long_value,
+           COALESCE(ROUND(SUM(c.quantity * c.price * c.forex) FILTER (WHERE t.position_sign < 0), 2), 0) AS short_value,
+           COUNT(*) AS contract_count
+      FROM {Contract._meta.db_table} AS c
+      JOIN {Trade_Operation_Type._meta.db_table} AS t
+        ON t.id = c.trade_operation_type_id AND t.position_sign <> 0
+      {{join}}
+     WHERE c.status = ANY(%(statuses)s) AND c.is_active
+     GROUP BY 1, 2, 3
+"""
+
+UPSERT_POSITIONS = f"""
+    INSERT INTO {Counterparty_Position._meta.db_table} AS p
+           (counterparty_id, commodity_id, delivery_month, long_quantity, short_quantity,
+            net_quantity, long_value, short_value, net_value, contract_count, updated_at)
+    SELECT counterparty_id, commodity_id, delivery_month, long_quantity, short_quantity,
+           long_quantity - short_quantity, long_value, short_value, long_value - short_value,
+           contract_count, %(now)s
+      FROM totals
+        ON CONFLICT (counterparty_id, commodity_id, delivery_month) DO UPDATE
+       SET long_quantity = EXCLUDED.long_quantity, short_quantity = EXCLUDED.short_quantity,
+           net_quantity = EXCLUDED.net_quantity, long_value = EXCLUDED.long_value,
+           short_value = EXCLUDED.short_value, net_value = EXCLUDED.net_value,
+           contract_count = EXCLUDED.contract_count, updated_at = EXCLUDED.updated_at
+"""
+
+CONTRACT_MONTH = "date_trunc('month', c.delivery_period)::date"
+
+# Contracts of the requested keys only, through contract_position_key_idx
+KEY_JOIN = """
+      JOIN keys AS k
+        ON c.counterparty_id = k.counterparty_id AND c.commodity_id = k.commodity_id
+       AND c.delivery_period >= k.delivery_month
+       AND c.delivery_period < k.delivery_month + INTERVAL '1 month'"""
+
+REFRESH_SQL = f"""
+    WITH keys AS (
+        SELECT DISTINCT * FROM unnest(%(counterparties)s::bigint[], %(commodities)s::bigint[], %(months)s::date[])
+            AS k(counterparty_id, commodity_id, delivery_month)
+    ), totals AS ({POSITION_TOTALS.format(month='k.delivery_month', join=KEY_JOIN)}
+    ), upserted AS ({UPSERT_POSITIONS}
+     RETURNING p.id
+    )
+    DELETE FROM {Counterparty_Position._meta.db_table} AS p
+     USING keys AS k
+     WHERE p.counterparty_id = k.counterparty_id AND p.commodity_id = k.commodity_id
+       AND p.delivery_month = k.delivery_month
+       AND NOT EXISTS (
+           SELECT 1 FROM totals
+            WHERE totals.counterparty_id = k.counterparty_id AND totals.commodity_id = k.commodity_id
+              AND totals.delivery_month = k.delivery_month
+       )
+"""
+
+REBUILD_SQL = f"""
+    WITH totals AS ({POSITION_TOTALS.format(month=CONTRACT_MONTH, join='')}
+    ), upserted AS ({UPSERT_POSITIONS}
+     RETURNING p.id
+    )
+    DELETE FROM {Counterparty_Position._meta.db_table} AS p
+     WHERE NOT EXISTS (
+           SELECT 1 FROM totals
+            WHERE totals.counterparty_id = p.counterparty_id AND totals.commodity_id = p.commodity_id
+              AND totals.delivery_month = p.delivery_month
+       )
+"""
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def position_key(counterparty_id, commodity_id, delivery_period):
+    return (counterparty_id, commodity_id, month_start(delivery_period))
+
+
+def contract_key(contract):
+    return position_key(contract.counterparty_id, contract.commodity_id, contract.delivery_period)
+
+
+def refresh(keys, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute the positions for keys from their contracts. Each key is
+    locked until the transaction ends, so concurrent writers refresh one
+    after the other and the last one sees every committed contract.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    with transaction.atomic(using=using):
+        advisory_xact_locks([f"position-{cp}-{commodity}-{month}" for cp, commodity, month in keys], using)
+        with connections[using].cursor() as cursor:
+            cursor.execute(REFRESH_SQL, {
+                'counterparties': [key[0] for key in keys],
+                'commodities': [key[1] for key in keys],
+                'months': [key[2] for key in keys],
+                'statuses': OPEN_STATUSES,
+                'now': timezone.now(),
+            })
+
+
+def refresh_contracts(contracts, using=DEFAULT_DB_ALIAS):
+    """Refresh the positions of every contract in a queryset"""
+    refresh(
+        (position_key(*row) for row in contracts.using(using).order_by().values_list(
+            'counterparty_id', 'commodity_id', 'delivery_period'
+        ).distinct()),
+        using
+    )
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """
+    Recompute every position from scratch, e.g. after loading contracts
+    with COPY. Incremental refreshes wait for the table lock.
+    """
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {Counterparty_Position._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(REBUILD_SQL, {'statuses': OPEN_STATUSES, 'now': timezone.now()})
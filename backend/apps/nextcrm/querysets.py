@@ -0,0 +1,41 @@
+"""
+Action-aware queryset shaping for NextCRM viewsets.
+
+A viewset's class-level ``queryset`` is the full, write-safe queryset.
+Read actions narrow it to what their serializer renders: list pages load
+only the list columns (plus SQL-computed counts), retrieve adds the
+prefetches of the detail serializer, and export drops related-object
+loading entirely because it reads plain values.
+"""
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+class ActionQuerysetMixin:
+    """
+    Pass the base queryset through ``shape_<action>_queryset(queryset)``
+    when the viewset defines one. Actions without a shaper, including
+    all writes, keep the base queryset.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        shape = getattr(self, f'shape_{self.action}_queryset', None)
+        return shape(queryset) if shape is not None else queryset
+
+
+def related_count(model, field):
+    """
+    Correlated ``COUNT(*)`` of ``model`` rows whose ``field`` points at the
+    outer row. Unlike ``Count()`` over joins, several of these on one
+    queryset do not multiply each other's rows or need GROUP BY.
+    """
+    counts = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
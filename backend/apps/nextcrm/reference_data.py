@@ -0,0 +1,255 @@
+"""
+Diff-based reference data sync.
+
+Each reference model has a fixture file (YAML, CSV or JSON) holding its
+rows. Rows are matched to existing records by natural key, never by every
+field, so changing a description updates the record instead of creating a
+duplicate. Each table costs one SELECT plus at most one bulk INSERT, one
+bulk UPDATE and one DELETE, however many rows it has.
+
+Foreign keys in fixtures name the parent by its natural key, e.g. a
+commodity type row has ``commodity_group: Grains``. A natural key may span
+several fields: facilities are keyed by counterparty and facility name.
+Synced trade settings are broadcast to every process's settings snapshot.
+"""
+
+import csv
+import json
+import time
+from functools import partial
+from pathlib import Path
+from typing import NamedTuple, Union
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from . import trade_settings
+from .caching import invalidate_models
+from .models import (
+    Currency, Cost_Center, Trader, Commodity_Group, Commodity_Type,
+    Commodity_Subtype, Commodity, Counterparty, Counterparty_Facility, Broker, ICOTERM,
+    Delivery_Format, Additive, Sociedad, Trade_Operation_Type, Trade_Setting
+)
+
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures' / 'reference_data'
+FIXTURE_EXTENSIONS = ('.yaml', '.yml', '.json', '.csv')
+
+# Fields the sync never writes from fixtures
+AUTO_FIELDS = {'id', 'created_at', 'updated_at'}
+
+
+class ReferenceTable(NamedTuple):
+    name: str
+    model: type
+    # A field name, or a tuple of them for a composite key
+    natural_key: Union[str, tuple]
+
+    @property
+    def key_attnames(self):
+        names = (self.natural_key,) if isinstance(self.natural_key, str) else self.natural_key
+        return tuple(self.model._meta.get_field(name).attname for name in names)
+
+
+# Parents before children, so foreign keys can be resolved by natural key
+REFERENCE_TABLES = [
+    ReferenceTable('currencies', Currency, 'currency_code'),
+    ReferenceTable('cost_centers', Cost_Center, 'cost_center_name'),
+    ReferenceTable('traders', Trader, 'email'),
+    ReferenceTable('commodity_groups', Commodity_Group, 'commodity_group_name'),
+    ReferenceTable('commodity_types', Commodity_Type, 'commodity_type_name'),
+    ReferenceTable('commodity_subtypes', Commodity_Subtype, 'commodity_subtype_name'),
+    ReferenceTable('commodities', Commodity, 'commodity_name_short'),
+    ReferenceTable('counterparties', Counterparty, 'counterparty_code'),
+    ReferenceTable(
+        'counterparty_facilities', Counterparty_Facility, ('counterparty', 'counterparty_facility_name')
+    ),
+    ReferenceTable('brokers', Broker, 'broker_code'),
+    ReferenceTable('icoterms', ICOTERM, 'icoterm_code'),
+    ReferenceTable('delivery_formats', Delivery_Format, 'delivery_format_name'),
+    ReferenceTable('additives', Additive, 'additive_name'),
+    ReferenceTable('sociedades', Sociedad, 'tax_id'),
+    ReferenceTable('trade_operation_types', Trade_Operation_Type, 'operation_code'),
+    ReferenceTable('trade_settings', Trade_Setting, 'setting_name'),
+]
+
+
+class ReferenceDataError(Exception):
+    pass
+
+
+class SyncResult(NamedTuple):
+    table: str
+    created: int
+    updated: int
+    deleted: int
+    unchanged: int
+    seconds: float
+
+
+def get_key(attnames, get):
+    """Natural key from get(attname): the value, or a tuple of values for a composite key"""
+    values = tuple(get(name) for name in attnames)
+    return values[0] if len(values) == 1 else values
+
+
+def existing_keys(table):
+    """natural key -> pk of every row of table"""
+    rows = table.model.objects.values_list(*table.key_attnames, 'pk')
+    return {row[0] if len(row) == 2 else row[:-1]: row[-1] for row in rows}
+
+
+def find_fixture(directory, table):
+    for extension in FIXTURE_EXTENSIONS:
+        path = Path(directory) / f'{table}{extension}'
+        if path.exists():
+            return path
+    return None
+
+
+def read_fixture(path):
+    """Rows of a fixture file as a list of dicts"""
+    path = Path(path)
+    with path.open(encoding='utf-8', newline='') as handle:
+        if path.suffix in ('.yaml', '.yml'):
+            import yaml
+            rows = yaml.safe_load(handle) or []
+        elif path.suffix == '.json':
+            rows = json.load(handle)
+        else:
+            rows = list(csv.DictReader(handle))
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ReferenceDataError(f'{path}: expected a list of rows')
+    return rows
+
+
+def clean_row(table, row, parent_keys):
+    """Convert fixture values to model values, resolving foreign keys"""
+    cleaned = {}
+    for name, value in row.items():
+        try:
+            field = table.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ReferenceDataError(f'{table.name}: unknown field {name!r}')
+        if name in AUTO_FIELDS:
+            continue
+
+        if field.is_relation:
+            parents = parent_keys[field.related_model]
+            if value not in parents:
+                raise ReferenceDataError(
+                    f'{table.name}: {name} {value!r} does not match any {field.related_model.__name__}'
+                )
+            cleaned[field.attname] = parents[value]
+        elif value in (None, '') and not field.null:
+            # CSV cannot tell an empty string from a missing value
+            cleaned[field.attname] = '' if field.empty_strings_allowed else field.get_default()
+        else:
+            cleaned[field.attname] = field.to_python(value)
+    return cleaned
+
+
+def sync_table(table, rows, parent_keys, prune=False):
+    """
+    Bring one table in line with rows. Returns the SyncResult and the
+    natural key -> pk map used to resolve children's foreign keys.
+    """
+    started = time.perf_counter()
+    model = table.model
+    attnames = table.key_attnames
+
+    existing = {}
+    for instance in model.objects.order_by('pk'):
+        # With historical duplicates the oldest row owns the key
+        existing.setdefault(get_key(attnames, partial(getattr, instance)), instance)
+
+    wanted = {}
+    for row in rows:
+        cleaned = clean_row(table, row, parent_keys)
+        if any(cleaned.get(name) in (None, '') for name in attnames):
+            raise ReferenceDataError(f'{table.name}: row without {table.natural_key}: {row}')
+        key = get_key(attnames, cleaned.get)
+        if key in wanted:
+            raise ReferenceDataError(f'{table.name}: duplicate {table.natural_key} {key!r}')
+        wanted[key] = cleaned
+
+    now = timezone.now()
+    to_create, to_update, changed_fields = [], [], set()
+    unchanged = 0
+    for key, values in wanted.items():
+        instance = existing.get(key)
+        if instance is None:
+            to_create.append(model(**values))
+            continue
+        changed = {name for name, value in values.items() if getattr(instance, name) != value}
+        if not changed:
+            unchanged += 1
+            continue
+        for name in changed:
+            setattr(instance, name, values[name])
+        instance.updated_at = now
+        changed_fields |= changed
+        to_update.append(instance)
+
+    if hasattr(model, 'set_normalized_fields'):
+        # bulk_create/bulk_update bypass save(), which derives these
+        for instance in to_create + to_update:
+            instance.set_normalized_fields()
+        if to_update:
+            changed_fields |= set(model.NORMALIZED_FIELDS)
+
+    created = model.objects.bulk_create(to_create, batch_size=1000)
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(changed_fields | {'updated_at'}), batch_size=1000)
+
+    deleted = 0
+    stale = [instance.pk for key, instance in existing.items() if key not in wanted]
+    if prune and stale:
+        try:
+            with transaction.atomic():
+                deleted = model.objects.filter(pk__in=stale).delete()[1].get(model._meta.label, 0)
+        except ProtectedError:
+            raise ReferenceDataError(f'{table.name}: cannot prune rows that are still referenced')
+
+    keys = {key: instance.pk for key, instance in existing.items() if key in wanted or not deleted}
+    keys.update({get_key(attnames, partial(getattr, instance)): instance.pk for instance in created})
+    result = SyncResult(
+        table.name, len(created), len(to_update), deleted, unchanged,
+        time.perf_counter() - started
+    )
+    return result, keys
+
+
+def sync_reference_data(directory=FIXTURE_DIR, tables=None, prune=False, dry_run=False):
+    """
+    Sync every reference table that has a fixture in directory, in one
+    transaction. With dry_run the changes are computed and rolled back.
+    """
+    parent_keys = {}
+    results = []
+    with transaction.atomic():
+        for table in REFERENCE_TABLES:
+            path = find_fixture(directory, table.name)
+            if path is None or (tables and table.name not in tables):
+                # Children may still refer to this table's existing rows
+                parent_keys[table.model] = existing_keys(table)
+                continue
+            result, parent_keys[table.model] = sync_table(
+                table, read_fixture(path), parent_keys, prune=prune
+            )
+            results.append(result)
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # Bulk writes bypass the signals that invalidate cache tags
+            models = {table.name: table.model for table in REFERENCE_TABLES}
+            changed = {
+                models[result.table] for result in results
+                if result.created or result.updated or result.deleted
+            }
+            invalidate_models(changed)
+            if Trade_Setting in changed:
+                # ... and the signal that reloads the settings snapshot
+                transaction.on_commit(trade_settings.notify_change)
+    return results
@@ -0,0 +1,197 @@
+"""
+Contract book reporting computed on columnar NumPy arrays.
+
+The filtered contracts are read in one query as float/int columns (the
+database does the Decimal -> float casts, so no Python Decimal objects are
+built) and every group-by is a np.unique + np.bincount pass over those
+columns. Figures are therefore floats rounded for display, which is what
+reports need; anything that must balance to the cent stays in the ORM.
+
+Base currency figures use each row's exchange rate, looked up by the
+same query (fx.rate_to_base); rows without a rate are left out of those
+figures and counted in unconverted_contracts.
+
+The report endpoint caches the rendered report (core.response_cache) by a
+hash of the normalized filter parameters for CONTRACT_REPORT_CACHE_TIMEOUT
+seconds, or until a contract, exchange rate or rendered name changes.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear, TruncMonth
+
+from .fx import base_currency, rate_to_base
+from .models import Broker, Commodity
+
+REPORT_CACHE_PREFIX = 'contracts:report:'
+# The report renders contract figures, exchange rates and commodity/broker names
+REPORT_CACHE_TAGS = ['contract', 'refdata:exchange_rate', 'refdata:commodity', 'refdata:broker']
+
+# Columns read per contract; all of them arrive as float64 (NaN for a missing rate)
+COLUMNS = [
+    'commodity', 'broker', 'month', 'quantity', 'price', 'forex', 'broker_fee', 'freight_cost',
+    'base_rate', 'fee_base_rate',
+]
+
+# Composite group key: commodity id * MONTH_SPAN + month index
+MONTH_SPAN = 10 ** 6
+
+
+def fetch_columns(queryset):
+    """The report columns of queryset as a dict of NumPy arrays"""
+    float_columns = {
+        name: Cast(name, FloatField())
+        for name in ('quantity', 'price', 'forex', 'broker_fee', 'freight_cost')
+    }
+    rows = queryset.order_by().values_list(
+        'commodity_id', 'broker_id',
+        # Months since year 0, so they sort and group as integers
+        ExtractYear('date') * 12 + ExtractMonth('date') - 1,
+        *float_columns.values(),
+        Cast(rate_to_base('trade_currency', 'date'), FloatField()),
+        Cast(rate_to_base('broker_fee_currency', 'date'), FloatField()),
+    )
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, len(COLUMNS))
+    columns = dict(zip(COLUMNS, data.T))
+    for name in ('commodity', 'broker', 'month'):
+        columns[name] = columns[name].astype(np.int64)
+    # Unconverted rows contribute 0 to base currency sums
+    columns['value_base'] = np.nan_to_num(columns['price'] * columns['quantity'] * columns['base_rate'])
+    columns['broker_fee_base'] = np.nan_to_num(columns['broker_fee'] * columns['fee_base_rate'])
+    return columns
+
+
+def group_sums(keys, **values):
+    """Unique keys, row count per key and the per-key sum of each values array"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = {
+        name: np.bincount(inverse, weights=array, minlength=len(unique))
+        for name, array in values.items()
+    }
+    return unique, np.bincount(inverse, minlength=len(unique)), sums
+
+
+def ratio(numerator, denominator):
+    """numerator / denominator, with 0 where denominator is 0"""
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def by_commodity_month(columns):
+    quantity = columns['quantity']
+    keys, counts, sums = group_sums(
+        columns['commodity'] * MONTH_SPAN + columns['month'],
+        quantity=quantity,
+        price_quantity=columns['price'] * quantity,
+        value=columns['price'] * quantity * columns['forex'],
+        value_base=columns['value_base'],
+        freight_cost=columns['freight_cost'],
+    )
+    average_price = ratio(sums['price_quantity'], sums['quantity'])
+    freight_per_mt = ratio(sums['freight_cost'], sums['quantity'])
+    names = dict(Commodity.objects.filter(pk__in=np.unique(keys // MONTH_SPAN).tolist()).values_list(
+        'pk', 'commodity_name_short'
+    ))
+
+    return [
+        {
+            'commodity': int(key // MONTH_SPAN),
+            'commodity_name': names.get(int(key // MONTH_SPAN), ''),
+            'month': month_label(int(key % MONTH_SPAN)),
+            'contract_count': int(counts[i]),
+            'quantity': round(float(sums['quantity'][i]), 3),
+            'weighted_average_price': round(float(average_price[i]), 4),
+            'value': round(float(sums['value'][i]), 2),
+            'value_base': round(float(sums['value_base'][i]), 2),
+            'freight_cost': round(float(sums['freight_cost'][i]), 2),
+            'freight_per_mt': round(float(freight_per_mt[i]), 4),
+        }
+        for i, key in enumerate(keys)
+    ]
+
+
+def by_broker(columns):
+    keys, counts, sums = group_sums(
+        columns['broker'],
+        broker_fee=columns['broker_fee'],
+        broker_fee_converted=columns['broker_fee'] * columns['forex'],
+        broker_fee_base=columns['broker_fee_base'],
+    )
+    names = dict(Broker.objects.filter(pk__in=keys.tolist()).values_list('pk', 'broker_name'))
+
+    return [
+        {
+            'broker': int(key),
+            'broker_name': names.get(int(key), ''),
+            'contract_count': int(counts[i]),
+            'broker_fee': round(float(sums['broker_fee'][i]), 2),
+            'broker_fee_converted': round(float(sums['broker_fee_converted'][i]), 2),
+            'broker_fee_base': round(float(sums['broker_fee_base'][i]), 2),
+        }
+        for i, key in enumerate(keys)
+    ]
+
+
+def build_report(queryset):
+    """Vectorized report over the contracts of queryset"""
+    columns = fetch_columns(queryset)
+    quantity = columns['quantity']
+    total_quantity = quantity.sum()
+    return {
+        'contract_count': int(len(quantity)),
+        'base_currency': base_currency(),
+        'unconverted_contracts': int(np.isnan(columns['base_rate']).sum()),
+        'totals': {
+            'quantity': round(float(total_quantity), 3),
+            'value': round(float((columns['price'] * quantity * columns['forex']).sum()), 2),
+            'value_base': round(float(columns['value_base'].sum()), 2),
+            'weighted_average_price': round(
+                float((columns['price'] * quantity).sum() / total_quantity) if total_quantity else 0.0, 4
+            ),
+            'broker_fee_converted': round(float((columns['broker_fee'] * columns['forex']).sum()), 2),
+            'broker_fee_base': round(float(columns['broker_fee_base'].sum()), 2),
+            'freight_cost': round(float(columns['freight_cost'].sum()), 2),
+        },
+        'by_commodity_month': by_commodity_month(columns),
+        'by_broker': by_broker(columns),
+    }
+
+
+def build_report_orm(queryset):
+    """
+    The by_commodity_month and by_broker figures with ORM aggregation,
+    for benchmark_contract_report to compare against build_report.
+    """
+    queryset = queryset.order_by()
+    groups = queryset.annotate(month=TruncMonth('date')).values('commodity', 'month').annotate(
+        contract_count=Count('id'),
+        quantity=Sum('quantity'),
+        price_quantity=Sum(F('price') * F('quantity')),
+        value=Sum(F('price') * F('quantity') * F('forex')),
+        freight_cost=Sum('freight_cost'),
+    ).order_by('commodity', 'month')
+    brokers = queryset.values('broker').annotate(
+        contract_count=Count('id'),
+        broker_fee=Sum('broker_fee'),
+        broker_fee_converted=Sum(F('broker_fee') * F('forex')),
+    ).order_by('broker')
+    return {'by_commodity_month': list(groups), 'by_broker': list(brokers)}
+
+
+def filter_hash(params):
+    """Stable hash of query parameters, independent of their order"""
+    normalized = sorted(
+        (name, sorted(values)) for name, values in params.lists() if name not in ('page', 'format')
+    )
+    return hashlib.sha1(json.dumps(normalized).encode('utf-8')).hexdigest()
+
+
+def report_cache_key(params):
+    """Response cache key of the report for params (stored under REPORT_CACHE_TAGS)"""
+    return f"{REPORT_CACHE_PREFIX}{filter_hash(params)}"
@@ -8,8 +8,12 @@ from .models import (
     Currency, Cost_Center, Trader, Commodity_Group, Commodity_Type,
     Commodity_Subtype, Commodity, Counterparty, Broker, ICOTERM,
     Delivery_Format, Additive, Sociedad, Trade_Operation_Type,
-    Contract, Counterparty_Facility, Trade_Setting
+    Contract, Contract_Status_History, Counterparty_Facility, Counterparty_Position,
+    Trade_Setting
 )
+from . import fx
+from .trade_settings import get_int_setting
+from .workflow import CONTRACT_WORKFLOW, TRANSITIONS
 
 
 class CurrencySerializer(serializers.ModelSerializer):
@@ -79,10 +83,20 @@ class CounterpartySerializer(serializers.ModelSerializer):
 
 class CounterpartyListSerializer(serializers.ModelSerializer):
     """Simplified serializer for list views"""
+    # Annotated in SQL by CounterpartyViewSet
+    facility_count = serializers.IntegerField(read_only=True)
+    contract_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Counterparty
         fields = [
             'id', 'counterparty_name', 'counterparty_code', 'city', 
+            'country', 'is_supplier', 'is_customer', 'email', 'phone',
+            'facility_count', 'contract_count'
+        ]
+        # Columns the list queryset loads (QuerySet.only)
+        model_fields = [
+            'id', 'counterparty_name', 'counterparty_code', 'city',
             'country', 'is_supplier', 'is_customer', 'email', 'phone'
         ]
 
@@ -135,11 +149,33 @@ class ContractSerializer(serializers.ModelSerializer):
     trade_currency_code = serializers.CharField(source='trade_currency.currency_code', read_only=True)
     broker_fee_currency_code = serializers.CharField(source='broker_fee_currency.currency_code', read_only=True)
     total_value = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
+    total_value_base = serializers.SerializerMethodField()
+    allowed_transitions = serializers.SerializerMethodField()
     
     class Meta:
         model = Contract
         fields = '__all__'
-        read_only_fields = ('contract_number', 'created_at', 'updated_at')
+        read_only_fields = ('contract_number', 'created_at', 'updated_at', 'version')
+
+    def get_allowed_transitions(self, obj):
+        return CONTRACT_WORKFLOW.allowed(obj.status)
+
+    def get_total_value_base(self, obj):
+        """
+        total_value in the base currency at the contract date's rate; None
+        without a rate. Retrieve querysets annotate the rate (base_rate), so
+        rendering them, e.g. in the async views, does no cache or database I/O.
+        """
+        if hasattr(obj, 'base_rate'):
+            if obj.base_rate is None:
+                return None
+            value = obj.total_value * obj.base_rate
+        else:
+            try:
+                value = fx.convert(obj.total_value, obj.trade_currency.currency_code, on=obj.date)
+            except fx.MissingRate:
+                return None
+        return f"{value:.2f}"
 
 
 class ContractListSerializer(serializers.ModelSerializer):
@@ -153,10 +189,16 @@ class ContractListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contract
         fields = [
-            'id', 'contract_number', 'status', 'date', 'trader_name',
+            'id', 'contract_number', 'status', 'version', 'date', 'trader_name',
             'counterparty_name', 'commodity_name', 'quantity', 'price',
             'trade_currency_code', 'total_value', 'delivery_period'
         ]
+        # Columns the list queryset loads (QuerySet.only); total_value needs quantity and price
+        model_fields = [
+            'id', 'contract_number', 'status', 'version', 'date', 'quantity', 'price',
+            'delivery_period', 'trader__trader_name', 'counterparty__counterparty_name',
+            'commodity__commodity_name_short', 'trade_currency__currency_code'
+        ]
 
 
 class ContractCreateSerializer(serializers.ModelSerializer):
@@ -165,7 +207,7 @@ class ContractCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contract
         fields = '__all__'
-        read_only_fields = ('contract_number', 'created_at', 'updated_at')
+        read_only_fields = ('contract_number', 'created_at', 'updated_at', 'version')
     
     def validate(self, data):
         """Custom validation for contract data"""
@@ -182,6 +224,9 @@ class ContractCreateSerializer(serializers.ModelSerializer):
         # Validate payment days
         if data.get('payment_days', 0) < 0:
             errors['payment_days'] = 'Payment days cannot be negative'
+        max_payment_days = get_int_setting('max_payment_days')
+        if max_payment_days is not None and data.get('payment_days', 0) > max_payment_days:
+            errors['payment_days'] = f'Payment days cannot exceed {max_payment_days}'
         
         # Validate delivery period is in the future
         from django.utils import timezone
@@ -194,16 +239,78 @@ class ContractCreateSerializer(serializers.ModelSerializer):
         return data
 
 
+class ContractStatusHistorySerializer(serializers.ModelSerializer):
+    changed_by_username = serializers.CharField(source='changed_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = Contract_Status_History
+        fields = [
+            'id', 'from_status', 'to_status', 'transition',
+            'changed_by', 'changed_by_username', 'changed_at'
+        ]
+
+
+class ContractBulkTransitionSerializer(serializers.Serializer):
+    """Input for applying one status transition to many contracts"""
+    transition = serializers.ChoiceField(choices=list(TRANSITIONS))
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+    # Optional {contract id: expected version}; mismatching contracts are skipped
+    versions = serializers.DictField(
+        child=serializers.IntegerField(min_value=1),
+        required=False
+    )
+
+    def validate_versions(self, value):
+        try:
+            return {int(pk): version for pk, version in value.items()}
+        except ValueError:
+            raise serializers.ValidationError('Keys must be contract ids')
+
+
+class CounterpartyPositionSerializer(serializers.ModelSerializer):
+    counterparty_name = serializers.CharField(source='counterparty.counterparty_name', read_only=True)
+    commodity_name = serializers.CharField(source='commodity.commodity_name_short', read_only=True)
+
+    class Meta:
+        model = Counterparty_Position
+        fields = [
+            'id', 'counterparty', 'counterparty_name', 'commodity', 'commodity_name',
+            'delivery_month', 'long_quantity', 'short_quantity', 'net_quantity',
+            'long_value', 'short_value', 'net_value', 'contract_count', 'updated_at'
+        ]
+
+
+class CounterpartyExposureSerializer(serializers.Serializer):
+    """Positions of one counterparty summed over commodities and months"""
+    counterparty = serializers.IntegerField()
+    counterparty_name = serializers.CharField()
+    long_quantity = serializers.DecimalField(max_digits=20, decimal_places=3)
+    short_quantity = serializers.DecimalField(max_digits=20, decimal_places=3)
+    net_quantity = serializers.DecimalField(max_digits=20, decimal_places=3)
+    long_value = serializers.DecimalField(max_digits=24, decimal_places=2)
+    short_value = serializers.DecimalField(max_digits=24, decimal_places=2)
+    net_value = serializers.DecimalField(max_digits=24, decimal_places=2)
+    gross_value = serializers.DecimalField(max_digits=24, decimal_places=2)
+    contract_count = serializers.IntegerField()
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Serializer for dashboard statistics"""
     total_contracts = serializers.IntegerField()
-    total_value = serializers.DecimalField(max_digits=20, decimal_places=2)
+    base_currency = serializers.CharField()
+    total_value = serializers.DecimalField(max_digits=20, decimal_places=2)  # In base_currency
+    unconverted_contracts = serializers.IntegerField()  # No exchange rate, left out of values
     active_contracts = serializers.IntegerField()
     pending_contracts = serializers.IntegerField()
     top_counterparties = serializers.ListField()
     top_commodities = serializers.ListField()
     monthly_contract_values = serializers.ListField()
     contract_status_distribution = serializers.ListField()
+    stale_blocks = serializers.ListField(child=serializers.CharField())
 
 
 class TradeSettingSerializer(serializers.ModelSerializer):
@@ -0,0 +1,77 @@
+"""
+NextCRM model signals.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import positions, trade_settings
+from .caching import instance_tags, invalidate_on_commit
+from .models import Contract, Trade_Operation_Type, Trade_Setting
+from .workflow import record_transition
+
+
+def touches_positions(update_fields):
+    return update_fields is None or not positions.POSITION_FIELDS.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=Contract)
+def record_initial_status(sender, instance, created, using, raw=False, **kwargs):
+    """Start every contract's status history when it is created"""
+    if created and not raw:
+        record_transition(instance.pk, '', instance.status, 'create', using=using)
+
+
+@receiver(pre_save, sender=Contract)
+def remember_position_key(sender, instance, using, update_fields=None, raw=False, **kwargs):
+    """Note the position an edited contract is leaving, in case it moves to another"""
+    instance._previous_position_key = None
+    if raw or instance.pk is None or not touches_positions(update_fields):
+        return
+    previous = Contract.objects.using(using).filter(pk=instance.pk).values_list(
+        'counterparty_id', 'commodity_id', 'delivery_period'
+    ).first()
+    if previous is not None:
+        instance._previous_position_key = positions.position_key(*previous)
+
+
+@receiver(post_save, sender=Contract)
+def refresh_contract_positions(sender, instance, using, update_fields=None, raw=False, **kwargs):
+    """Re-aggregate the positions a contract write can change"""
+    if raw or not touches_positions(update_fields):
+        return
+    keys = {positions.contract_key(instance)}
+    previous = getattr(instance, '_previous_position_key', None)
+    if previous is not None:
+        keys.add(previous)
+    positions.refresh(keys, using)
+
+
+@receiver(post_delete, sender=Contract)
+def refresh_deleted_contract_position(sender, instance, using, **kwargs):
+    positions.refresh([positions.contract_key(instance)], using)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cache_tags(sender, instance, using, raw=False, **kwargs):
+    """Retire cached responses that rendered a changed NextCRM row"""
+    if not raw and sender._meta.app_label == Contract._meta.app_label:
+        invalidate_on_commit(instance_tags(instance), using)
+
+
+@receiver(post_save, sender=Trade_Operation_Type)
+def refresh_operation_type_positions(sender, instance, created, using, raw=False, **kwargs):
+    """A changed position_sign moves every open contract of the type"""
+    if not created and not raw:
+        positions.refresh_contracts(
+            Contract.objects.filter(trade_operation_type=instance, status__in=positions.OPEN_STATUSES), using
+        )
+
+
+@receiver(post_save, sender=Trade_Setting)
+@receiver(post_delete, sender=Trade_Setting)
+def broadcast_trade_settings_change(sender, using, **kwargs):
+    """Reload the settings snapshot in every process once the change is committed"""
+    transaction.on_commit(trade_settings.notify_change, using=using)
@@ -0,0 +1,218 @@
+"""
+Row generators and COPY workers for the generate_synthetic_data command.
+
+This module deliberately avoids importing Django models: it is imported by
+spawned worker processes that only talk to PostgreSQL through psycopg.
+Every chunk draws from its own Random seeded by (seed, table, chunk), so
+the same seed produces the same rows however many workers are used.
+"""
+
+import calendar
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import psycopg
+
+from .normalization import normalize_name, normalize_tax_id
+
+# Trading volume by calendar month, peaking around the northern harvest
+MONTH_WEIGHTS = [6, 5, 6, 7, 8, 10, 12, 12, 11, 9, 7, 7]
+
+# Settled contracts dominate the history; recent ones are still in flight
+SETTLED_STATUS_WEIGHTS = {'completed': 70, 'executed': 15, 'cancelled': 10, 'approved': 5}
+RECENT_STATUS_WEIGHTS = {'draft': 30, 'approved': 30, 'executed': 30, 'cancelled': 10}
+SETTLED_AFTER_DAYS = 180
+
+COMPANY_PREFIXES = [
+    'Atlantic', 'Pacific', 'Northern', 'Southern', 'Golden', 'Continental', 'Global',
+    'United', 'Prairie', 'Delta', 'Harbor', 'Summit', 'Valley', 'Coastal', 'Imperial',
+]
+COMPANY_SUFFIXES = [
+    'Grain Co', 'Trading Ltd', 'Commodities SA', 'Agro LLC', 'Resources Inc',
+    'Energy GmbH', 'Metals Corp', 'Foods BV', 'Export SRL', 'Holdings plc',
+]
+LOCATIONS = [
+    ('Chicago', 'USA'), ('Houston', 'USA'), ('Rotterdam', 'Netherlands'), ('Hamburg', 'Germany'),
+    ('Geneva', 'Switzerland'), ('London', 'UK'), ('Singapore', 'Singapore'), ('Santos', 'Brazil'),
+    ('Rosario', 'Argentina'), ('Odesa', 'Ukraine'), ('Shanghai', 'China'), ('Mumbai', 'India'),
+]
+FACILITY_TYPES = ['Warehouse', 'Port Terminal', 'Silo', 'Processing Plant', 'Office']
+
+AUDIT_ACTION_WEIGHTS = {'UPDATE': 50, 'CREATE': 30, 'VIEW': 12, 'EXPORT': 5, 'DELETE': 3}
+AUDIT_MODELS = ['Contracts', 'Counterparties', 'Trade-Settings', 'Brokers', 'Currencies']
+SECURITY_EVENT_WEIGHTS = {
+    'LOGIN_SUCCESS': 700, 'LOGOUT': 120, 'LOGIN_FAILED': 150,
+    'SUSPICIOUS_ACTIVITY': 20, 'PASSWORD_CHANGE': 5, 'ACCOUNT_LOCKED': 5,
+}
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0',
+    'python-requests/2.32.3',
+]
+
+COLUMNS = {
+    'counterparties': [
+        'counterparty_name', 'counterparty_code', 'tax_id', 'city', 'country', 'phone', 'email',
+        'contact_person', 'is_supplier', 'is_customer', 'normalized_name', 'normalized_tax_id',
+        'created_at', 'updated_at',
+    ],
+    'counterparty_facilities': [
+        'counterparty_id', 'counterparty_facility_name', 'facility_type', 'address', 'city',
+        'country', 'created_at', 'updated_at', 'is_active',
+    ],
+    'contracts': [
+        'contract_number', 'trader_id', 'trade_operation_type_id', 'sociedad_id', 'counterparty_id',
+        'commodity_id', 'delivery_format_id', 'additive_id', 'broker_id', 'icoterm_id',
+        'cost_center_id', 'broker_fee', 'broker_fee_currency_id', 'freight_cost', 'forex', 'price',
+        'trade_currency_id', 'payment_days', 'quantity', 'unit_of_measure', 'entrega',
+        'delivery_period', 'date', 'status', 'notes', 'created_at', 'updated_at', 'is_active',
+        'version',
+    ],
+    'audit_logs': [
+        'user_id', 'action', 'model_name', 'object_id', 'object_repr', 'changes', 'ip_address', 'timestamp',
+    ],
+    'security_logs': ['user_id', 'event_type', 'ip_address', 'user_agent', 'metadata', 'timestamp'],
+}
+
+# Set in each worker process by init_worker()
+_worker = {}
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def skewed(rng, values, exponent=3):
+    """Pick from values with a power-law bias towards the front"""
+    return values[int(len(values) * rng.random() ** exponent)]
+
+
+def seasonal_date(rng, end, years):
+    year = end.year - rng.randrange(years)
+    month = rng.choices(range(1, 13), weights=MONTH_WEIGHTS)[0]
+    day = rng.randint(1, calendar.monthrange(year, month)[1])
+    result = date(year, month, day)
+    return result if result <= end else end - timedelta(days=rng.randrange(365))
+
+
+def timestamp_on(rng, day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(
+        seconds=rng.randrange(7 * 3600, 19 * 3600)
+    )
+
+
+def ip_address(rng):
+    return f"{rng.choice([10, 81, 145, 185, 203])}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+
+
+def counterparty_rows(rng, start, count, context):
+    for index in range(start, start + count):
+        city, country = rng.choice(LOCATIONS)
+        name = f"{rng.choice(COMPANY_PREFIXES)} {rng.choice(COMPANY_SUFFIXES)} {index}"
+        tax_id = f"{country[:2].upper()}{rng.randrange(10 ** 9):09d}"
+        created = timestamp_on(rng, seasonal_date(rng, context['today'], context['years']))
+        yield (
+            name, f"{context['prefix']}{index:09d}", tax_id,
+            city, country, f"+{rng.randrange(1, 99)}-{rng.randrange(10 ** 7, 10 ** 8)}",
+            f"trading{index}@example.com", f"Contact {index}",
+            rng.random() < 0.4, rng.random() < 0.8, normalize_name(name), normalize_tax_id(tax_id),
+            created, created,
+        )
+
+
+def facility_rows(rng, start, count, context):
+    for index in range(start, start + count):
+        city, country = rng.choice(LOCATIONS)
+        created = timestamp_on(rng, seasonal_date(rng, context['today'], context['years']))
+        facility_type = rng.choice(FACILITY_TYPES)
+        yield (
+            skewed(rng, context['counterparty_ids'], exponent=1.5),
+            f"{city} {facility_type} {index}", facility_type,
+            f"{rng.randrange(1, 999)} Harbour Road", city, country, created, created, rng.random() < 0.95,
+        )
+
+
+def contract_rows(rng, start, count, context):
+    refs = context['references']
+    today = context['today']
+    for index in range(start, start + count):
+        day = seasonal_date(rng, today, context['years'])
+        age = (today - day).days
+        status = weighted(rng, SETTLED_STATUS_WEIGHTS if age > SETTLED_AFTER_DAYS else RECENT_STATUS_WEIGHTS)
+        currency = skewed(rng, refs['currency'], exponent=2)
+        created = timestamp_on(rng, day)
+        yield (
+            f"{context['prefix']}-{index:09d}",
+            rng.choice(refs['trader']), rng.choice(refs['trade_operation_type']),
+            rng.choice(refs['sociedad']), skewed(rng, context['counterparty_ids']),
+            skewed(rng, refs['commodity'], exponent=2), rng.choice(refs['delivery_format']),
+            rng.choice(refs['additive']), rng.choice(refs['broker']), rng.choice(refs['icoterm']),
+            rng.choice(refs['cost_center']),
+            round(rng.uniform(0, 2500), 2), currency, round(rng.uniform(0, 40000), 2),
+            round(rng.uniform(0.8, 1.3), 4), round(rng.lognormvariate(5.5, 0.6), 2), currency,
+            rng.choice([0, 15, 30, 30, 45, 60, 90]), round(rng.lognormvariate(7, 1), 3), 'MT',
+            rng.choice(LOCATIONS)[0], day + timedelta(days=rng.randrange(15, 180)), day, status, '',
+            created, created, status != 'cancelled', 1,
+        )
+
+
+def audit_log_rows(rng, start, count, context):
+    low, high = context['contract_id_range']
+    for _ in range(count):
+        model_name = rng.choice(AUDIT_MODELS)
+        object_id = str(rng.randint(low, high)) if model_name == 'Contracts' else str(rng.randrange(1, 1000))
+        yield (
+            rng.choice(context['user_ids']) if context['user_ids'] else None,
+            weighted(rng, AUDIT_ACTION_WEIGHTS), model_name, object_id, f"{model_name} {object_id}",
+            '{}', ip_address(rng),
+            timestamp_on(rng, seasonal_date(rng, context['today'], context['years'])),
+        )
+
+
+def security_log_rows(rng, start, count, context):
+    for _ in range(count):
+        event_type = weighted(rng, SECURITY_EVENT_WEIGHTS)
+        known_user = context['user_ids'] and event_type != 'SUSPICIOUS_ACTIVITY'
+        yield (
+            rng.choice(context['user_ids']) if known_user else None,
+            event_type, ip_address(rng), rng.choice(USER_AGENTS), '{}',
+            timestamp_on(rng, seasonal_date(rng, context['today'], context['years'])),
+        )
+
+
+GENERATORS = {
+    'counterparties': counterparty_rows,
+    'counterparty_facilities': facility_rows,
+    'contracts': contract_rows,
+    'audit_logs': audit_log_rows,
+    'security_logs': security_log_rows,
+}
+
+
+def chunk_rng(seed, table, chunk):
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def generate_rows(table, seed, chunk, start, count, context):
+    return GENERATORS[table](chunk_rng(seed, table, chunk), start, count, context)
+
+
+def init_worker(connection_params, context):
+    _worker['connection'] = psycopg.connect(**connection_params)
+    _worker['context'] = context
+
+
+def copy_chunk(task):
+    """COPY one chunk of generated rows; runs in a worker process"""
+    table, seed, chunk, start, count = task
+    started = time.perf_counter()
+    connection = _worker['connection']
+    columns = ', '.join(COLUMNS[table])
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for row in generate_rows(table, seed, chunk, start, count, _worker['context']):
+                copy.write_row(row)
+    connection.commit()
+    return count, time.perf_counter() - started
@@ -2,16 +2,85 @@
 Tests for NextCRM core functionality
 """
 
-from django.test import TestCase, Client
+import asyncio
+import gzip
+import io
+import json
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.views import View
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from apps.authentication.models import AuditLog
+from apps.nextcrm import caching, dashboard, fx, positions, reference_data, reporting, synthetic, trade_settings, workflow
+from apps.nextcrm.counterparty_import import DuplicateIndex, import_counterparties, read_rows
+from apps.nextcrm.normalization import normalize_name, normalize_tax_id
+from core import log, openapi, probes, renderers, response_cache, routers, startup
 from apps.nextcrm.models import (
     Currency, Trader, Counterparty, Commodity_Group, 
     Commodity_Type, Commodity_Subtype, Commodity, 
-    Trade_Operation_Type, Contract
+    Trade_Operation_Type, Contract, Sociedad, Delivery_Format,
+    Additive, Broker, ICOTERM, Cost_Center, Trade_Setting, Counterparty_Facility,
+    Counterparty_Position, Exchange_Rate
 )
+from apps.nextcrm.views import ContractViewSet, TradeSettingViewSet
+
+
+def create_contract_references():
+    """Create one row of every reference model a Contract points to"""
+    currency = Currency.objects.create(currency_code='USD', currency_name='US Dollar', currency_symbol='$')
+    group = Commodity_Group.objects.create(commodity_group_name='Grains')
+    commodity_type = Commodity_Type.objects.create(commodity_type_name='Cereal', commodity_group=group)
+    subtype = Commodity_Subtype.objects.create(commodity_subtype_name='Winter Wheat', commodity_type=commodity_type)
+    return {
+        'trader': Trader.objects.create(trader_name='John Smith', email='john@example.com'),
+        'trade_operation_type': Trade_Operation_Type.objects.create(
+            trade_operation_type_name='Purchase', operation_code='BUY'
+        ),
+        'sociedad': Sociedad.objects.create(sociedad_name='NextCRM Trading LLC', tax_id='NCRM001'),
+        'counterparty': Counterparty.objects.create(counterparty_name='Acme Corp', counterparty_code='ACME001'),
+        'commodity': Commodity.objects.create(commodity_name_short='Wheat', commodity_subtype=subtype),
+        'delivery_format': Delivery_Format.objects.create(delivery_format_name='Bulk', delivery_format_cost=0),
+        'additive': Additive.objects.create(additive_name='Quality Premium', additive_cost=0),
+        'broker': Broker.objects.create(broker_name='Direct', broker_code='DIRECT'),
+        'icoterm': ICOTERM.objects.create(icoterm_name='Free On Board', icoterm_code='FOB'),
+        'cost_center': Cost_Center.objects.create(cost_center_name='Trading Operations'),
+        'broker_fee_currency': currency,
+        'trade_currency': currency,
+    }
+
+
+def create_contract(references, **overrides):
+    """Create a contract with sensible defaults for the remaining fields"""
+    fields = dict(
+        references,
+        broker_fee=0, freight_cost=0, forex=1, price=100, payment_days=30,
+        quantity=10, entrega='Rotterdam', delivery_period=date(2030, 1, 1),
+        date=timezone.now().date(),
+    )
+    fields.update(overrides)
+    return Contract.objects.create(**fields)
 
 
 class ModelsTestCase(TestCase):
@@ -249,4 +318,1399 @@ class SecurityTestCase(TestCase):
                 response.status_code, 
                 status.HTTP_401_UNAUTHORIZED,
                 f"Endpoint {endpoint} should require authentication"
-            )
\ No newline at end of file
+            )
+
+class AsyncEndpointsTestCase(TestCase):
+    """Test the async (ASGI-native) read endpoints"""
+
+    def setUp(self):
+        """Set up test user and reference data"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.references = create_contract_references()
+
+    async def test_async_endpoints_require_authentication(self):
+        """Test that async endpoints answer 401 for anonymous users"""
+        for endpoint in ['/api/async/contracts/', '/api/async/contracts/dashboard_stats/',
+                         '/api/async/currencies/', '/api/auth/async/me/']:
+            response = await self.async_client.get(endpoint)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, endpoint)
+
+    async def test_async_reference_list(self):
+        """Test async reference list pagination envelope"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/async/currencies/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['currency_code'], 'USD')
+
+    async def test_async_dashboard_stats(self):
+        """Test async dashboard statistics"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/async/contracts/dashboard_stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_contracts'], 0)
+
+    async def test_async_contract_list(self):
+        """Test async contract list with the list serializer's fields"""
+        contract = await sync_to_async(create_contract)(self.references)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/async/contracts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['contract_number'], contract.contract_number)
+        self.assertEqual(data['results'][0]['counterparty_name'], 'Acme Corp')
+        self.assertEqual(data['results'][0]['trade_currency_code'], 'USD')
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        FX_BASE_CURRENCY='USD'
+    )
+    async def test_async_contract_detail(self):
+        """Test async contract detail and its 404"""
+        contract = await sync_to_async(create_contract)(self.references)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/api/async/contracts/{contract.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['id'], contract.pk)
+        self.assertEqual(data['contract_number'], contract.contract_number)
+        self.assertEqual(data['total_value_base'], '1000.00')
+
+        response = await self.async_client.get(f'/api/async/contracts/{contract.pk + 1}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        FX_BASE_CURRENCY='USD'
+    )
+    async def test_async_contract_detail_after_rate_change(self):
+        """Test that the detail renders total_value_base without sync I/O after the FX rates changed"""
+        contract = await sync_to_async(create_contract)(self.references)
+        await sync_to_async(fx.bump_version)()
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.dict(fx._loaded, {'version': None, 'table': None}):
+            response = await self.async_client.get(f'/api/async/contracts/{contract.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_value_base'], '1000.00')
+
+    async def test_async_me(self):
+        """Test async current user endpoint"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/auth/async/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['username'], 'testuser')
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    FX_BASE_CURRENCY='USD'
+)
+class DashboardStatsTestCase(TransactionTestCase):
+    """Test concurrent dashboard block evaluation (the pool threads only see committed rows)"""
+
+    def setUp(self):
+        self.references = create_contract_references()
+        create_contract(self.references)
+        create_contract(self.references, status='approved', price=50, quantity=4)
+
+    def test_blocks_cover_committed_contracts(self):
+        """Test that the pool threads aggregate the contracts"""
+        stats = dashboard.get_dashboard_stats()
+
+        self.assertEqual(stats['stale_blocks'], [])
+        self.assertEqual(stats['total_contracts'], 2)
+        self.assertEqual(stats['total_value'], Decimal('1200'))
+        self.assertEqual(stats['unconverted_contracts'], 0)
+        self.assertEqual(stats['active_contracts'], 1)
+        self.assertEqual(stats['pending_contracts'], 1)
+        self.assertEqual(stats['top_counterparties'][0]['total_value'], Decimal('1200'))
+        self.assertEqual(stats['top_commodities'][0]['total_quantity'], Decimal('14'))
+        self.assertEqual(
+            {row['status']: row['count'] for row in stats['contract_status_distribution']},
+            {'draft': 1, 'approved': 1}
+        )
+
+    def test_failed_block_is_flagged_stale(self):
+        """Test that a failing block falls back instead of failing the response"""
+        def failing_block():
+            raise OperationalError('canceling statement due to statement timeout')
+
+        with mock.patch.dict(dashboard.BLOCKS, {'top_commodities': (failing_block, [])}):
+            stats = dashboard.get_dashboard_stats()
+
+        self.assertEqual(stats['stale_blocks'], ['top_commodities'])
+        self.assertEqual(stats['top_commodities'], [])
+        self.assertEqual(stats['total_contracts'], 2)
+
+    def test_stale_block_serves_last_good_value(self):
+        """Test that a failing block is served from its last good value"""
+        dashboard.get_dashboard_stats()
+        create_contract(self.references)
+
+        def failing_block():
+            raise OperationalError('connection lost')
+
+        with mock.patch.dict(dashboard.BLOCKS, {'summary': (failing_block, {})}):
+            stats = dashboard.get_dashboard_stats()
+
+        self.assertEqual(stats['stale_blocks'], ['summary'])
+        self.assertEqual(stats['total_contracts'], 2)
+        self.assertEqual(stats['pending_contracts'], 1)
+        self.assertEqual(
+            {row['status']: row['count'] for row in stats['contract_status_distribution']},
+            {'draft': 2, 'approved': 1}
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_MAX_LAG_SECONDS=5)
+class ReplicaRouterTestCase(SimpleTestCase):
+    """Test primary/replica read routing decisions"""
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        patcher = mock.patch.dict(routers._replica_health, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_default_to_primary(self):
+        """Test that reads outside an opted-in block go to the primary"""
+        self.assertEqual(self.router.db_for_read(Contract), 'default')
+
+    @mock.patch('core.routers.measure_replica_lag', return_value=0.2)
+    def test_replica_reads(self, measure_lag):
+        """Test that opted-in reads go to a healthy replica"""
+        with routers.use_replica():
+            self.assertEqual(self.router.db_for_read(Contract), 'replica_1')
+        self.assertEqual(self.router.db_for_write(Contract), 'default')
+
+    @mock.patch('core.routers.measure_replica_lag', return_value=30.0)
+    def test_lagging_replica_falls_back_to_primary(self, measure_lag):
+        """Test that a replica over the lag threshold is skipped"""
+        with routers.use_replica():
+            self.assertEqual(self.router.db_for_read(Contract), 'default')
+
+
+class ContractConcurrencyTestCase(TransactionTestCase):
+    """Test critical sections under concurrent writers"""
+
+    def setUp(self):
+        self.references = create_contract_references()
+
+    def run_concurrently(self, func, count):
+        def worker(_):
+            try:
+                return func()
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(worker, range(count)))
+
+    def test_concurrent_contract_numbers_are_unique(self):
+        """Test that concurrently created contracts get consecutive numbers"""
+        self.run_concurrently(lambda: create_contract(self.references), 8)
+        year = timezone.now().year
+        numbers = sorted(Contract.objects.values_list('contract_number', flat=True))
+        self.assertEqual(numbers, [f"CONT-{year}-{n:06d}" for n in range(1, 9)])
+
+    def test_concurrent_transitions_apply_once(self):
+        """Test that only one of many concurrent approvals succeeds"""
+        contract = create_contract(self.references)
+        results = self.run_concurrently(
+            lambda: workflow.apply_transition(contract.pk, 'approve'), 8
+        )
+        self.assertEqual(results.count(True), 1)
+        contract.refresh_from_db()
+        self.assertEqual(contract.status, 'approved')
+
+    def test_concurrent_toggles_are_not_lost(self):
+        """Test that an even number of concurrent toggles restores the flag"""
+        setting = Trade_Setting.objects.create(setting_name='max_tolerance', setting_value='5')
+        self.run_concurrently(lambda: TradeSettingViewSet().toggle_setting(setting.pk), 10)
+        setting.refresh_from_db()
+        self.assertTrue(setting.is_active)
+
+
+class ContractBulkTransitionTestCase(TestCase):
+    """Test bulk status transitions and optimistic version checks"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='trader', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.references = create_contract_references()
+        self.url = '/api/contracts/bulk_transition/'
+
+    def test_bulk_transition_reports_skipped(self):
+        """Test that only contracts in an allowed status are moved"""
+        draft = create_contract(self.references)
+        executed = create_contract(self.references, status='executed')
+        response = self.client.post(
+            self.url, {'transition': 'approve', 'ids': [draft.pk, executed.pk, 999999]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], [draft.pk])
+        self.assertEqual(
+            [(entry['id'], entry['reason']) for entry in response.data['skipped']],
+            [(executed.pk, 'invalid_status'), (999999, 'not_found')]
+        )
+        draft.refresh_from_db()
+        self.assertEqual((draft.status, draft.version), ('approved', 2))
+
+        audit_logs = AuditLog.objects.filter(model_name='Contract')
+        self.assertEqual(audit_logs.count(), 1)
+        self.assertEqual(audit_logs.get().changes['updated_ids'], [draft.pk])
+
+    def test_bulk_transition_version_conflict(self):
+        """Test that a stale expected version skips the contract"""
+        contract = create_contract(self.references)
+        response = self.client.post(self.url, {
+            'transition': 'cancel', 'ids': [contract.pk], 'versions': {str(contract.pk): 5}
+        }, format='json')
+        self.assertEqual(response.data['updated'], [])
+        self.assertEqual(response.data['skipped'][0]['reason'], 'version_conflict')
+
+    def test_stale_update_is_rejected(self):
+        """Test that editing with an outdated version returns 409"""
+        contract = create_contract(self.references)
+        url = f'/api/contracts/{contract.pk}/'
+        response = self.client.patch(url, {'notes': 'first', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, {'notes': 'second', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        contract.refresh_from_db()
+        self.assertEqual((contract.notes, contract.version), ('first', 2))
+
+    def test_update_does_not_revert_concurrent_changes(self):
+        """Test that an edit saves over the row as locked, not as read before the lock"""
+        contract = create_contract(self.references)
+        get_object = ContractViewSet.get_object
+
+        def get_object_then_approve(view):
+            instance = get_object(view)
+            workflow.apply_transition(instance.pk, 'approve')
+            return instance
+
+        with mock.patch.object(ContractViewSet, 'get_object', get_object_then_approve):
+            response = self.client.patch(f'/api/contracts/{contract.pk}/', {'notes': 'edited'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        contract.refresh_from_db()
+        self.assertEqual((contract.status, contract.notes, contract.version), ('approved', 'edited', 3))
+
+
+class ContractWorkflowTestCase(TestCase):
+    """Test the transition engine and status history"""
+
+    def setUp(self):
+        self.references = create_contract_references()
+
+    def test_state_machine_validates_in_memory(self):
+        """Test transition checks against the declarative table"""
+        self.assertEqual(workflow.CONTRACT_WORKFLOW.check('draft', 'approve'), 'approved')
+        self.assertEqual(workflow.CONTRACT_WORKFLOW.allowed('approved'), ['execute', 'cancel'])
+        with self.assertRaises(workflow.InvalidTransition):
+            workflow.CONTRACT_WORKFLOW.check('completed', 'cancel')
+        with self.assertRaises(ImproperlyConfigured):
+            workflow.StateMachine(Contract.STATUS_CHOICES, {'archive': (('completed',), 'archived')})
+
+    def test_transitions_are_recorded(self):
+        """Test that creation and each transition append a history row"""
+        contract = create_contract(self.references)
+        self.assertTrue(workflow.apply_transition(contract.pk, 'approve'))
+        self.assertFalse(workflow.apply_transition(contract.pk, 'complete'))
+        workflow.bulk_transition([contract.pk], 'execute')
+        self.assertEqual(
+            list(contract.status_history.order_by('id').values_list('from_status', 'to_status', 'transition')),
+            [('', 'draft', 'create'), ('draft', 'approved', 'approve'), ('approved', 'executed', 'execute')]
+        )
+
+    def test_statuses_as_of(self):
+        """Test reconstructing every contract's status at a past time"""
+        first = create_contract(self.references)
+        second = create_contract(self.references)
+        before = timezone.now()
+        workflow.apply_transition(first.pk, 'approve')
+
+        as_of = dict(workflow.statuses_as_of(before).values_list('contract_id', 'to_status'))
+        self.assertEqual(as_of, {first.pk: 'draft', second.pk: 'draft'})
+        self.assertEqual(workflow.status_counts_as_of(timezone.now()), {'approved': 1, 'draft': 1})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TradeSettingsSnapshotTestCase(TestCase):
+    """Test the cached, typed settings snapshot"""
+
+    def setUp(self):
+        patcher = mock.patch.object(trade_settings, '_snapshot', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Trade_Setting.objects.create(setting_name='max_payment_days', setting_value='90', setting_type='integer')
+        Trade_Setting.objects.create(
+            setting_name='allowed_units', setting_value='{"units": ["MT", "BU"]}', setting_type='json'
+        )
+
+    def test_get_setting_is_typed_and_cached(self):
+        """Test that settings are parsed once and then served without queries"""
+        trade_settings.get_snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(trade_settings.get_setting('max_payment_days'), 90)
+            self.assertEqual(trade_settings.get_setting('missing', 'fallback'), 'fallback')
+            self.assertEqual(trade_settings.get_setting('allowed_units')['units'], ('MT', 'BU'))
+        with self.assertRaises(TypeError):
+            trade_settings.get_setting('allowed_units')['extra'] = True
+
+    def test_save_reloads_snapshot(self):
+        """Test that a committed change installs a new snapshot version"""
+        version = trade_settings.snapshot_version()
+        setting = Trade_Setting.objects.get(setting_name='max_payment_days')
+        setting.setting_value = '60'
+        with self.captureOnCommitCallbacks(execute=True):
+            setting.save()
+        self.assertEqual(trade_settings.get_setting('max_payment_days'), 60)
+        self.assertGreater(trade_settings.snapshot_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TradeSettingViewSet().toggle_setting(setting.pk)
+        self.assertIsNone(trade_settings.get_setting('max_payment_days', None))
+
+    def test_non_numeric_limit_is_ignored(self):
+        """Test that a numeric setting stored as a string type is parsed or ignored, not a 500"""
+        Trade_Setting.objects.filter(setting_name='max_payment_days').update(setting_value='45', setting_type='string')
+        trade_settings.reload()
+        self.assertEqual(trade_settings.get_int_setting('max_payment_days'), 45)
+
+        Trade_Setting.objects.filter(setting_name='max_payment_days').update(setting_value='ninety')
+        trade_settings.reload()
+        with self.assertLogs('apps.nextcrm.trade_settings', level='WARNING'):
+            self.assertIsNone(trade_settings.get_int_setting('max_payment_days'))
+        self.assertEqual(trade_settings.get_int_setting('allowed_units', 7), 7)
+
+    def test_reload_after_version_counter_reset(self):
+        """Test that changes are picked up after the cache lost the version counter"""
+        setting = Trade_Setting.objects.get(setting_name='max_payment_days')
+        for value in ('60', '45'):
+            setting.setting_value = value
+            with self.captureOnCommitCallbacks(execute=True):
+                setting.save()
+        self.assertGreaterEqual(trade_settings.snapshot_version(), 2)
+
+        cache.clear()
+        setting.setting_value = '30'
+        with self.captureOnCommitCallbacks(execute=True):
+            setting.save()
+        self.assertEqual(trade_settings.snapshot_version(), 1)
+        self.assertEqual(trade_settings.get_setting('max_payment_days'), 30)
+
+        # A snapshot older than the counter still loses against a newer one
+        trade_settings.install(trade_settings.load_snapshot(version=0))
+        self.assertEqual(trade_settings.snapshot_version(), 1)
+
+
+class ReferenceDataSyncTestCase(TestCase):
+    """Test the diff-based reference data loader"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.fixtures = Path(directory.name)
+        self.write_fixtures('US Dollar')
+
+    def write_fixtures(self, usd_name):
+        (self.fixtures / 'currencies.json').write_text(json.dumps([
+            {'currency_code': 'USD', 'currency_name': usd_name, 'currency_symbol': '$'},
+            {'currency_code': 'EUR', 'currency_name': 'Euro', 'currency_symbol': 'EUR'},
+        ]))
+        (self.fixtures / 'commodity_groups.csv').write_text(
+            'commodity_group_name,description\nGrains,Cereal grains\n'
+        )
+        (self.fixtures / 'commodity_types.csv').write_text(
+            'commodity_type_name,commodity_group,description\nWheat,Grains,\n'
+        )
+
+    def results(self, **kwargs):
+        return {
+            result.table: result[1:5]
+            for result in reference_data.sync_reference_data(self.fixtures, **kwargs)
+        }
+
+    def test_initial_sync_creates_rows(self):
+        """Test that a first sync inserts every row and resolves foreign keys by name"""
+        self.assertEqual(self.results(), {
+            'currencies': (2, 0, 0, 0),
+            'commodity_groups': (1, 0, 0, 0),
+            'commodity_types': (1, 0, 0, 0),
+        })
+        self.assertEqual(Commodity_Type.objects.get().commodity_group.commodity_group_name, 'Grains')
+
+    def test_resync_updates_in_place(self):
+        """Test that changed descriptive fields update the matching row instead of duplicating it"""
+        self.results()
+        self.write_fixtures('United States Dollar')
+        self.assertEqual(self.results()['currencies'], (0, 1, 0, 1))
+        self.assertEqual(Currency.objects.count(), 2)
+        self.assertEqual(Currency.objects.get(currency_code='USD').currency_name, 'United States Dollar')
+
+    def test_prune_and_dry_run(self):
+        """Test that rows missing from fixtures are only deleted with prune"""
+        Currency.objects.create(currency_code='XAU', currency_name='Gold')
+        self.assertEqual(self.results(dry_run=True)['currencies'], (2, 0, 0, 0))
+        self.assertEqual(Currency.objects.count(), 1)
+        self.assertEqual(self.results(prune=True)['currencies'], (2, 0, 1, 0))
+        self.assertFalse(Currency.objects.filter(currency_code='XAU').exists())
+
+    def test_composite_keys_and_trade_settings(self):
+        """Test that facilities match on counterparty and name, and synced settings reach the snapshot"""
+        acme = Counterparty.objects.create(counterparty_name='Acme Corp', counterparty_code='ACME001')
+        other = Counterparty.objects.create(counterparty_name='Other Corp', counterparty_code='OTH001')
+        Counterparty_Facility.objects.create(counterparty=other, counterparty_facility_name='Main Silo')
+        (self.fixtures / 'counterparty_facilities.yaml').write_text(
+            '- {counterparty: ACME001, counterparty_facility_name: Main Silo, city: Rosario}\n'
+            '- {counterparty: OTH001, counterparty_facility_name: Main Silo, city: Santos}\n'
+        )
+        (self.fixtures / 'trade_settings.yaml').write_text(
+            '- {setting_name: max_payment_days, setting_value: "75", setting_type: integer}\n'
+        )
+        with mock.patch.object(trade_settings, 'notify_change') as notify_change:
+            with self.captureOnCommitCallbacks(execute=True):
+                results = self.results()
+        self.assertEqual(results['counterparty_facilities'], (1, 1, 0, 0))
+        self.assertEqual(results['trade_settings'], (1, 0, 0, 0))
+        self.assertEqual(
+            dict(Counterparty_Facility.objects.values_list('counterparty', 'city')),
+            {acme.pk: 'Rosario', other.pk: 'Santos'}
+        )
+        notify_change.assert_called_once_with()
+
+
+class SyntheticDataTestCase(SimpleTestCase):
+    """Test the synthetic row generators"""
+
+    context = {
+        'today': date(2025, 6, 30),
+        'years': 3,
+        'prefix': 'SYN-1',
+        'counterparty_ids': list(range(1, 101)),
+        'references': {name: [1, 2, 3] for name in (
+            'currency', 'cost_center', 'trader', 'commodity', 'broker', 'icoterm',
+            'delivery_format', 'additive', 'sociedad', 'trade_operation_type',
+        )},
+    }
+
+    def test_rows_are_deterministic_by_seed(self):
+        """Test that the same seed and chunk always generate the same rows"""
+        first = list(synthetic.generate_rows('contracts', 1, 0, 0, 50, self.context))
+        self.assertEqual(first, list(synthetic.generate_rows('contracts', 1, 0, 0, 50, self.context)))
+        self.assertNotEqual(first, list(synthetic.generate_rows('contracts', 2, 0, 0, 50, self.context)))
+        self.assertTrue(all(len(row) == len(synthetic.COLUMNS['contracts']) for row in first))
+
+    def test_counterparties_are_skewed(self):
+        """Test that a few counterparties receive most contracts"""
+        rows = synthetic.generate_rows('contracts', 1, 0, 0, 2000, self.context)
+        column = synthetic.COLUMNS['contracts'].index('counterparty_id')
+        top_decile = sum(1 for row in rows if row[column] <= 10)
+        self.assertGreater(top_decile, 2000 * 0.3)
+
+
+class CounterpartyImportTestCase(TestCase):
+    """Test bulk counterparty import and duplicate detection"""
+
+    def setUp(self):
+        self.existing = Counterparty.objects.create(
+            counterparty_name='Acme Trading Corp.', counterparty_code='ACME001', tax_id='B-12.345.678'
+        )
+
+    def run_import(self, text, **kwargs):
+        return import_counterparties(read_rows(io.BytesIO(text.encode()), 'import.csv'), **kwargs)
+
+    def test_normalization(self):
+        """Test that punctuation, case, accents and legal suffixes are ignored"""
+        self.assertEqual(normalize_name('ACME  TRADING, Inc'), 'acme trading')
+        self.assertEqual(normalize_name('Société Générale S.A.'), 'societe generale')
+        self.assertEqual(normalize_tax_id('b 12.345.678'), 'B12345678')
+        self.assertEqual(self.existing.normalized_name, 'acme trading')
+
+    def test_exact_and_in_file_duplicates_are_merged(self):
+        """Test that rows matching by tax id or name add facilities instead of counterparties"""
+        report = self.run_import(
+            'counterparty_name,tax_id,facility_name,facility_type\n'
+            'ACME Trading Inc,,Rotterdam Silo,Silo\n'
+            'Acme Holdings,B12345678,Hamburg Office,Office\n'
+            'Northern Grain Co,NG-1,Chicago Silo,Silo\n'
+            'Northern Grain Ltd.,,Chicago Silo,Silo\n'
+            ',,Orphan Silo,Silo\n'
+        )
+        self.assertEqual((report['rows'], report['created'], report['matched']), (5, 1, 3))
+        self.assertEqual(report['facilities_created'], 3)
+        self.assertEqual([error['row'] for error in report['errors']], [6])
+        self.assertEqual(Counterparty.objects.count(), 2)
+        self.assertEqual(self.existing.facilities.count(), 2)
+        northern = Counterparty.objects.get(normalized_name='northern grain')
+        self.assertEqual(northern.counterparty_code, 'NORTHERN001')
+        self.assertEqual(Counterparty_Facility.objects.filter(counterparty=northern).count(), 1)
+
+    def test_fuzzy_duplicates_are_reported(self):
+        """Test that near-identical names are skipped for review unless create_fuzzy is set"""
+        text = 'counterparty_name\nAcme Tradin Corp\n'
+        report = self.run_import(text)
+        self.assertEqual(report['created'], 0)
+        self.assertEqual(report['possible_duplicates'][0]['candidate'], self.existing.pk)
+        self.assertEqual(self.run_import(text, create_fuzzy=True)['created'], 1)
+
+    def test_fuzzy_candidates_ranked_by_shared_tokens(self):
+        """Test that the candidates cut at FUZZY_MAX_CANDIDATES are those sharing the most tokens"""
+        index = DuplicateIndex(threshold=0.5)
+        for key, name in enumerate(['acme logistics', 'acme shipping', 'acme trading house']):
+            index.add(key, name, '')
+        with mock.patch('apps.nextcrm.counterparty_import.FUZZY_MAX_CANDIDATES', 1):
+            self.assertEqual(index.fuzzy('acme trading')[0], 2)
+
+    def test_dry_run_and_endpoint(self):
+        """Test that a dry run writes nothing and the upload endpoint returns the report"""
+        self.run_import('counterparty_name\nGlobal Metals\n', dry_run=True)
+        self.assertFalse(Counterparty.objects.filter(normalized_name='global metals').exists())
+
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+        upload = SimpleUploadedFile('import.csv', b'counterparty_name\nGlobal Metals\n', content_type='text/csv')
+        response = client.post('/api/counterparties/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(client.post('/api/counterparties/import/', {}, format='multipart').status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LeanQuerysetTestCase(TestCase):
+    """Test action-aware queryset shaping on list, retrieve and export"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+        self.references = create_contract_references()
+        self.counterparty = self.references['counterparty']
+        for name in ('Rotterdam Silo', 'Hamburg Office'):
+            Counterparty_Facility.objects.create(counterparty=self.counterparty, counterparty_facility_name=name)
+        create_contract(self.references)
+
+    def test_counterparty_list_counts_in_sql(self):
+        """Test that list rows carry SQL counts and never load facility rows"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/counterparties/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.data['results'][0]
+        self.assertEqual((row['facility_count'], row['contract_count']), (2, 1))
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT "counterparty_facilities"') for query in queries.captured_queries
+        ))
+        page = next(
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "counterparties"' in query['sql'] and 'LIMIT' in query['sql']
+        )
+        self.assertNotIn('"counterparties"."contact_person"', page)
+
+    def test_counterparty_retrieve_includes_facilities(self):
+        """Test that the detail view still renders facilities"""
+        response = self.client.get(f'/api/counterparties/{self.counterparty.pk}/')
+        self.assertEqual(len(response.data['facilities']), 2)
+
+    def test_contract_list_and_export(self):
+        """Test that the lean contract list renders display fields and export streams CSV"""
+        response = self.client.get('/api/contracts/')
+        self.assertEqual(response.data['results'][0]['counterparty_name'], 'Acme Corp')
+        self.assertEqual(response.data['results'][0]['total_value'], '1000.00')
+
+        response = self.client.get('/api/contracts/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['contract_number', 'status', 'date'])
+        self.assertIn('Acme Corp', lines[1])
+        self.assertTrue(AuditLog.objects.filter(action='EXPORT', model_name='Contract').exists())
+
+
+class CounterpartyPositionTestCase(TestCase):
+    """Test incremental position maintenance and the positions API"""
+
+    def setUp(self):
+        self.references = create_contract_references()
+        self.buy = self.references['trade_operation_type']
+        self.buy.position_sign = 1
+        self.buy.save()
+        self.sell = Trade_Operation_Type.objects.create(
+            trade_operation_type_name='Sale', operation_code='SELL', position_sign=-1
+        )
+        self.january = date(2030, 1, 1)
+
+    def position(self, month=None):
+        return Counterparty_Position.objects.filter(delivery_month=month or self.january).first()
+
+    def test_only_open_contracts_count(self):
+        """Test that approving opens a position and sells net against buys"""
+        bought = create_contract(self.references, delivery_period=date(2030, 1, 20))
+        self.assertIsNone(self.position())
+
+        workflow.apply_transition(bought.pk, 'approve')
+        sold = create_contract(
+            self.references, trade_operation_type=self.sell, quantity=4, status='approved'
+        )
+        position = self.position()
+        self.assertEqual(
+            (position.long_quantity, position.short_quantity, position.net_quantity, position.contract_count),
+            (10, 4, 6, 2)
+        )
+        self.assertEqual(position.net_value, 600)
+
+        workflow.bulk_transition([bought.pk, sold.pk], 'cancel')
+        self.assertIsNone(self.position())
+
+    def test_edit_moves_contract_between_months(self):
+        """Test that changing delivery_period refreshes both the old and the new month"""
+        contract = create_contract(self.references, status='approved')
+        contract.delivery_period = date(2030, 2, 15)
+        contract.save()
+        self.assertIsNone(self.position())
+        self.assertEqual(self.position(date(2030, 2, 1)).net_quantity, 10)
+
+        Counterparty_Position.objects.all().delete()
+        positions.rebuild()
+        self.assertEqual(self.position(date(2030, 2, 1)).net_quantity, 10)
+
+    def test_positions_api(self):
+        """Test filtering positions and the per-counterparty exposure summary"""
+        create_contract(self.references, status='executed')
+        create_contract(self.references, status='approved', delivery_period=date(2030, 3, 1))
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+
+        response = client.get('/api/positions/', {'delivery_month__gte': '2030-02-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['delivery_month'] for row in response.data['results']], ['2030-03-01'])
+        self.assertEqual(response.data['results'][0]['counterparty_name'], 'Acme Corp')
+
+        response = client.get('/api/positions/by_counterparty/')
+        self.assertEqual(response.data['results'][0]['net_quantity'], '20.000')
+        self.assertEqual(response.data['results'][0]['contract_count'], 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ContractReportTestCase(TestCase):
+    """Test the vectorized contract report"""
+
+    def setUp(self):
+        cache.clear()
+        self.references = create_contract_references()
+        june = date(2025, 6, 10)
+        create_contract(self.references, date=june, quantity=10, price=100, freight_cost=50, broker_fee=20, forex=2)
+        create_contract(self.references, date=june, quantity=30, price=200, freight_cost=150, broker_fee=10, forex=1)
+        create_contract(self.references, date=date(2025, 7, 1), quantity=5, price=80)
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+
+    def test_report_groups_and_converts(self):
+        """Test weighted average price, freight per MT and converted broker fees"""
+        report = reporting.build_report(Contract.objects.all())
+        self.assertEqual(report['contract_count'], 3)
+        june = report['by_commodity_month'][0]
+        self.assertEqual(june['month'], '2025-06')
+        self.assertEqual(june['weighted_average_price'], 175.0)
+        self.assertEqual(june['freight_per_mt'], 5.0)
+        self.assertEqual(june['value'], 8000.0)
+        self.assertEqual(report['by_broker'][0]['broker_fee_converted'], 50.0)
+
+    def test_report_matches_orm_aggregation(self):
+        """Test that the vectorized figures agree with the ORM ones"""
+        report = reporting.build_report(Contract.objects.all())
+        orm = reporting.build_report_orm(Contract.objects.all())
+        self.assertEqual(
+            [row['value'] for row in report['by_commodity_month']],
+            [float(row['value']) for row in orm['by_commodity_month']]
+        )
+
+    def test_endpoint_filters_and_caches(self):
+        """Test that the endpoint applies list filters and serves repeats from the cache"""
+        response = self.client.get('/api/contracts/report/', {'date': '2025-07-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['contract_count'], 1)
+        with self.assertNumQueries(0):
+            self.client.get('/api/contracts/report/', {'date': '2025-07-01'})
+        self.assertEqual(self.client.get('/api/contracts/report/').data['contract_count'], 3)
+
+    def test_empty_report(self):
+        """Test that no matching contracts gives an empty report"""
+        report = reporting.build_report(Contract.objects.none())
+        self.assertEqual((report['contract_count'], report['by_broker']), (0, []))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    FX_BASE_CURRENCY='USD'
+)
+class ExchangeRateTestCase(TestCase):
+    """Test the FX rate store and base currency aggregation"""
+
+    def setUp(self):
+        self.references = create_contract_references()
+        self.eur = Currency.objects.create(currency_code='EUR', currency_name='Euro')
+        Currency.objects.create(currency_code='GBP', currency_name='British Pound')
+        with self.captureOnCommitCallbacks(execute=True):
+            fx.load_rates(fx.parse_rate_rows([
+                {'date': '2025-01-01', 'currency': 'EUR', 'quote': 'USD', 'rate': '1.10'},
+                {'date': '2025-06-01', 'currency': 'EUR', 'quote': 'USD', 'rate': '1.20'},
+                {'date': '2025-01-01', 'currency': 'USD', 'quote': 'GBP', 'rate': '0.80'},
+            ]))
+
+    def test_in_memory_lookup(self):
+        """Test as-of-date, inverted and cross rates from the in-memory table"""
+        self.assertEqual(fx.convert(100, 'EUR', on=date(2025, 5, 31)), Decimal('110.00'))
+        self.assertEqual(fx.convert(100, 'EUR', on=date(2025, 7, 1)), Decimal('120.00'))
+        self.assertEqual(fx.convert(80, 'GBP', on=date(2025, 2, 1)), Decimal('100.0000000000'))
+        self.assertEqual(fx.convert(100, 'EUR', 'GBP', on=date(2025, 7, 1)), Decimal('96.0000'))
+        with self.assertRaises(fx.MissingRate):
+            fx.convert(100, 'EUR', on=date(2024, 12, 31))
+
+    def test_base_conversion_matches_sql_lookup(self):
+        """Test that only direct currency -> base rows convert into the base currency, as in SQL"""
+        chf = Currency.objects.create(currency_code='CHF', currency_name='Swiss Franc')
+        usd = self.references['trade_currency']
+        with self.captureOnCommitCallbacks(execute=True):
+            # Written without load_rates(), so no CHF -> USD row is derived
+            Exchange_Rate.objects.create(
+                currency=usd, quote_currency=chf, rate_date=date(2025, 1, 1), rate=Decimal('0.90')
+            )
+            fx.bump_version()
+        with self.assertRaises(fx.MissingRate):
+            fx.convert(90, 'CHF', on=date(2025, 2, 1))
+        self.assertEqual(fx.convert(100, 'USD', 'CHF', on=date(2025, 2, 1)), Decimal('90.00'))
+
+        contract = create_contract(self.references, date=date(2025, 2, 1), trade_currency=chf)
+        converted = Contract.objects.annotate(rate=fx.rate_to_base('trade_currency', 'date')).get(pk=contract.pk)
+        self.assertIsNone(converted.rate)
+
+    def test_reload_after_new_rates(self):
+        """Test that loading rates refreshes the in-memory table"""
+        fx.get_rate_table()
+        with self.captureOnCommitCallbacks(execute=True):
+            fx.load_rates([('EUR', 'USD', date(2025, 7, 1), Decimal('1.30'))])
+        self.assertEqual(fx.convert(100, 'EUR', on=date(2025, 7, 1)), Decimal('130.00'))
+
+    def test_dashboard_converts_in_sql(self):
+        """Test that dashboard totals are in the base currency and unconverted contracts are counted"""
+        create_contract(self.references, quantity=10, price=100, date=date(2025, 6, 15))
+        create_contract(
+            self.references, quantity=10, price=100, date=date(2025, 6, 15), trade_currency=self.eur
+        )
+        create_contract(
+            self.references, quantity=1, price=100, date=date(2024, 6, 15), trade_currency=self.eur
+        )
+        summary = dashboard.summary_block()
+        self.assertEqual(summary['total_value'], Decimal('2200'))
+        self.assertEqual(summary['unconverted_contracts'], 1)
+
+        report = reporting.build_report(Contract.objects.all())
+        self.assertEqual(report['totals']['value_base'], 2200.0)
+        self.assertEqual(report['unconverted_contracts'], 1)
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    """Test the orjson renderer and parser used by the API"""
+
+    def test_render_matches_stock_types(self):
+        """Test that dates, UUIDs, lazy strings and Decimals render like the stock renderer"""
+        data = {'day': date(2025, 1, 2), 'amount': Decimal('1.50'), 'label': gettext_lazy('Draft'), 1: 'one'}
+        rendered = json.loads(renderers.ORJSONRenderer().render(data))
+        self.assertEqual(rendered, {'day': '2025-01-02', 'amount': '1.50', 'label': 'Draft', '1': 'one'})
+        self.assertEqual(renderers.ORJSONRenderer().render(None), b'')
+
+    @override_settings(REST_FRAMEWORK={'COERCE_DECIMAL_TO_STRING': False})
+    def test_decimals_as_numbers(self):
+        """Test that Decimals render as exact JSON numbers when coercion is off"""
+        self.assertEqual(renderers.dumps({'price': Decimal('0.10000000000000000001')}),
+                         b'{"price":0.10000000000000000001}')
+
+    def test_parse(self):
+        """Test parsing and the error raised for malformed bodies"""
+        parser = renderers.ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"ids": [1, 2]}')), {'ids': [1, 2]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"ids": '))
+
+    def test_stream_array(self):
+        """Test that chunked streaming yields one valid array"""
+        for count in (0, 1, 5, 6):
+            body = b''.join(renderers.stream_array(({'n': n} for n in range(count)), chunk_size=3))
+            self.assertEqual(json.loads(body), [{'n': n} for n in range(count)])
+
+
+class JSONExportTestCase(TestCase):
+    """Test the streamed JSON variant of the export action"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+        create_contract(create_contract_references())
+
+    def test_contract_export_as_json(self):
+        """Test that ?as=json streams the export rows as JSON objects"""
+        response = self.client.get('/api/contracts/export/', {'as': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['counterparty'], 'Acme Corp')
+        self.assertTrue(AuditLog.objects.filter(object_repr='JSON export of contracts').exists())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RESPONSE_CACHE_ENCODINGS=['gzip'],
+    RESPONSE_CACHE_MIN_COMPRESS_SIZE=1024
+)
+class ResponseCacheTestCase(TestCase):
+    """Test pre-compressed response cache entries"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.data = {'rows': [{'id': n, 'status': 'approved'} for n in range(500)]}
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.data
+
+    def test_negotiation(self):
+        """Test that the best accepted coding wins and q=0 excludes a coding"""
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0.8, br')
+        self.assertEqual(response_cache.negotiate(request, ['br', 'gzip']), 'br')
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='br;q=0, *')
+        self.assertEqual(response_cache.negotiate(request, ['br', 'gzip']), 'gzip')
+        self.assertEqual(response_cache.negotiate(self.factory.get('/'), ['br', 'gzip']), 'identity')
+
+    def test_variants_served_without_rebuilding(self):
+        """Test that a fill stores every coding and later hits serve them without building"""
+        response = response_cache.cached_response(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate'), 'test', self.build, 60
+        )
+        response.render()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.data)
+
+        response = response_cache.cached_response(self.factory.get('/'), 'test', self.build, 60)
+        response.render()
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(response.content), self.data)
+        self.assertEqual(self.builds, 1)
+
+    def test_small_bodies_stay_uncompressed(self):
+        """Test that bodies under the minimum size are served as identity for every coding"""
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = response_cache.cached_response(request, 'small', lambda: {'ok': True}, 60)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response_cache.cached_response(request, 'small', self.build, 60)
+        self.assertEqual(self.builds, 0)
+
+    def test_dashboard_stats_endpoint(self):
+        """Test that dashboard stats are served from the response cache"""
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+        response = client.get('/api/contracts/dashboard_stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_contracts'], 0)
+        with self.assertNumQueries(0):
+            client.get('/api/contracts/dashboard_stats/')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ContractListCacheTestCase(TestCase):
+    """Test the contract list response cache and its invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.references = create_contract_references()
+        self.contract = create_contract(self.references)
+        self.user = User.objects.create_user(username='trader', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def list_count(self, **params):
+        return self.client.get('/api/contracts/', params).json()['count']
+
+    def test_repeat_served_from_cache(self):
+        """Test that a repeated query is served without touching the database"""
+        self.assertEqual(self.list_count(status='draft', ordering='date'), 1)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/contracts/?ordering=date&status=draft')
+        self.assertEqual(response.json()['results'][0]['counterparty_name'], 'Acme Corp')
+        stats = response_cache.hit_stats(['contract_list'])['contract_list']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_writes_invalidate(self):
+        """Test that contract saves and bulk transitions retire cached pages"""
+        self.assertEqual(self.list_count(status='draft'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_contract(self.references)
+        self.assertEqual(self.list_count(status='draft'), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            workflow.bulk_transition([self.contract.pk], 'approve')
+        self.assertEqual(self.list_count(status='draft'), 1)
+
+    def test_renamed_counterparty_invalidates(self):
+        """Test that renaming a rendered relation retires cached pages"""
+        self.client.get('/api/contracts/')
+        counterparty = self.references['counterparty']
+        counterparty.counterparty_name = 'Acme Holdings'
+        with self.captureOnCommitCallbacks(execute=True):
+            counterparty.save()
+        response = self.client.get('/api/contracts/')
+        self.assertEqual(response.json()['results'][0]['counterparty_name'], 'Acme Holdings')
+
+    def test_keyed_on_permissions(self):
+        """Test that users with different permissions do not share entries"""
+        staff = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.assertNotEqual(
+            response_cache.permission_fingerprint(self.user), response_cache.permission_fingerprint(staff)
+        )
+        self.assertEqual(
+            response_cache.permission_fingerprint(self.user),
+            response_cache.permission_fingerprint(User.objects.create_user(username='other', password='x'))
+        )
+
+    def test_cache_stats_endpoint(self):
+        """Test that hit counters are reported to staff only"""
+        self.client.get('/api/contracts/')
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=User.objects.create_user(username='admin', password='x', is_staff=True))
+        response = self.client.get('/api/cache-stats/')
+        self.assertEqual(response.json()['contract_list']['misses'], 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheTagsTestCase(TestCase):
+    """Test tag-based invalidation of cached responses"""
+
+    def setUp(self):
+        cache.clear()
+        self.references = create_contract_references()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='trader', password='testpass123'))
+
+    def test_instance_tags(self):
+        """Test that writes map to row, collection and parent tags"""
+        contract = create_contract(self.references)
+        self.assertEqual(set(caching.instance_tags(contract)), {
+            'contract', f'contract:{contract.pk}',
+            f"counterparty:{self.references['counterparty'].pk}", f"trader:{self.references['trader'].pk}",
+        })
+        currency = self.references['trade_currency']
+        self.assertEqual(caching.instance_tags(currency), ['refdata:currency', f'currency:{currency.pk}'])
+
+    def test_invalidate_changes_only_tagged_digests(self):
+        """Test that invalidating a tag changes the digest of entries declaring it and no others"""
+        contract_digest = response_cache.tag_digest(['contract', 'refdata:currency'])
+        broker_digest = response_cache.tag_digest(['refdata:broker'])
+        response_cache.invalidate(['refdata:currency'])
+        self.assertNotEqual(response_cache.tag_digest(['refdata:currency', 'contract']), contract_digest)
+        self.assertEqual(response_cache.tag_digest(['refdata:broker']), broker_digest)
+
+    def test_lost_tag_version_is_not_reused(self):
+        """Test that an evicted tag version gets a new token instead of an old one"""
+        key = response_cache.tag_digest(['contract'])
+        response_cache.invalidate(['contract'])
+        cache.delete(f'{response_cache.TAG_PREFIX}contract')
+        self.assertNotEqual(response_cache.tag_digest(['contract']), key)
+
+    def test_reference_list_invalidated_by_write(self):
+        """Test that a cached reference list is retired when a row of it is saved"""
+        self.assertEqual(self.client.get('/api/currencies/').json()['count'], 1)
+        with self.assertNumQueries(0):
+            self.client.get('/api/currencies/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Currency.objects.create(currency_code='EUR', currency_name='Euro')
+        self.assertEqual(self.client.get('/api/currencies/').json()['count'], 2)
+
+    def test_reference_sync_invalidates(self):
+        """Test that bulk reference data syncs invalidate the synced tables"""
+        key = response_cache.tag_digest(['refdata:currency'])
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'currencies.json').write_text(json.dumps(
+                [{'currency_code': 'EUR', 'currency_name': 'Euro'}]
+            ))
+            with self.captureOnCommitCallbacks(execute=True):
+                reference_data.sync_reference_data(directory)
+        self.assertNotEqual(response_cache.tag_digest(['refdata:currency']), key)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RESPONSE_CACHE_ENCODINGS=['gzip'],
+    RESPONSE_CACHE_STALE_TIMEOUT=60,
+    RESPONSE_CACHE_LOCK_WAIT=5.0,
+    RESPONSE_CACHE_EARLY_REFRESH_BETA=0
+)
+class CoalescedFillTestCase(SimpleTestCase):
+    """Test that concurrent requests share one rebuild of an expired entry"""
+
+    requests = 10
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.builds = 0
+        self.builds_lock = threading.Lock()
+
+    def build(self):
+        with self.builds_lock:
+            self.builds += 1
+            version = self.builds
+        time.sleep(0.2)
+        return {'version': version}
+
+    def fetch_concurrently(self, tags=()):
+        """Versions served to self.requests simultaneous requests"""
+        barrier = threading.Barrier(self.requests)
+
+        def fetch(_):
+            barrier.wait()
+            response = response_cache.cached_response(self.factory.get('/'), 'stats', self.build, 1, tags=tags)
+            response.render()
+            return json.loads(response.content)['version']
+
+        with ThreadPoolExecutor(max_workers=self.requests) as pool:
+            return list(pool.map(fetch, range(self.requests)))
+
+    def test_cold_entry_built_once(self):
+        """Test that requests finding no entry wait for the single fill"""
+        self.assertEqual(self.fetch_concurrently(), [1] * self.requests)
+        self.assertEqual(self.builds, 1)
+
+    def test_single_rebuild_per_expiry(self):
+        """Test that an expired entry is rebuilt once while the others serve it stale"""
+        self.fetch_concurrently()
+        time.sleep(1.1)
+        versions = self.fetch_concurrently()
+        self.assertEqual(self.builds, 2)
+        self.assertIn(2, versions)
+        self.assertLessEqual(set(versions), {1, 2})
+        self.assertEqual(self.fetch_concurrently(), [2] * self.requests)
+        self.assertEqual(self.builds, 2)
+
+    def test_single_rebuild_per_invalidation(self):
+        """Test that an invalidated entry is rebuilt once"""
+        self.fetch_concurrently(tags=['contract'])
+        response_cache.invalidate(['contract'])
+        self.fetch_concurrently(tags=['contract'])
+        self.assertEqual(self.builds, 2)
+
+    @override_settings(RESPONSE_CACHE_EARLY_REFRESH_BETA=1e6)
+    def test_early_refresh(self):
+        """Test that an expensive entry can be rebuilt before it expires"""
+        request = self.factory.get('/')
+        response_cache.cached_response(request, 'stats', self.build, 60)
+        response = response_cache.cached_response(request, 'stats', self.build, 60)
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(response.data, {'version': 2})
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RATELIMIT_ENABLE=True,
+)
+class ProbeMiddlewareTestCase(TestCase):
+    """Test the probe and asset fast path ahead of the session/auth/rate limit middleware"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(probes, '_readiness', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_liveness_probes_skip_middleware(self):
+        """Test that probes are answered without queries or rate limit counters"""
+        with self.assertNumQueries(0):
+            health = self.client.get('/api/auth/health/')
+            ping = self.client.get('/api/auth/ping/')
+            root_ping = self.client.get('/ping/')
+        self.assertEqual(health.json()['status'], 'healthy')
+        self.assertEqual(ping.json()['message'], 'pong')
+        self.assertEqual(root_ping.json()['status'], 'ok')
+        self.assertIsNone(cache.get('rate_limit_127.0.0.1'))
+
+        self.client.get('/api/auth/me/')
+        self.assertEqual(cache.get('rate_limit_127.0.0.1'), 1)
+
+    def test_unsafe_methods_are_not_short_circuited(self):
+        """Test that only GET/HEAD probes take the fast path"""
+        response = self.client.post('/api/auth/health/')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_docs_skip_middleware(self):
+        """Test that the API docs are served without a rate limit counter"""
+        response = self.client.get('/api/docs/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get('rate_limit_127.0.0.1'))
+
+    def test_readiness_is_cached(self):
+        """Test that readiness checks the database and cache once per READINESS_CACHE_TIMEOUT"""
+        response = self.client.get('/api/auth/ready/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertTrue(data['ready'])
+        self.assertTrue(data['checks']['database:default']['ok'])
+        self.assertTrue(data['checks']['cache']['ok'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/auth/ready/').json(), data)
+
+    @mock.patch('core.probes.check_cache', side_effect=ConnectionError)
+    def test_readiness_fails_without_cache(self, check_cache):
+        """Test that a failing cache makes the readiness probe answer 503"""
+        response = self.client.get('/api/auth/ready/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['checks']['cache']['error'], 'ConnectionError')
+
+    @override_settings(READINESS_MAX_LATENCY_MS=-1)
+    def test_slow_checks_fail_readiness(self):
+        """Test that checks slower than READINESS_MAX_LATENCY_MS count as failed"""
+        response = self.client.get('/api/auth/ready/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(response.json()['checks']['database:default']['ok'])
+
+
+class OpenAPISchemaTestCase(SimpleTestCase):
+    """Test the pre-rendered OpenAPI schema"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(OPENAPI_SCHEMA_DIR=directory.name, CODE_VERSION='test1')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patcher in [mock.patch.object(openapi, '_version', None), mock.patch.dict(openapi._loaded, clear=True)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_schema_is_generated_once(self):
+        """Test that the first request writes every variant and later ones read them"""
+        response = self.client.get('/api/schema/?format=json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        schema = json.loads(gzip.decompress(response.content))
+        self.assertIn('/api/contracts/', schema['paths'])
+        self.assertTrue((self.directory / 'openapi-test1.yaml').exists())
+        self.assertTrue((self.directory / 'openapi-test1.json.gz').exists())
+
+        with mock.patch.object(openapi, 'render_schema') as render_schema:
+            response = self.client.get('/api/schema/')
+        render_schema.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi')
+        self.assertTrue(response.content.startswith(b'openapi:'))
+
+    @mock.patch.object(openapi, 'render_schema', return_value={'yaml': b'openapi: 3.0.3\n', 'json': b'{}'})
+    def test_etag_revalidation(self, render_schema):
+        """Test that a matching If-None-Match gets 304"""
+        response = self.client.get('/api/schema/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.content, b'{}')
+        revalidated = self.client.get(
+            '/api/schema/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+    @mock.patch.object(openapi, 'render_schema', return_value={'yaml': b'openapi: 3.0.3\n', 'json': b'{}'})
+    def test_prune_keeps_current_version(self, render_schema):
+        """Test that pruning removes only other versions' files"""
+        openapi.generate('old')
+        openapi.generate('test1')
+        removed = openapi.prune('test1')
+        self.assertEqual({path.name for path in removed}, {'openapi-old.yaml', 'openapi-old.json'})
+        self.assertEqual({path.name for path in self.directory.iterdir()}, {'openapi-test1.yaml', 'openapi-test1.json'})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StartupTestCase(TestCase):
+    """Test worker startup warmup and profiling helpers"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_runs_every_step(self):
+        """Test that warm() times every step and reports what it loaded"""
+        timings = startup.warm(force=True)
+        self.assertEqual(list(timings), [name for name, _ in startup.WARMUPS])
+        for seconds, detail in timings.values():
+            self.assertGreaterEqual(seconds, 0)
+            self.assertIsInstance(detail, str)
+
+    def test_failing_step_does_not_stop_warmup(self):
+        """Test that a failing step is recorded and the others still run"""
+        failing = mock.Mock(side_effect=OperationalError('down'))
+        with mock.patch.object(startup, 'WARMUPS', [('broken', failing), ('url resolver', startup.warm_url_resolver)]):
+            timings = startup.warm(force=True)
+        self.assertEqual(timings['broken'], (None, 'OperationalError'))
+        self.assertIsNotNone(timings['url resolver'][0])
+
+    def test_warm_inside_event_loop(self):
+        """Test that warming from a running event loop (uvicorn imports the app there) runs in a thread"""
+        def step():
+            return 'in loop' if startup.in_event_loop() else threading.current_thread().name
+
+        async def import_application():
+            return startup.warm(force=True)
+
+        with mock.patch.object(startup, 'WARMUPS', [('step', step)]), \
+                mock.patch.object(startup, 'release_connections', side_effect=RuntimeError('closing')), \
+                self.assertLogs('core.startup', level='WARNING'):
+            timings = asyncio.run(import_application())
+        self.assertEqual(timings['step'][1], 'startup-warmup')
+
+    @override_settings(STARTUP_WARMUP=False)
+    def test_warmup_can_be_disabled(self):
+        """Test that STARTUP_WARMUP=False skips warming"""
+        self.assertEqual(startup.warm(), {})
+
+    def test_lazy_view_imports_on_first_request(self):
+        """Test that lazy_view defers importing the view until it is called"""
+        view = startup.lazy_view('apps.nextcrm.tests.LazyTargetView', greeting='hi')
+        response = view(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'hi')
+
+    def test_parse_importtime(self):
+        """Test parsing -X importtime output into per-module and per-package timings"""
+        output = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |     django.utils.version',
+            'import time:       300 |        420 |   django',
+            'import time:      1000 |       1000 |   numpy',
+            'unrelated line',
+        ])
+        modules = startup.parse_importtime(output)
+        self.assertEqual(modules[0], ('django.utils.version', 0.00012, 0.00012, 2))
+        self.assertEqual(modules[1][3], 1)
+        totals = startup.package_totals(modules)
+        self.assertEqual(totals['django'][1], 2)
+        self.assertAlmostEqual(totals['django'][0], 0.00042)
+        self.assertEqual(totals['numpy'], (0.001, 1))
+
+
+
+class LoggingPipelineTestCase(SimpleTestCase):
+    """Test the queued structured logging pipeline"""
+
+    def make_logger(self, handler):
+        logger = logging.getLogger(f'tests.logging.{self._testMethodName}')
+        logger.handlers, logger.propagate = [handler], False
+        logger.setLevel(logging.INFO)
+        self.addCleanup(setattr, logger, 'handlers', [])
+        return logger
+
+    def make_target(self, name):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(log.JsonFormatter())
+        target.set_name(name)
+        self.addCleanup(target.close)
+        return target, stream
+
+    def test_records_are_written_as_json_by_the_listener(self):
+        """Test that queued records reach the named handler with request id, extras and traceback"""
+        target, stream = self.make_target('tests-json')
+        handler = log.QueueHandler(['tests-json'])
+        handler.addFilter(log.RequestContextFilter())
+        logger = self.make_logger(handler)
+
+        token = log.request_id_var.set('abc123')
+        try:
+            logger.info('Contract %s saved', 'C-1', extra={'duration_ms': 4.2})
+            try:
+                raise ValueError('bad price')
+            except ValueError:
+                logger.exception('Import failed')
+        finally:
+            log.request_id_var.reset(token)
+        handler.close()
+
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(first['message'], 'Contract C-1 saved')
+        self.assertEqual(first['request_id'], 'abc123')
+        self.assertEqual(first['duration_ms'], 4.2)
+        self.assertEqual(second['level'], 'ERROR')
+        self.assertIn('ValueError: bad price', second['exception'])
+
+    def test_full_queue_drops_records(self):
+        """Test that records are dropped instead of blocking when the listener falls behind"""
+        release = threading.Event()
+        target, stream = self.make_target('tests-blocked')
+        target.emit = lambda record: release.wait(5)
+        handler = log.QueueHandler(['tests-blocked'], queue_size=2)
+        logger = self.make_logger(handler)
+
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            started = time.perf_counter()
+            for index in range(10):
+                logger.info('Record %d', index)
+            elapsed = time.perf_counter() - started
+        release.set()
+        handler.close()
+
+        self.assertLess(elapsed, 1)
+        self.assertGreater(handler.dropped, 0)
+        self.assertIn('Log queue full', stderr.getvalue())
+
+    def test_info_sampling(self):
+        """Test that INFO records are sampled per request and warnings always kept"""
+        def record(level, request_id):
+            entry = logging.LogRecord('tests', level, __file__, 1, 'message', None, None)
+            entry.request_id = request_id
+            return entry
+
+        self.assertFalse(log.InfoSampler(0.0).filter(record(logging.INFO, 'r1')))
+        self.assertTrue(log.InfoSampler(0.0).filter(record(logging.WARNING, 'r1')))
+        self.assertTrue(log.InfoSampler(1.0).filter(record(logging.INFO, None)))
+
+        sampler = log.InfoSampler(0.5)
+        decisions = {
+            request_id: {sampler.filter(record(logging.INFO, request_id)) for _ in range(5)}
+            for request_id in (f'request-{index}' for index in range(50))
+        }
+        self.assertTrue(all(len(kept) == 1 for kept in decisions.values()))
+        self.assertEqual({kept.pop() for kept in decisions.values()}, {True, False})
+        kept = record(logging.INFO, 'request-1')
+        while not sampler.filter(kept):
+            kept = record(logging.INFO, kept.request_id + 'x')
+        self.assertEqual(kept.sample_rate, 0.5)
+
+    def test_request_log_middleware(self):
+        """Test that each request gets an id, in its records and response, and one timing record"""
+        seen = []
+
+        def view(request):
+            seen.append(log.request_id_var.get())
+            return HttpResponse(status=201)
+
+        middleware = log.RequestLogMiddleware(view)
+        factory = RequestFactory()
+        with self.assertLogs('core.requests', level='INFO') as logs:
+            response = middleware(factory.post('/api/contracts/', HTTP_X_REQUEST_ID='lb-42'))
+            generated = middleware(factory.get('/api/contracts/', HTTP_X_REQUEST_ID='bad id\n'))
+
+        self.assertEqual(response['X-Request-ID'], 'lb-42')
+        self.assertEqual(seen[0], 'lb-42')
+        self.assertNotEqual(generated['X-Request-ID'], 'bad id\n')
+        self.assertEqual(seen[1], generated['X-Request-ID'])
+        self.assertIsNone(log.request_id_var.get())
+        record = logs.records[0]
+        self.assertEqual((record.method, record.path, record.status_code), ('POST', '/api/contracts/', 201))
+        self.assertGreaterEqual(record.duration_ms, 0)
+        self.assertIsNone(record.user_id)
+
+class LazyTargetView(View):
+    """View imported by StartupTestCase through lazy_view"""
+    greeting = ''
+
+    def get(self, request):
+        return HttpResponse(self.greeting)
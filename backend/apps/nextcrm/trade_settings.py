@@ -0,0 +1,220 @@
+"""
+Process-wide, typed snapshot of the active Trade_Setting rows.
+
+All active settings are parsed once into an immutable SettingsSnapshot, so
+get_setting() is a dict lookup with no database access and can be used in
+hot paths such as contract validation. Saving or deleting a setting bumps
+a version counter in the cache and publishes it on a Redis channel; every
+process listening on that channel reloads and swaps in a new snapshot.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import InvalidOperation
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from .models import Trade_Setting
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'trade_settings:version'
+CHANNEL = 'trade_settings:changed'
+LISTENER_RETRY_SECONDS = 5
+
+_missing = object()
+
+
+class SettingsSnapshot(NamedTuple):
+    values: Mapping
+    version: int
+    loaded_at: datetime
+
+    def as_dict(self):
+        return {name: thaw(value) for name, value in self.values.items()}
+
+
+_snapshot = None
+_lock = threading.Lock()
+_listener_pid = None
+
+
+def freeze(value):
+    """Make a parsed JSON value immutable"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def current_version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def load_snapshot(version=None):
+    """Read and parse every active setting; unparseable values are skipped"""
+    if version is None:
+        # Read the version before the rows, so the snapshot is never newer than it claims
+        version = current_version()
+
+    values = {}
+    for setting in Trade_Setting.objects.filter(is_active=True).only(
+        'setting_name', 'setting_value', 'setting_type'
+    ):
+        try:
+            values[setting.setting_name] = freeze(setting.get_typed_value())
+        except (ValueError, InvalidOperation):
+            logger.warning(
+                'Ignoring trade setting %s: %r is not a valid %s',
+                setting.setting_name, setting.setting_value, setting.setting_type
+            )
+    return SettingsSnapshot(MappingProxyType(values), version, timezone.now())
+
+
+def install(snapshot):
+    """
+    Swap in snapshot unless a newer one was installed meanwhile. An older
+    version is installed when the counter in the cache went back below the
+    current one (Redis flushed or restarted), which would otherwise leave
+    the process on its snapshot until it restarts.
+    """
+    global _snapshot
+    with _lock:
+        if (
+            _snapshot is None
+            or snapshot.version >= _snapshot.version
+            or current_version() < _snapshot.version
+        ):
+            _snapshot = snapshot
+    return _snapshot
+
+
+def reload(version=None):
+    return install(load_snapshot(version))
+
+
+def get_snapshot():
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = reload()
+    ensure_listener()
+    return snapshot
+
+
+def get_setting(name, default=_missing):
+    """Typed value of an active setting; KeyError if absent and no default"""
+    value = get_snapshot().values.get(name, default)
+    if value is _missing:
+        raise KeyError(name)
+    return value
+
+
+def get_int_setting(name, default=None):
+    """
+    Active setting as an int, or default when absent or not a number (e.g.
+    stored with a string type), so a mistyped setting cannot break callers
+    """
+    value = get_setting(name, None)
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logger.warning('Ignoring trade setting %s: %r is not a number', name, value)
+        return default
+
+
+def snapshot_version():
+    return get_snapshot().version
+
+
+def get_redis():
+    """Raw Redis client behind the default cache, or None for other backends"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except NotImplementedError:
+        return None
+
+
+def notify_change():
+    """Bump the settings version, reload locally and tell the other processes"""
+    try:
+        cache.add(VERSION_KEY, 0, timeout=None)
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # The key expired between add() and incr()
+        cache.set(VERSION_KEY, 1, timeout=None)
+        version = 1
+
+    reload(version)
+
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        redis.publish(CHANNEL, version)
+    except RedisError as exc:
+        logger.warning('Could not broadcast trade settings version %s: %r', version, exc)
+
+
+def reload_from_listener(version=None):
+    try:
+        reload(version)
+    finally:
+        # Don't hold a (pooled) connection while waiting for the next message
+        connections.close_all()
+
+
+def listen(redis):
+    while True:
+        try:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            # Changes published while we were not subscribed were missed
+            reload_from_listener()
+            for message in pubsub.listen():
+                try:
+                    version = int(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                # Not only newer versions: the counter restarts when Redis is flushed
+                if _snapshot is None or version != _snapshot.version:
+                    reload_from_listener(version)
+        except RedisError as exc:
+            logger.warning('Trade settings listener disconnected: %r', exc)
+        except Exception:
+            logger.exception('Trade settings listener failed')
+        time.sleep(LISTENER_RETRY_SECONDS)
+
+
+def ensure_listener():
+    """Start the broadcast listener once per process (again after a fork)"""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+    redis = get_redis()
+    if redis is not None:
+        threading.Thread(target=listen, args=(redis,), name='trade-settings-listener', daemon=True).start()
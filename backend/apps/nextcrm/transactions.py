@@ -0,0 +1,102 @@
+"""
+Transaction helpers for NextCRM write paths.
+
+Requests run at PostgreSQL's default READ COMMITTED isolation. Critical
+sections (contract numbering, status transitions, settings updates) take
+explicit row or advisory locks, or opt into SERIALIZABLE, and are wrapped
+in retry_on_conflict() so that serialization failures and deadlocks are
+retried with jittered backoff instead of surfacing as 500s.
+"""
+
+import functools
+import logging
+import random
+import time
+import zlib
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+
+
+def is_retryable(exc):
+    """True for database errors PostgreSQL expects the client to retry"""
+    return getattr(exc.__cause__, 'sqlstate', None) in RETRYABLE_SQLSTATES
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter, in seconds"""
+    return random.uniform(0, settings.TRANSACTION_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+
+
+def retry_on_conflict(func=None, *, serializable=False, using=DEFAULT_DB_ALIAS):
+    """
+    Run the decorated function in its own transaction and retry it when
+    PostgreSQL aborts it with a serialization failure or deadlock.
+
+    With serializable=True the transaction runs at SERIALIZABLE isolation.
+    When called inside an outer transaction the function simply joins it:
+    only the outermost transaction can be retried.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            connection = connections[using]
+            if connection.in_atomic_block:
+                return func(*args, **kwargs)
+
+            attempts = settings.TRANSACTION_RETRY_ATTEMPTS
+            for attempt in range(1, attempts + 1):
+                try:
+                    with transaction.atomic(using=using):
+                        if serializable and connection.vendor == 'postgresql':
+                            with connection.cursor() as cursor:
+                                cursor.execute('SET TRANSACTION ISOLATION LEVEL SERIALIZABLE')
+                        return func(*args, **kwargs)
+                except DatabaseError as exc:
+                    if attempt == attempts or not is_retryable(exc):
+                        raise
+                    logger.info(
+                        'Retrying %s after %s (attempt %d/%d)',
+                        func.__qualname__, exc.__cause__.sqlstate, attempt, attempts
+                    )
+                    time.sleep(backoff_delay(attempt))
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def advisory_xact_lock(key, using=DEFAULT_DB_ALIAS):
+    """
+    Take a PostgreSQL advisory lock on a string key, held until the current
+    transaction ends. Serializes critical sections that insert rows, where
+    there is no existing row to lock.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [zlib.crc32(key.encode('utf-8'))])
+
+
+def advisory_xact_locks(keys, using=DEFAULT_DB_ALIAS):
+    """
+    advisory_xact_lock() on many keys in one round trip. Locks are taken in
+    a fixed order, so two transactions locking overlapping sets cannot
+    deadlock on each other.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or not keys:
+        return
+    hashes = sorted({zlib.crc32(key.encode('utf-8')) for key in keys})
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(key) FROM (SELECT unnest(%s::bigint[]) AS key ORDER BY 1) AS keys',
+            [hashes]
+        )
@@ -10,8 +10,9 @@ from .views import (
     CommodityViewSet, CounterpartyViewSet, CounterpartyFacilityViewSet,
     BrokerViewSet, ICOTERMViewSet, DeliveryFormatViewSet,
     AdditiveViewSet, SociedadViewSet, TradeOperationTypeViewSet,
-    ContractViewSet, TradeSettingViewSet
+    ContractViewSet, CounterpartyPositionViewSet, TradeSettingViewSet, cache_stats
 )
+from . import async_views
 
 router = DefaultRouter()
 
@@ -33,7 +34,18 @@ router.register(r'sociedades', SociedadViewSet)
 router.register(r'trade-operation-types', TradeOperationTypeViewSet)
 router.register(r'trade-settings', TradeSettingViewSet)
 router.register(r'contracts', ContractViewSet)
+router.register(r'positions', CounterpartyPositionViewSet)
+
+# Async (ASGI-native) read endpoints for the hot paths
+async_urlpatterns = [
+    path('contracts/', async_views.contract_list, name='async-contract-list'),
+    path('contracts/dashboard_stats/', async_views.dashboard_stats, name='async-contract-dashboard-stats'),
+    path('contracts/<int:pk>/', async_views.contract_detail, name='async-contract-detail'),
+    path('<slug:resource>/', async_views.reference_list, name='async-reference-list'),
+]
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
+    path('cache-stats/', cache_stats, name='cache-stats'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -2,20 +2,27 @@
 Django REST Framework views for NextCRM API.
 """
 
+import csv
+from datetime import datetime, time
+
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count, Q
+from django.db.models import F, Sum
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
 
 from .models import (
     Currency, Cost_Center, Trader, Commodity_Group, Commodity_Type,
     Commodity_Subtype, Commodity, Counterparty, Broker, ICOTERM,
     Delivery_Format, Additive, Sociedad, Trade_Operation_Type,
-    Contract, Counterparty_Facility, Trade_Setting
+    Contract, Counterparty_Facility, Counterparty_Position, Trade_Setting
 )
 from .serializers import (
     CurrencySerializer, CostCenterSerializer, TraderSerializer,
@@ -24,13 +31,112 @@ from .serializers import (
     BrokerSerializer, ICOTERMSerializer, DeliveryFormatSerializer,
     AdditiveSerializer, SociedadSerializer, TradeOperationTypeSerializer,
     ContractSerializer, ContractListSerializer, ContractCreateSerializer,
-    CounterpartyFacilitySerializer, DashboardStatsSerializer, TradeSettingSerializer
+    ContractBulkTransitionSerializer, ContractStatusHistorySerializer,
+    CounterpartyFacilitySerializer, CounterpartyPositionSerializer, CounterpartyExposureSerializer,
+    DashboardStatsSerializer, TradeSettingSerializer
 )
+from apps.authentication.models import AuditLog
+from apps.authentication.signals import get_client_ip
+from core.renderers import stream_array
+from core.response_cache import cached_response, hit_stats, permission_fingerprint, query_hash
+from .counterparty_import import CounterpartyImportError, import_counterparties, read_rows
+from .dashboard import DASHBOARD_CACHE_KEY, DASHBOARD_CACHE_TAGS, get_dashboard_stats
+from .fx import rate_to_base
+from .querysets import ActionQuerysetMixin, related_count
+from .transactions import retry_on_conflict
+from . import caching, reporting, trade_settings, workflow
+from .workflow import CONTRACT_WORKFLOW
+
+
+class ContractVersionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The contract was modified by another request. Reload it and try again.'
+    default_code = 'version_conflict'
+
+
+class EchoBuffer:
+    """File-like object for csv.writer that hands each line back instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+class CsvExportMixin:
+    """
+    ``export`` action streaming the filtered, ordered queryset as CSV, or
+    as a JSON array of objects with ``?as=json``. ``export_fields`` maps
+    column headers to value lookups; rows are read with values_list so no
+    model instances are built.
+    """
+    export_fields = {}
+    export_name = 'export'
+
+    def shape_export_queryset(self, queryset):
+        return queryset.select_related(None).prefetch_related(None)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values_list(*self.export_fields.values()).iterator(chunk_size=2000)
+        as_json = request.query_params.get('as') == 'json'
+
+        if as_json:
+            headers = list(self.export_fields.keys())
+            chunks = stream_array(dict(zip(headers, row)) for row in rows)
+        else:
+            writer = csv.writer(EchoBuffer())
+
+            def lines():
+                yield writer.writerow(self.export_fields.keys())
+                for row in rows:
+                    yield writer.writerow(row)
+
+            chunks = lines()
+
+        AuditLog.objects.create(
+            user=request.user,
+            action='EXPORT',
+            model_name=queryset.model.__name__,
+            object_repr=f"{'JSON' if as_json else 'CSV'} export of {self.export_name}",
+            changes={'query': request.query_params.dict()},
+            ip_address=get_client_ip(request),
+        )
+        request._request.audit_logged = True
+
+        extension = 'json' if as_json else 'csv'
+        response = StreamingHttpResponse(
+            chunks, content_type='application/json' if as_json else 'text/csv'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.{extension}"'
+        return response
+
+
+class CachedListMixin:
+    """
+    ``list`` served from the response cache. Pages are keyed on the user's
+    permission fingerprint and the normalized query string, so users with
+    the same permissions share entries, and are retired when any of
+    ``list_cache_tags`` is invalidated.
+    """
+    list_cache_tags = []
+    list_cache_metric = 'reference_list'
+    list_cache_timeout_setting = 'REFERENCE_LIST_CACHE_TIMEOUT'
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            f'list:{permission_fingerprint(request.user)}:{query_hash(request)}',
+            lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data,
+            getattr(settings, self.list_cache_timeout_setting),
+            metric=self.list_cache_metric,
+            tags=self.list_cache_tags,
+        )
 
 
-class CurrencyViewSet(viewsets.ModelViewSet):
+class CurrencyViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
+    list_cache_tags = ['refdata:currency']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['currency_code', 'currency_name']
@@ -38,56 +144,64 @@ class CurrencyViewSet(viewsets.ModelViewSet):
     ordering = ['currency_code']
 
 
-class CostCenterViewSet(viewsets.ModelViewSet):
+class CostCenterViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Cost_Center.objects.all()
     serializer_class = CostCenterSerializer
+    list_cache_tags = ['refdata:cost_center']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['cost_center_name']
     ordering = ['cost_center_name']
 
 
-class TraderViewSet(viewsets.ModelViewSet):
+class TraderViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Trader.objects.all()
     serializer_class = TraderSerializer
+    list_cache_tags = ['refdata:trader']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['trader_name', 'email']
     ordering = ['trader_name']
 
 
-class CommodityGroupViewSet(viewsets.ModelViewSet):
+class CommodityGroupViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Commodity_Group.objects.all()
     serializer_class = CommodityGroupSerializer
+    list_cache_tags = ['refdata:commodity_group']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['commodity_group_name']
     ordering = ['commodity_group_name']
 
 
-class CommodityTypeViewSet(viewsets.ModelViewSet):
-    queryset = Commodity_Type.objects.all()
+class CommodityTypeViewSet(CachedListMixin, viewsets.ModelViewSet):
+    queryset = Commodity_Type.objects.select_related('commodity_group').all()
     serializer_class = CommodityTypeSerializer
+    list_cache_tags = ['refdata:commodity_type', 'refdata:commodity_group']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['commodity_type_name']
     ordering = ['commodity_type_name']
 
 
-class CommoditySubtypeViewSet(viewsets.ModelViewSet):
-    queryset = Commodity_Subtype.objects.all()
+class CommoditySubtypeViewSet(CachedListMixin, viewsets.ModelViewSet):
+    queryset = Commodity_Subtype.objects.select_related('commodity_type__commodity_group').all()
     serializer_class = CommoditySubtypeSerializer
+    list_cache_tags = ['refdata:commodity_subtype', 'refdata:commodity_type', 'refdata:commodity_group']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['commodity_subtype_name']
     ordering = ['commodity_subtype_name']
 
 
-class CommodityViewSet(viewsets.ModelViewSet):
+class CommodityViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Commodity.objects.select_related(
         'commodity_subtype__commodity_type__commodity_group'
     ).all()
     serializer_class = CommoditySerializer
+    list_cache_tags = [
+        'refdata:commodity', 'refdata:commodity_subtype', 'refdata:commodity_type', 'refdata:commodity_group',
+    ]
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['commodity_subtype', 'commodity_subtype__commodity_type', 'commodity_subtype__commodity_type__commodity_group']
@@ -95,19 +209,64 @@ class CommodityViewSet(viewsets.ModelViewSet):
     ordering = ['commodity_name_short']
 
 
-class CounterpartyViewSet(viewsets.ModelViewSet):
-    queryset = Counterparty.objects.prefetch_related('facilities').all()
+class CounterpartyViewSet(ActionQuerysetMixin, CsvExportMixin, viewsets.ModelViewSet):
+    queryset = Counterparty.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_supplier', 'is_customer', 'country']
     search_fields = ['counterparty_name', 'counterparty_code', 'email']
     ordering = ['counterparty_name']
+    export_name = 'counterparties'
+    export_fields = {
+        'id': 'id', 'name': 'counterparty_name', 'code': 'counterparty_code',
+        'tax_id': 'tax_id', 'city': 'city', 'country': 'country', 'email': 'email',
+        'phone': 'phone', 'is_supplier': 'is_supplier', 'is_customer': 'is_customer',
+    }
 
     def get_serializer_class(self):
         if self.action == 'list':
             return CounterpartyListSerializer
         return CounterpartySerializer
 
+    def shape_list_queryset(self, queryset):
+        return queryset.only(*CounterpartyListSerializer.Meta.model_fields).annotate(
+            facility_count=related_count(Counterparty_Facility, 'counterparty'),
+            contract_count=related_count(Contract, 'counterparty'),
+        )
+
+    def shape_retrieve_queryset(self, queryset):
+        return queryset.prefetch_related('facilities')
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """Bulk import counterparties and facilities from a CSV or XLSX upload"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def flag(name):
+            return str(request.data.get(name, '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            report = import_counterparties(
+                read_rows(upload, upload.name),
+                dry_run=flag('dry_run'),
+                create_fuzzy=flag('create_fuzzy'),
+            )
+        except CounterpartyImportError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        AuditLog.objects.create(
+            user=request.user,
+            action='CREATE',
+            model_name='Counterparty',
+            object_repr=f"Import of {upload.name}",
+            changes={key: report[key] for key in ('rows', 'created', 'matched', 'facilities_created', 'dry_run')},
+            ip_address=get_client_ip(request),
+        )
+        request._request.audit_logged = True
+        return Response(report)
+
 
 class CounterpartyFacilityViewSet(viewsets.ModelViewSet):
     queryset = Counterparty_Facility.objects.select_related('counterparty').all()
@@ -119,61 +278,67 @@ class CounterpartyFacilityViewSet(viewsets.ModelViewSet):
     ordering = ['counterparty__counterparty_name', 'counterparty_facility_name']
 
 
-class BrokerViewSet(viewsets.ModelViewSet):
+class BrokerViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Broker.objects.all()
     serializer_class = BrokerSerializer
+    list_cache_tags = ['refdata:broker']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['broker_name', 'broker_code', 'contact_person']
     ordering = ['broker_name']
 
 
-class ICOTERMViewSet(viewsets.ModelViewSet):
+class ICOTERMViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = ICOTERM.objects.all()
     serializer_class = ICOTERMSerializer
+    list_cache_tags = ['refdata:icoterm']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['icoterm_code', 'icoterm_name']
     ordering = ['icoterm_code']
 
 
-class DeliveryFormatViewSet(viewsets.ModelViewSet):
+class DeliveryFormatViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Delivery_Format.objects.all()
     serializer_class = DeliveryFormatSerializer
+    list_cache_tags = ['refdata:delivery_format']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['delivery_format_name']
     ordering = ['delivery_format_name']
 
 
-class AdditiveViewSet(viewsets.ModelViewSet):
+class AdditiveViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Additive.objects.all()
     serializer_class = AdditiveSerializer
+    list_cache_tags = ['refdata:additive']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['additive_name']
     ordering = ['additive_name']
 
 
-class SociedadViewSet(viewsets.ModelViewSet):
+class SociedadViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Sociedad.objects.all()
     serializer_class = SociedadSerializer
+    list_cache_tags = ['refdata:sociedad']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['sociedad_name', 'tax_id']
     ordering = ['sociedad_name']
 
 
-class TradeOperationTypeViewSet(viewsets.ModelViewSet):
+class TradeOperationTypeViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Trade_Operation_Type.objects.all()
     serializer_class = TradeOperationTypeSerializer
+    list_cache_tags = ['refdata:trade_operation_type']
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['trade_operation_type_name', 'operation_code']
     ordering = ['trade_operation_type_name']
 
 
-class ContractViewSet(viewsets.ModelViewSet):
+class ContractViewSet(ActionQuerysetMixin, CachedListMixin, CsvExportMixin, viewsets.ModelViewSet):
     queryset = Contract.objects.select_related(
         'trader', 'counterparty', 'commodity__commodity_subtype__commodity_type__commodity_group', 
         'broker', 'trade_currency', 'broker_fee_currency'
@@ -190,6 +355,18 @@ class ContractViewSet(viewsets.ModelViewSet):
         'commodity__commodity_name_short', 'trader__trader_name'
     ]
     ordering = ['-date', '-created_at']
+    # Rows render trader, counterparty, commodity and currency names
+    list_cache_tags = ['contract', 'counterparty', 'refdata:trader', 'refdata:commodity', 'refdata:currency']
+    list_cache_metric = 'contract_list'
+    list_cache_timeout_setting = 'CONTRACT_LIST_CACHE_TIMEOUT'
+    export_name = 'contracts'
+    export_fields = {
+        'contract_number': 'contract_number', 'status': 'status', 'date': 'date',
+        'trader': 'trader__trader_name', 'counterparty': 'counterparty__counterparty_name',
+        'commodity': 'commodity__commodity_name_short', 'quantity': 'quantity',
+        'unit_of_measure': 'unit_of_measure', 'price': 'price',
+        'currency': 'trade_currency__currency_code', 'delivery_period': 'delivery_period',
+    }
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -198,118 +375,226 @@ class ContractViewSet(viewsets.ModelViewSet):
             return ContractCreateSerializer
         return ContractSerializer
 
+    def shape_list_queryset(self, queryset):
+        # The list serializer reads four relations and no commodity hierarchy
+        return queryset.select_related(None).select_related(
+            'trader', 'counterparty', 'commodity', 'trade_currency'
+        ).only(*ContractListSerializer.Meta.model_fields)
+
+    def shape_retrieve_queryset(self, queryset):
+        # ContractSerializer.get_total_value_base reads the rate instead of querying for it
+        return queryset.annotate(base_rate=rate_to_base('trade_currency', 'date'))
+
+    def shape_report_queryset(self, queryset):
+        return queryset.select_related(None)
+
     @action(detail=False, methods=['get'])
-    def dashboard_stats(self, request):
-        """Get dashboard statistics"""
-        # Basic stats
-        total_contracts = Contract.objects.count()
-        total_value = Contract.objects.aggregate(
-            total=Sum('price')
-        )['total'] or 0
-        
-        active_contracts = Contract.objects.filter(
-            status__in=['approved', 'executed']
-        ).count()
-        
-        pending_contracts = Contract.objects.filter(status='draft').count()
-        
-        # Top counterparties by contract value
-        top_counterparties = list(
-            Contract.objects.values('counterparty__counterparty_name')
-            .annotate(total_value=Sum('price'), contract_count=Count('id'))
-            .order_by('-total_value')[:5]
-        )
-        
-        # Top commodities by volume
-        top_commodities = list(
-            Contract.objects.values('commodity__commodity_name_short')
-            .annotate(total_quantity=Sum('quantity'), contract_count=Count('id'))
-            .order_by('-total_quantity')[:5]
+    def report(self, request):
+        """
+        Book report over the filtered contracts (same query parameters as the
+        list): weighted average price, value and freight per MT by commodity
+        and month, and broker fees converted with each contract's forex
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return cached_response(
+            request,
+            reporting.report_cache_key(request.query_params),
+            lambda: reporting.build_report(queryset),
+            settings.CONTRACT_REPORT_CACHE_TIMEOUT,
+            metric='contract_report',
+            tags=reporting.REPORT_CACHE_TAGS,
         )
-        
-        # Monthly contract values for the last 12 months
-        twelve_months_ago = timezone.now().date() - timedelta(days=365)
-        monthly_values = list(
-            Contract.objects.filter(date__gte=twelve_months_ago)
-            .extra({'month': 'date_trunc(\'month\', date)'})
-            .values('month')
-            .annotate(total_value=Sum('price'), contract_count=Count('id'))
-            .order_by('month')
-        )
-        
-        # Contract status distribution
-        status_distribution = list(
-            Contract.objects.values('status')
-            .annotate(count=Count('id'))
-            .order_by('-count')
+
+    @action(detail=False, methods=['get'])
+    def dashboard_stats(self, request):
+        """Get dashboard statistics, cached for DASHBOARD_CACHE_TIMEOUT seconds"""
+        return cached_response(
+            request,
+            DASHBOARD_CACHE_KEY,
+            lambda: DashboardStatsSerializer(get_dashboard_stats()).data,
+            settings.DASHBOARD_CACHE_TIMEOUT,
+            metric='dashboard_stats',
+            tags=DASHBOARD_CACHE_TAGS,
         )
-        
-        stats = {
-            'total_contracts': total_contracts,
-            'total_value': total_value,
-            'active_contracts': active_contracts,
-            'pending_contracts': pending_contracts,
-            'top_counterparties': top_counterparties,
-            'top_commodities': top_commodities,
-            'monthly_contract_values': monthly_values,
-            'contract_status_distribution': status_distribution,
-        }
-        
-        serializer = DashboardStatsSerializer(stats)
-        return Response(serializer.data)
 
-    @action(detail=True, methods=['post'])
-    def approve(self, request, pk=None):
-        """Approve a contract"""
+    def perform_update(self, serializer):
+        expected = self.request.data.get('version')
+        if expected is not None:
+            try:
+                expected = int(expected)
+            except (TypeError, ValueError):
+                raise ValidationError({'version': 'A valid integer is required.'})
+        self.update_contract(serializer, expected)
+
+    @retry_on_conflict
+    def update_contract(self, serializer, expected_version):
+        """
+        Save an edit only if the contract is still at the version the client
+        read (when it sent one), so concurrent edits are not silently lost.
+        A status change in an edit must be a valid workflow transition.
+
+        The instance is reloaded under the row lock, so the save writes the
+        edited fields over what is committed now rather than over the copy
+        get_object() read before the lock (e.g. undoing a concurrent approve).
+        """
+        contract = serializer.instance
+        contract.refresh_from_db(from_queryset=Contract.objects.select_for_update())
+        version, current_status = contract.version, contract.status
+        if expected_version is not None and expected_version != version:
+            raise ContractVersionConflict()
+
+        new_status = serializer.validated_data.get('status', current_status)
+        transition = None
+        if new_status != current_status:
+            transition = CONTRACT_WORKFLOW.transition_between(current_status, new_status)
+            if transition is None:
+                raise ValidationError({'status': f'A {current_status} contract cannot become {new_status}.'})
+
+        contract = serializer.save(version=version + 1)
+        if transition is not None:
+            workflow.record_transition(contract.pk, current_status, new_status, transition, self.request.user)
+
+    def transition_response(self, transition, message):
         contract = self.get_object()
-        if contract.status == 'draft':
-            contract.status = 'approved'
-            contract.save()
-            return Response({'status': 'Contract approved'})
+        if workflow.apply_transition(contract.pk, transition, self.request.user):
+            return Response({'status': message})
         return Response(
-            {'error': 'Contract cannot be approved'},
+            {'error': f'Contract cannot be {CONTRACT_WORKFLOW.get(transition).target}'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=True, methods=['post'])
+    def approve(self, request, pk=None):
+        """Approve a contract"""
+        return self.transition_response('approve', 'Contract approved')
+
     @action(detail=True, methods=['post'])
     def execute(self, request, pk=None):
         """Execute an approved contract"""
-        contract = self.get_object()
-        if contract.status == 'approved':
-            contract.status = 'executed'
-            contract.save()
-            return Response({'status': 'Contract executed'})
-        return Response(
-            {'error': 'Contract cannot be executed'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        return self.transition_response('execute', 'Contract executed')
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """Complete an executed contract"""
-        contract = self.get_object()
-        if contract.status == 'executed':
-            contract.status = 'completed'
-            contract.save()
-            return Response({'status': 'Contract completed'})
-        return Response(
-            {'error': 'Contract cannot be completed'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        return self.transition_response('complete', 'Contract completed')
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """Cancel a contract"""
+        return self.transition_response('cancel', 'Contract cancelled')
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Status history of a contract, newest first"""
         contract = self.get_object()
-        if contract.status in ['draft', 'approved']:
-            contract.status = 'cancelled'
-            contract.save()
-            return Response({'status': 'Contract cancelled'})
-        return Response(
-            {'error': 'Contract cannot be cancelled'},
-            status=status.HTTP_400_BAD_REQUEST
+        history = contract.status_history.select_related('changed_by')
+        return Response(ContractStatusHistorySerializer(history, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def status_as_of(self, request):
+        """Status of every contract at ?at=<ISO datetime or date>, plus counts"""
+        at = request.query_params.get('at')
+        when = parse_datetime(at) if at else None
+        if when is None and at:
+            day = parse_date(at)
+            if day is not None:
+                # A bare date means the end of that day
+                when = datetime.combine(day, time.max)
+        if when is None:
+            return Response(
+                {'error': 'at parameter must be an ISO date or datetime'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+
+        statuses = workflow.statuses_as_of(when).values('contract_id', 'to_status', 'changed_at')
+        page = self.paginate_queryset(statuses)
+        response = self.get_paginated_response([
+            {'contract': row['contract_id'], 'status': row['to_status'], 'since': row['changed_at']}
+            for row in page
+        ])
+        response.data['as_of'] = when
+        response.data['counts'] = workflow.status_counts_as_of(when)
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """
+        Apply one transition to many contracts in a single statement.
+        Contracts not in an allowed status, or no longer at the expected
+        version, are left untouched and reported in 'skipped'.
+        """
+        serializer = ContractBulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        transition = serializer.validated_data['transition']
+        updated, skipped = workflow.bulk_transition(
+            serializer.validated_data['ids'],
+            transition,
+            serializer.validated_data.get('versions'),
+            request.user
         )
 
+        # One audit entry for the whole batch instead of the middleware's generic one
+        AuditLog.objects.create(
+            user=request.user,
+            action='UPDATE',
+            model_name='Contract',
+            object_repr=f"Bulk {transition}: {len(updated)} contracts",
+            changes={
+                'transition': transition,
+                'status': CONTRACT_WORKFLOW.get(transition).target,
+                'updated_ids': updated,
+                'skipped_ids': [entry['id'] for entry in skipped],
+            },
+            ip_address=get_client_ip(request)
+        )
+        request._request.audit_logged = True
+
+        return Response({
+            'transition': transition,
+            'updated': updated,
+            'skipped': skipped,
+        })
+
+
+class CounterpartyPositionViewSet(viewsets.ReadOnlyModelViewSet):
+    """Open positions per counterparty, commodity and delivery month (see positions.py)"""
+    queryset = Counterparty_Position.objects.select_related('counterparty', 'commodity').only(
+        *[field.name for field in Counterparty_Position._meta.concrete_fields],
+        'counterparty__counterparty_name', 'commodity__commodity_name_short'
+    )
+    serializer_class = CounterpartyPositionSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'counterparty': ['exact', 'in'],
+        'commodity': ['exact', 'in'],
+        'commodity__commodity_subtype__commodity_type__commodity_group': ['exact'],
+        'delivery_month': ['exact', 'gte', 'lte'],
+    }
+    ordering_fields = ['delivery_month', 'net_quantity', 'net_value', 'contract_count']
+    ordering = ['counterparty', 'commodity', 'delivery_month']
+
+    @action(detail=False, methods=['get'])
+    def by_counterparty(self, request):
+        """Exposure per counterparty over the filtered positions, largest gross value first"""
+        totals = self.filter_queryset(self.get_queryset()).order_by().values(
+            'counterparty', counterparty_name=F('counterparty__counterparty_name')
+        ).annotate(
+            long_quantity=Sum('long_quantity'), short_quantity=Sum('short_quantity'),
+            net_quantity=Sum('net_quantity'), long_value=Sum('long_value'),
+            short_value=Sum('short_value'), net_value=Sum('net_value'),
+            gross_value=Sum('long_value') + Sum('short_value'),
+            contract_count=Sum('contract_count'),
+        ).order_by('-gross_value', 'counterparty')
+
+        page = self.paginate_queryset(totals)
+        serializer = CounterpartyExposureSerializer(page if page is not None else totals, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
 
 class TradeSettingViewSet(viewsets.ModelViewSet):
     queryset = Trade_Setting.objects.all()
@@ -327,12 +612,36 @@ class TradeSettingViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(active_settings, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """Typed values of the active settings as cached in this process"""
+        snapshot = trade_settings.get_snapshot()
+        return Response({
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
+            'settings': snapshot.as_dict(),
+        })
+
+    @retry_on_conflict(serializable=True)
+    def perform_create(self, serializer):
+        serializer.save()
+
+    @retry_on_conflict(serializable=True)
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @retry_on_conflict
+    def toggle_setting(self, pk):
+        """Flip is_active under a row lock so concurrent toggles are not lost"""
+        setting = Trade_Setting.objects.select_for_update().get(pk=pk)
+        setting.is_active = not setting.is_active
+        setting.save(update_fields=['is_active', 'updated_at'])
+        return setting
+
     @action(detail=True, methods=['post'])
     def toggle_active(self, request, pk=None):
         """Toggle the active status of a setting"""
-        setting = self.get_object()
-        setting.is_active = not setting.is_active
-        setting.save()
+        setting = self.toggle_setting(self.get_object().pk)
         return Response({
             'status': f'Setting {"activated" if setting.is_active else "deactivated"}',
             'is_active': setting.is_active
@@ -350,4 +659,10 @@ class TradeSettingViewSet(viewsets.ModelViewSet):
         
         settings = self.get_queryset().filter(setting_type=setting_type, is_active=True)
         serializer = self.get_serializer(settings, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Response cache hits and misses per endpoint across all workers (staff only)"""
+    return Response(hit_stats(caching.METRICS))
@@ -0,0 +1,221 @@
+"""
+Contract status workflow.
+
+TRANSITIONS declares, for each transition, the statuses it may start from
+and the status it leads to. CONTRACT_WORKFLOW checks them against
+Contract.STATUS_CHOICES once at import and validates transitions in memory;
+every applied transition is appended to contract_status_history, which
+also answers "what was each contract's status at time T".
+
+A bulk transition is a single statement: rows are only changed if they
+are still in an allowed status (and, optionally, still at the version the
+client last read), so a contract that another request moved first is
+reported as skipped instead of being overwritten.
+"""
+
+from typing import NamedTuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Contract, Contract_Status_History
+from .caching import invalidate_on_commit
+from .positions import OPEN_STATUSES, refresh_contracts
+from .transactions import retry_on_conflict
+
+TRANSITIONS = {
+    'approve': (('draft',), 'approved'),
+    'execute': (('approved',), 'executed'),
+    'complete': (('executed',), 'completed'),
+    'cancel': (('draft', 'approved'), 'cancelled'),
+}
+
+
+class InvalidTransition(Exception):
+    """Raised when a transition does not apply to a contract's status"""
+
+
+class Transition(NamedTuple):
+    name: str
+    sources: frozenset
+    target: str
+
+
+class StateMachine:
+    """In-memory view of a declarative transition table"""
+
+    def __init__(self, status_choices, transitions):
+        self.statuses = {value for value, _ in status_choices}
+        self.transitions = {}
+        self.edges = {}
+        for name, (sources, target) in transitions.items():
+            unknown = (set(sources) | {target}) - self.statuses
+            if unknown:
+                raise ImproperlyConfigured(f"Transition '{name}' uses unknown statuses {sorted(unknown)}")
+            self.transitions[name] = Transition(name, frozenset(sources), target)
+            for source in sources:
+                self.edges[(source, target)] = name
+
+    def get(self, name):
+        try:
+            return self.transitions[name]
+        except KeyError:
+            raise InvalidTransition(f"Unknown transition '{name}'")
+
+    def check(self, status, name):
+        """Return the target status of name from status, or raise InvalidTransition"""
+        transition = self.get(name)
+        if status not in transition.sources:
+            raise InvalidTransition(f"Cannot {name} a contract that is {status}")
+        return transition.target
+
+    def allowed(self, status):
+        """Names of the transitions available from status"""
+        return [name for name, transition in self.transitions.items() if status in transition.sources]
+
+    def transition_between(self, from_status, to_status):
+        """Name of the transition from one status to another, or None"""
+        return self.edges.get((from_status, to_status))
+
+
+CONTRACT_WORKFLOW = StateMachine(Contract.STATUS_CHOICES, TRANSITIONS)
+
+
+def record_transition(contract_id, from_status, to_status, transition, user=None, using=DEFAULT_DB_ALIAS):
+    return Contract_Status_History.objects.using(using).create(
+        contract_id=contract_id,
+        from_status=from_status,
+        to_status=to_status,
+        transition=transition,
+        changed_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+@retry_on_conflict
+def apply_transition(pk, transition, user=None):
+    """
+    Move a contract between statuses under a row lock, so concurrent
+    transitions of the same contract cannot both succeed. Returns False
+    when the transition does not apply to the contract's current status.
+    """
+    contract = Contract.objects.select_for_update().get(pk=pk)
+    try:
+        to_status = CONTRACT_WORKFLOW.check(contract.status, transition)
+    except InvalidTransition:
+        return False
+
+    from_status = contract.status
+    contract.status = to_status
+    contract.version += 1
+    contract.save(update_fields=['status', 'version', 'updated_at'])
+    record_transition(contract.pk, from_status, to_status, transition, user)
+    return True
+
+
+# Lock the eligible rows first so the previous status is known, then move
+# them and append their history in the same statement. A NULL expected
+# version means the client did not ask for a version check.
+BULK_TRANSITION_SQL = f"""
+    WITH eligible AS (
+        SELECT c.id, c.status
+          FROM {Contract._meta.db_table} AS c
+          JOIN unnest(%(ids)s::bigint[], %(versions)s::integer[]) AS expected(id, version)
+            ON c.id = expected.id
+         WHERE c.status = ANY(%(sources)s)
+           AND (expected.version IS NULL OR c.version = expected.version)
+           FOR UPDATE OF c
+    ), moved AS (
+        UPDATE {Contract._meta.db_table} AS c
+           SET status = %(target)s, version = c.version + 1, updated_at = %(now)s
+          FROM eligible
+         WHERE c.id = eligible.id
+     RETURNING c.id, eligible.status AS from_status
+    )
+    INSERT INTO {Contract_Status_History._meta.db_table}
+           (contract_id, from_status, to_status, transition, changed_by_id, changed_at)
+    SELECT id, from_status, %(target)s, %(transition)s, %(user_id)s, %(now)s FROM moved
+    RETURNING contract_id
+"""
+
+
+def skip_reasons(ids, transition, using=DEFAULT_DB_ALIAS):
+    """Explain why each of ids was left untouched by a bulk transition"""
+    sources = CONTRACT_WORKFLOW.get(transition).sources
+    current = {
+        pk: (status, version)
+        for pk, status, version in Contract.objects.using(using).filter(
+            pk__in=ids
+        ).values_list('pk', 'status', 'version')
+    }
+
+    skipped = []
+    for pk in ids:
+        if pk not in current:
+            reason = 'not_found'
+        elif current[pk][0] not in sources:
+            reason = 'invalid_status'
+        else:
+            reason = 'version_conflict'
+        entry = {'id': pk, 'reason': reason}
+        if pk in current:
+            entry['status'], entry['version'] = current[pk]
+        skipped.append(entry)
+    return skipped
+
+
+@retry_on_conflict
+def bulk_transition(ids, transition, versions=None, user=None, using=DEFAULT_DB_ALIAS):
+    """
+    Apply transition to every contract in ids with one statement.
+
+    versions optionally maps contract id to the version the client expects.
+    Returns (updated_ids, skipped) where skipped lists {'id', 'reason', ...}.
+    """
+    spec = CONTRACT_WORKFLOW.get(transition)
+    ids = list(dict.fromkeys(ids))
+    versions = versions or {}
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(BULK_TRANSITION_SQL, {
+            'ids': ids,
+            'versions': [versions.get(pk) for pk in ids],
+            'sources': sorted(spec.sources),
+            'target': spec.target,
+            'transition': transition,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'now': timezone.now(),
+        })
+        updated = {row[0] for row in cursor.fetchall()}
+
+    updated_ids = [pk for pk in ids if pk in updated]
+    skipped_ids = [pk for pk in ids if pk not in updated]
+    # The statement bypasses model signals; refresh positions when the move
+    # can open or close them (execute keeps contracts open, for instance)
+    if updated_ids and len({status in OPEN_STATUSES for status in spec.sources | {spec.target}}) > 1:
+        refresh_contracts(Contract.objects.filter(pk__in=updated_ids), using)
+    if updated_ids:
+        invalidate_on_commit(['contract', *(f'contract:{pk}' for pk in updated_ids)], using)
+    skipped = skip_reasons(skipped_ids, transition, using) if skipped_ids else []
+    return updated_ids, skipped
+
+
+def statuses_as_of(when, using=DEFAULT_DB_ALIAS):
+    """
+    The latest history row per contract at or before when, i.e. each
+    contract's status at that time. DISTINCT ON walks status_history_as_of_idx.
+    """
+    return Contract_Status_History.objects.using(using).filter(
+        changed_at__lte=when
+    ).order_by('contract_id', '-changed_at', '-id').distinct('contract_id')
+
+
+def status_counts_as_of(when, using=DEFAULT_DB_ALIAS):
+    """Number of contracts in each status at time when"""
+    latest = statuses_as_of(when, using).values('pk')
+    return dict(
+        Contract_Status_History.objects.using(using).filter(
+            pk__in=latest
+        ).order_by().values_list('to_status').annotate(count=Count('id'))
+    )
@@ -0,0 +1,23 @@
+"""
+Database connection pool helpers for NextCRM.
+"""
+
+from django.db import connections
+
+
+def get_pool_stats(alias='default'):
+    """
+    Return psycopg pool counters for a database alias, or None when the
+    alias is not pooled. ``saturation`` is the share of max_size currently
+    checked out; ``requests_waiting`` > 0 means requests are queueing.
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    pool_size = stats.get('pool_size', 0)
+    in_use = pool_size - stats.get('pool_available', 0)
+    stats['connections_in_use'] = in_use
+    stats['saturation'] = round(in_use / pool.max_size, 3) if pool.max_size else 0.0
+    return stats
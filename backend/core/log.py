@@ -0,0 +1,270 @@
+"""
+Non-blocking structured logging.
+
+Loggers write to one QueueHandler per process: the calling thread only
+formats the message and puts the record on a bounded queue, and a
+QueueListener thread hands it to the real handlers (the log file and the
+console), so a slow disk or terminal never stalls a request. When
+the listener falls behind and the queue is full (LOG_QUEUE_SIZE), records
+are dropped and counted rather than blocking. Queued records are written
+out at exit; a forked worker starts its own listener on its first record.
+
+RequestLogMiddleware gives every request an id (a valid incoming
+X-Request-ID, or a new one), returned in the X-Request-ID header and
+attached to every record logged while the request is handled, and logs
+one ``core.requests`` record per request with its status and duration.
+JsonFormatter renders records as one JSON object per line, with the
+request id and any ``extra=`` fields.
+
+InfoSampler keeps LOG_INFO_SAMPLE_RATE of the INFO and DEBUG records
+(every WARNING and above); the decision is made per request id, so a
+sampled request keeps all of its records, which carry ``sample_rate``.
+
+    python manage.py benchmark_logging
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import orjson
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject, empty
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+request_id_var = ContextVar('request_id', default=None)
+
+# LogRecord attributes; anything else on a record came from extra=
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'sample_rate',
+}
+
+request_logger = logging.getLogger('core.requests')
+
+
+def get_handler(name):
+    """The configured handler called name (logging.getHandlerByName() on Python 3.12+)"""
+    if hasattr(logging, 'getHandlerByName'):
+        return logging.getHandlerByName(name)
+    return logging._handlers.get(name)
+
+
+class RequestContextFilter(logging.Filter):
+    """Set record.request_id to the id of the request being handled (None outside requests)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class InfoSampler(logging.Filter):
+    """Keep rate of the records below WARNING, all records of a request alike"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+        self.threshold = int(rate * 0xFFFFFFFF)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id is None:
+            keep = random.random() < self.rate
+        else:
+            keep = zlib.crc32(request_id.encode('ascii')) <= self.threshold
+        if keep:
+            record.sample_rate = self.rate
+        return keep
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'process': record.process,
+            'thread': record.threadName,
+            'location': f'{record.module}:{record.lineno}',
+        }
+        if hasattr(record, 'sample_rate'):
+            entry['sample_rate'] = record.sample_rate
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode('utf-8')
+
+
+class Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing when the queue is full at exit
+        self.queue.put(self._sentinel)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a listener thread writing them to the handlers named
+    in handlers. The listener is started by the first record of each
+    process, once logging is configured and the handlers exist.
+
+    Configure it with '()' rather than 'class': dictConfig on Python 3.12+
+    builds its own queue and listener for QueueHandler classes.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(None)
+        self.handler_names = handlers
+        self.queue_size = queue_size
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+        atexit.register(self.stop)
+
+    def start(self):
+        handlers = [get_handler(name) for name in self.handler_names]
+        missing = [name for name, handler in zip(self.handler_names, handlers) if handler is None]
+        if missing:
+            raise ValueError(f'Unknown logging handlers: {", ".join(missing)}')
+        # Records none of the handlers would write are not queued at all
+        self.setLevel(max(self.level, min(handler.level for handler in handlers)))
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = Listener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self.pid = os.getpid()
+        self.dropped = 0
+
+    def stop(self):
+        """Write out every queued record and stop the listener thread"""
+        with self.lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def emit(self, record):
+        # Called under self.lock (Handler.handle), which logging reinitializes after fork
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def prepare(self, record):
+        """
+        Copy of record with the message merged and the traceback rendered, so
+        no arguments or frames are shared with the listener thread
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                # Logging it would need the full queue
+                sys.stderr.write(f'Log queue full, {self.dropped} records dropped so far\n')
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def get_request_id(request):
+    """The client's X-Request-ID when it is a plausible id, else a new one"""
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if VALID_REQUEST_ID.match(request_id):
+        return request_id
+    return uuid.uuid4().hex
+
+
+def get_user_id(request):
+    """The id of the user the request authenticated, without loading one that was not"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+class RequestLogMiddleware:
+    """Tag log records with a request id and log each request's status and duration"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = self.start_request(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self.finish_request(request, response, started)
+        finally:
+            request_id_var.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        token = self.start_request(request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self.finish_request(request, response, started)
+        finally:
+            request_id_var.reset(token)
+        return response
+
+    def start_request(self, request):
+        request.request_id = get_request_id(request)
+        return request_id_var.set(request.request_id)
+
+    def finish_request(self, request, response, started):
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        response[REQUEST_ID_HEADER] = request.request_id
+        if request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(
+                '%s %s %s %.1fms', request.method, request.path, response.status_code, duration_ms,
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status_code': response.status_code,
+                    'duration_ms': duration_ms,
+                    'user_id': get_user_id(request),
+                },
+            )
@@ -0,0 +1,185 @@
+"""
+Pre-rendered OpenAPI schema.
+
+drf-spectacular builds the schema by introspecting every view and
+serializer, which takes seconds. Here it is generated once per code
+version, rendered to JSON and YAML, compressed in every coding the
+response cache supports (core.response_cache.encode_variants), and
+written to OPENAPI_SCHEMA_DIR as ``openapi-<version>.<format>[.<coding>]``.
+/api/schema/ then serves those bytes from memory like a static file, with
+an ETag so Swagger UI and ReDoc revalidate instead of downloading again.
+
+The code version is CODE_VERSION when set (e.g. the image's git SHA),
+otherwise a digest of the project's Python sources, the installed
+Django/DRF/drf-spectacular versions and SPECTACULAR_SETTINGS, so a deploy
+or a code change gets a fresh schema. Build steps run
+``python manage.py generate_openapi_schema``; a process that finds no
+file for its version generates it on the first request.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from importlib import metadata
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from .response_cache import IDENTITY, encode_variants, negotiate
+
+# format -> (media type, file extension)
+FORMATS = {
+    'yaml': ('application/vnd.oai.openapi', 'yaml'),
+    'json': ('application/vnd.oai.openapi+json', 'json'),
+}
+# ?format= values drf-spectacular accepts
+FORMAT_ALIASES = {'yaml': 'yaml', 'openapi': 'yaml', 'json': 'json', 'openapi-json': 'json'}
+CODING_SUFFIXES = {'gzip': '.gz', 'br': '.br', 'zstd': '.zst'}
+PACKAGES = ['Django', 'djangorestframework', 'drf-spectacular']
+SOURCE_DIRS = ['apps', 'core']
+
+_version = None
+# (version, format, coding) -> (content coding, bytes)
+_loaded = {}
+_generate_lock = threading.Lock()
+
+
+def code_version():
+    """CODE_VERSION, or a digest of everything the schema is generated from; computed once per process"""
+    global _version
+    if _version is None:
+        _version = settings.CODE_VERSION or source_digest()
+    return _version
+
+
+def source_digest():
+    digest = hashlib.sha1()
+    for directory in SOURCE_DIRS:
+        for path in sorted((Path(settings.BASE_DIR) / directory).rglob('*.py')):
+            digest.update(str(path.relative_to(settings.BASE_DIR)).encode('utf-8'))
+            digest.update(path.read_bytes())
+    for package in PACKAGES:
+        try:
+            digest.update(f'{package}=={metadata.version(package)}'.encode('utf-8'))
+        except metadata.PackageNotFoundError:
+            pass
+    digest.update(repr(sorted(settings.SPECTACULAR_SETTINGS.items())).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def schema_path(version, fmt, coding=IDENTITY):
+    suffix = '' if coding == IDENTITY else CODING_SUFFIXES[coding]
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f'openapi-{version}.{FORMATS[fmt][1]}{suffix}'
+
+
+def render_schema():
+    """{format: bytes} of the full schema, as SpectacularAPIView would serve it"""
+    # Imported here so that serving the stored files does not load the generator
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+    return {
+        'yaml': OpenApiYamlRenderer().render(schema, renderer_context={}),
+        'json': OpenApiJsonRenderer().render(schema, renderer_context={}),
+    }
+
+
+def write_atomic(path, data):
+    """Write via a temporary file and rename, so readers never see a partial schema"""
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def generate(version=None):
+    """Render and write every format and coding for version; returns {path: size}"""
+    version = version or code_version()
+    Path(settings.OPENAPI_SCHEMA_DIR).mkdir(parents=True, exist_ok=True)
+    written = {}
+    for fmt, body in render_schema().items():
+        for coding, (content_coding, data) in encode_variants(body).items():
+            # Codings that did not shrink the schema fall back to the identity file
+            if content_coding == coding:
+                path = schema_path(version, fmt, coding)
+                write_atomic(path, data)
+                written[path] = len(data)
+    _loaded.clear()
+    return written
+
+
+def prune(version=None):
+    """Delete the schema files of every other version; returns the paths removed"""
+    version = version or code_version()
+    current = f'openapi-{version}.'
+    removed = []
+    for path in Path(settings.OPENAPI_SCHEMA_DIR).glob('openapi-*'):
+        if not path.name.startswith(current):
+            path.unlink()
+            removed.append(path)
+    return removed
+
+
+def read(version, fmt, coding):
+    """(content coding, bytes) of a stored variant, or None"""
+    path = schema_path(version, fmt, coding)
+    try:
+        return coding, path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def load(fmt, coding):
+    """
+    (content coding, bytes) of the schema in fmt for the preferred coding,
+    reading the file once per process and generating the files when they
+    do not exist for the current version
+    """
+    version = code_version()
+    key = (version, fmt, coding)
+    if key not in _loaded:
+        variant = read(version, fmt, coding) or read(version, fmt, IDENTITY)
+        if variant is None:
+            with _generate_lock:
+                if read(version, fmt, IDENTITY) is None:
+                    generate(version)
+            variant = read(version, fmt, coding) or read(version, fmt, IDENTITY)
+        _loaded[key] = variant
+    return _loaded[key]
+
+
+def requested_format(request):
+    """?format=, else JSON when the client accepts it and YAML (drf-spectacular's default) otherwise"""
+    fmt = FORMAT_ALIASES.get(request.GET.get('format', ''))
+    if fmt is not None:
+        return fmt
+    return 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+
+
+@require_safe
+def schema_view(request):
+    """The pre-rendered OpenAPI schema, in place of SpectacularAPIView"""
+    fmt = requested_format(request)
+    content_coding, body = load(fmt, negotiate(request))
+    etag = f'"{code_version()}-{fmt}-{content_coding}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=FORMATS[fmt][0])
+        response['Content-Disposition'] = f'inline; filename="{settings.SPECTACULAR_SETTINGS["TITLE"]}.{fmt}"'
+        if content_coding != IDENTITY:
+            response['Content-Encoding'] = content_coding
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
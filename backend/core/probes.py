@@ -0,0 +1,211 @@
+"""
+Fast path for load balancer probes and static/docs assets.
+
+ProbeMiddleware sits near the top of MIDDLEWARE and answers these GET/HEAD
+requests itself, so they skip sessions, CSRF, authentication, the Redis rate
+limiter and security/audit logging:
+
+- liveness probes (``/ping/``, ``/api/auth/ping/``, ``/api/auth/health/``)
+  are answered without resolving a URL or touching Redis or the database
+- static, media and API docs requests are dispatched straight to their
+  view
+- the readiness probe (``/api/auth/ready/``) times a query on every
+  database and a round trip to the cache, and answers 503 when the
+  primary or the cache fails or is slower than READINESS_MAX_LATENCY_MS.
+  Results are kept in the process for READINESS_CACHE_TIMEOUT seconds and
+  refreshed by one request at a time, so frequent probes cost a dict
+  lookup and do not pile onto a struggling database.
+"""
+
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+from django.urls import resolve
+from django.utils import timezone
+
+from .routers import measure_replica_lag
+
+SAFE_METHODS = ('GET', 'HEAD')
+READY_PATH = '/api/auth/ready/'
+READY_CACHE_KEY = 'probe:ready'
+DOCS_PREFIXES = ('/api/docs/', '/api/redoc/', '/api/schema/')
+
+
+def ping_payload(request):
+    return {
+        'status': 'ok',
+        'message': 'NextCRM Backend is running',
+        'version': '1.0.0'
+    }
+
+
+def auth_ping_payload(request):
+    return {
+        'message': 'pong',
+        'timestamp': timezone.now().isoformat(),
+        'server': 'Django Backend',
+        'origin': request.META.get('HTTP_ORIGIN', 'unknown'),
+        'host': request.META.get('HTTP_HOST', 'unknown'),
+        'remote_addr': request.META.get('REMOTE_ADDR', 'unknown'),
+        'user_agent': request.META.get('HTTP_USER_AGENT', 'unknown')[:100]
+    }
+
+
+def health_payload(request):
+    return {
+        'status': 'healthy',
+        'timestamp': timezone.now().isoformat(),
+        'cors_origin': request.META.get('HTTP_ORIGIN', 'no-origin'),
+        'user_agent': request.META.get('HTTP_USER_AGENT', 'no-user-agent')[:100]
+    }
+
+
+LIVENESS_PROBES = {
+    '/ping/': ping_payload,
+    '/api/auth/ping/': auth_ping_payload,
+    '/api/auth/health/': health_payload,
+}
+
+
+def timed_check(check):
+    """{'ok', 'latency_ms'[, 'error']} of running check()"""
+    started = time.perf_counter()
+    try:
+        result = check()
+    except Exception as exc:
+        return {
+            'ok': False,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+            'error': exc.__class__.__name__,
+        }
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    checked = {'ok': latency_ms <= settings.READINESS_MAX_LATENCY_MS, 'latency_ms': latency_ms}
+    if result is not None:
+        checked.update(result)
+    return checked
+
+
+def check_database(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_replica(alias):
+    return {'lag_seconds': round(measure_replica_lag(alias), 3)}
+
+
+def check_cache():
+    cache.set(READY_CACHE_KEY, 1, 60)
+    if cache.get(READY_CACHE_KEY) != 1:
+        raise RuntimeError('cache did not return the value just set')
+
+
+def run_readiness_checks():
+    """
+    Check every dependency. Only the primary database and the cache decide
+    readiness: reads fall back to the primary when a replica is down.
+    """
+    checks = {'database:default': timed_check(lambda: check_database(DEFAULT_DB_ALIAS))}
+    for alias in settings.DATABASE_REPLICAS:
+        checks[f'database:{alias}'] = timed_check(lambda alias=alias: check_replica(alias))
+    checks['cache'] = timed_check(check_cache)
+    return {
+        'ready': checks['database:default']['ok'] and checks['cache']['ok'],
+        'checked_at': timezone.now().isoformat(),
+        'checks': checks,
+    }
+
+
+# (monotonic time, result) of the last readiness check in this process
+_readiness = None
+_readiness_lock = threading.Lock()
+
+
+def fresh_readiness():
+    """The last readiness result if it is younger than READINESS_CACHE_TIMEOUT, else None"""
+    cached = _readiness
+    if cached is not None and time.monotonic() - cached[0] < settings.READINESS_CACHE_TIMEOUT:
+        return cached[1]
+    return None
+
+
+def readiness():
+    """
+    The cached readiness result, refreshed when it is stale. While one
+    request refreshes it, the others serve the previous result instead of
+    queueing behind the checks.
+    """
+    global _readiness
+    result = fresh_readiness()
+    if result is not None:
+        return result
+    cached = _readiness
+    if not _readiness_lock.acquire(blocking=cached is None):
+        return cached[1]
+    try:
+        if _readiness is not cached:
+            # Refreshed while this request waited for the lock
+            return _readiness[1]
+        result = run_readiness_checks()
+        _readiness = (time.monotonic(), result)
+        return result
+    finally:
+        _readiness_lock.release()
+
+
+def readiness_response(result):
+    return JsonResponse(result, status=200 if result['ready'] else 503)
+
+
+class ProbeMiddleware:
+    """Answer probes and dispatch static/docs assets ahead of the rest of MIDDLEWARE"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.asset_prefixes = tuple(
+            prefix for prefix in (settings.STATIC_URL, settings.MEDIA_URL, *DOCS_PREFIXES)
+            if prefix and prefix.startswith('/')
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        path = request.path_info
+        if request.method not in SAFE_METHODS:
+            return self.get_response(request)
+        if path in LIVENESS_PROBES:
+            return JsonResponse(LIVENESS_PROBES[path](request))
+        if path == READY_PATH:
+            return readiness_response(readiness())
+        if path.startswith(self.asset_prefixes):
+            match = request.resolver_match = resolve(path)
+            return match.func(request, *match.args, **match.kwargs)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        path = request.path_info
+        if request.method not in SAFE_METHODS:
+            return await self.get_response(request)
+        if path in LIVENESS_PROBES:
+            return JsonResponse(LIVENESS_PROBES[path](request))
+        if path == READY_PATH:
+            # Only a stale result needs a thread for the (blocking) checks
+            result = fresh_readiness() or await sync_to_async(readiness)()
+            return readiness_response(result)
+        if path.startswith(self.asset_prefixes):
+            match = request.resolver_match = resolve(path)
+            if iscoroutinefunction(match.func):
+                return await match.func(request, *match.args, **match.kwargs)
+            return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+        return await self.get_response(request)
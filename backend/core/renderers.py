@@ -0,0 +1,83 @@
+"""
+orjson-backed JSON renderer and parser for the API.
+
+Drop-in replacements for DRF's JSONRenderer/JSONParser: orjson encodes
+dicts, lists, strings, numbers, dates, datetimes, UUIDs and NumPy values
+natively in C, and only calls back into Python for the rest (Decimal,
+lazy translation strings, querysets, ...), which falls through to DRF's
+own encoder so the output matches the stock renderer.
+
+Decimals follow DRF's COERCE_DECIMAL_TO_STRING: strings by default, or
+exact JSON numbers (the Decimal's digits, not a float approximation)
+when it is False.
+"""
+
+from decimal import Decimal
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+_fallback = JSONEncoder()
+
+
+def encode_default(obj):
+    """Types orjson does not handle itself"""
+    if isinstance(obj, Decimal):
+        if api_settings.COERCE_DECIMAL_TO_STRING:
+            return str(obj)
+        return orjson.Fragment(str(obj)) if obj.is_finite() else None
+    return _fallback.default(obj)
+
+
+def dumps(data, indent=False):
+    return orjson.dumps(data, default=encode_default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+
+def stream_array(items, chunk_size=1000):
+    """
+    Yield a JSON array of items in chunks of chunk_size elements, so large
+    lists are encoded and sent without holding the whole document.
+    """
+    yield b'['
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield (b'' if first else b',') + dumps(chunk)[1:-1]
+            chunk = []
+            first = False
+    if chunk:
+        yield (b'' if first else b',') + dumps(chunk)[1:-1]
+    yield b']'
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson; ``; indent=N`` in Accept gives 2-space indentation"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=bool(indent))
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser decoding with orjson"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, orjson.JSONDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,350 @@
+"""
+Response cache holding each payload pre-rendered and pre-compressed.
+
+A cache fill renders the JSON body once and compresses it once per
+content coding in RESPONSE_CACHE_ENCODINGS (br, zstd, gzip; codings whose
+library is not installed are skipped). Each variant is stored under its
+own key, so a hit reads only the bytes the client's Accept-Encoding
+selects and costs neither serialization nor compression. nginx passes
+encoded responses through without recompressing them.
+
+Bodies below RESPONSE_CACHE_MIN_COMPRESS_SIZE (or that do not shrink) are
+stored uncompressed under every coding's key.
+
+Entries can declare cache tags (e.g. ``contract``, ``counterparty:7``,
+``refdata:currency``). Each tag has a version token in the cache and an
+entry records a digest of its tags' tokens, so invalidate(tags) replaces
+a few tokens and every entry built under the old ones reads as stale - no
+key scans, whatever the number of entries.
+
+Fills are coalesced: an entry that is missing, expired or invalidated is
+rebuilt by the one request that takes its fill lock (a cache.add, i.e.
+Redis SET NX with a timeout). Concurrent requests meanwhile serve the
+stale entry, kept for RESPONSE_CACHE_STALE_TIMEOUT seconds past expiry,
+or wait for the fill when there is none. Before expiry, a request may
+refresh early with a probability that rises as expiry nears and with the
+entry's build cost (XFetch, scaled by RESPONSE_CACHE_EARLY_REFRESH_BETA),
+so hot entries are usually rebuilt before anyone sees them expire.
+
+Hits and misses are counted per metric name in the cache so every worker
+adds to the same totals.
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import random
+import secrets
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from rest_framework.response import Response
+
+from .renderers import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_PREFIX = 'response:'
+TAG_PREFIX = 'response:tag:'
+METRICS_PREFIX = 'response:metrics:'
+PERMISSIONS_PREFIX = 'response:permissions:'
+LOCK_PREFIX = 'response:lock:'
+IDENTITY = 'identity'
+
+# Entries are compressed once and served many times, so favour ratio over speed
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=9, mtime=0)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=9)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda body: zstandard.ZstdCompressor(level=12).compress(body)
+
+
+def enabled_codings():
+    """Configured codings that can be produced here, in preference order"""
+    return [coding for coding in settings.RESPONSE_CACHE_ENCODINGS if coding in COMPRESSORS]
+
+
+def accepted_codings(header):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(request, codings=None):
+    """The preferred coding the client accepts, or identity"""
+    accepted = accepted_codings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    best, best_quality = IDENTITY, 0.0
+    for coding in enabled_codings() if codings is None else codings:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def increment(key):
+    """Increment a counter that never expires, creating it at 1"""
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def new_tag_token():
+    return secrets.token_hex(6)
+
+
+def tag_versions(tags):
+    """
+    The current token of each tag. A tag without one (never invalidated, or
+    evicted) gets a fresh token, so entries stored under a lost token can
+    not come back.
+    """
+    keys = [f'{TAG_PREFIX}{tag}' for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_tag_token(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, '') for key in keys]
+
+
+def invalidate(tags):
+    """Retire every entry that declared any of tags, in one cache round trip"""
+    if tags:
+        cache.set_many({f'{TAG_PREFIX}{tag}': new_tag_token() for tag in set(tags)}, None)
+
+
+def tag_digest(tags):
+    """Digest of the current tokens of tags; changes when any of them is invalidated"""
+    if not tags:
+        return ''
+    tags = sorted(set(tags))
+    return hashlib.sha1(':'.join(tag_versions(tags)).encode('utf-8')).hexdigest()[:16]
+
+
+def count(metric, outcome):
+    increment(f'{METRICS_PREFIX}{metric}:{outcome}')
+
+
+def hit_stats(metrics):
+    """
+    {metric: {'hits', 'stale_hits', 'misses', 'hit_ratio'}} across all
+    workers; stale hits were served while another request refilled the entry
+    """
+    outcomes = ('hits', 'stale_hits', 'misses')
+    counters = cache.get_many([
+        f'{METRICS_PREFIX}{metric}:{outcome}' for metric in metrics for outcome in outcomes
+    ])
+    stats = {}
+    for metric in metrics:
+        stats[metric] = {
+            outcome: counters.get(f'{METRICS_PREFIX}{metric}:{outcome}', 0) for outcome in outcomes
+        }
+        served = stats[metric]['hits'] + stats[metric]['stale_hits']
+        total = served + stats[metric]['misses']
+        stats[metric]['hit_ratio'] = round(served / total, 3) if total else 0.0
+    return stats
+
+
+def permission_fingerprint(user):
+    """
+    Short hash of what the user may do (superuser/staff flags and every
+    permission), cached for RESPONSE_CACHE_PERMISSIONS_TIMEOUT seconds
+    """
+    key = f'{PERMISSIONS_PREFIX}{user.pk}'
+    fingerprint = cache.get(key)
+    if fingerprint is None:
+        permissions = [user.is_superuser, user.is_staff, sorted(user.get_all_permissions())]
+        fingerprint = hashlib.sha1(json.dumps(permissions).encode('utf-8')).hexdigest()[:16]
+        cache.set(key, fingerprint, settings.RESPONSE_CACHE_PERMISSIONS_TIMEOUT)
+    return fingerprint
+
+
+def query_hash(request):
+    """Hash of the request's host, path and query parameters, independent of parameter order"""
+    params = sorted((name, sorted(values)) for name, values in request.GET.lists())
+    normalized = [request.scheme, request.get_host(), request.path, params]
+    return hashlib.sha1(json.dumps(normalized).encode('utf-8')).hexdigest()
+
+
+def variant_key(key, coding):
+    return f'{CACHE_PREFIX}{key}:{coding}'
+
+
+class Entry(NamedTuple):
+    content_coding: str
+    body: bytes
+    digest: str  # tag_digest() of the entry's tags when it was built
+    fresh_until: float  # time.time() after which the entry is stale
+    cost: float  # seconds the build took
+
+
+def encode_variants(body):
+    """{coding: (content coding sent, bytes)} for identity and every enabled coding"""
+    variants = {IDENTITY: (IDENTITY, body)}
+    for coding in enabled_codings():
+        compressed = None
+        if len(body) >= settings.RESPONSE_CACHE_MIN_COMPRESS_SIZE:
+            compressed = COMPRESSORS[coding](body)
+        if compressed is not None and len(compressed) < len(body):
+            variants[coding] = (coding, compressed)
+        else:
+            variants[coding] = (IDENTITY, body)
+    return variants
+
+
+def store(key, data, timeout, digest='', cost=0.0):
+    """
+    Render data and store every variant under key, fresh for timeout
+    seconds and kept RESPONSE_CACHE_STALE_TIMEOUT seconds longer to be
+    served stale; returns the entries by coding
+    """
+    fresh_until = time.time() + timeout
+    entries = {
+        coding: Entry(content_coding, body, digest, fresh_until, cost)
+        for coding, (content_coding, body) in encode_variants(dumps(data)).items()
+    }
+    cache.set_many(
+        {variant_key(key, coding): entry for coding, entry in entries.items()},
+        timeout + settings.RESPONSE_CACHE_STALE_TIMEOUT,
+    )
+    return entries
+
+
+def fetch(key, coding):
+    """The stored Entry for coding, or None"""
+    return cache.get(variant_key(key, coding))
+
+
+def is_stale(entry, digest):
+    return entry.digest != digest or time.time() >= entry.fresh_until
+
+
+def refresh_early(entry):
+    """
+    XFetch: true with a probability that grows as fresh_until nears, sooner
+    for entries that are expensive to build
+    """
+    beta = settings.RESPONSE_CACHE_EARLY_REFRESH_BETA
+    if not beta or not entry.cost:
+        return False
+    return time.time() - entry.cost * beta * math.log(1.0 - random.random()) >= entry.fresh_until
+
+
+def acquire_fill_lock(key):
+    """A token when this request may rebuild key, or None while another one does"""
+    token = secrets.token_hex(8)
+    if cache.add(f'{LOCK_PREFIX}{key}', token, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_fill_lock(key, token):
+    # Leave a lock that timed out and was taken by another request alone
+    if cache.get(f'{LOCK_PREFIX}{key}') == token:
+        cache.delete(f'{LOCK_PREFIX}{key}')
+
+
+def wait_for_fill(key, coding, digest):
+    """Poll for the entry another request is building, up to RESPONSE_CACHE_LOCK_WAIT seconds"""
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = fetch(key, coding)
+        if entry is not None and not is_stale(entry, digest):
+            return entry
+    return None
+
+
+def delete(key):
+    cache.delete_many([variant_key(key, coding) for coding in [IDENTITY, *COMPRESSORS]])
+
+
+class EncodedResponse(Response):
+    """
+    DRF Response whose body is an already rendered, possibly compressed
+    payload. ``data`` is set only when the payload was built by this request.
+    """
+
+    def __init__(self, content_coding, body, data=None, **kwargs):
+        super().__init__(data, **kwargs)
+        self.body = body
+        self['Content-Type'] = 'application/json'
+        if content_coding != IDENTITY:
+            self['Content-Encoding'] = content_coding
+        patch_vary_headers(self, ['Accept-Encoding'])
+
+    @property
+    def rendered_content(self):
+        return self.body
+
+
+def record(metric, outcome):
+    if metric is not None:
+        count(metric, outcome)
+
+
+def cached_response(request, key, build, timeout, metric=None, tags=()):
+    """
+    Serve key's cached variant for the request's Accept-Encoding, or call
+    build() for the data, cache it in every coding and serve that. The
+    entry goes stale after timeout seconds or when any of tags is
+    invalidated, and only one request at a time rebuilds it. With a metric
+    name, the outcome is counted under it.
+    """
+    digest = tag_digest(tags)
+    coding = negotiate(request)
+    entry = fetch(key, coding)
+    stale = entry is None or is_stale(entry, digest)
+    if not stale and not refresh_early(entry):
+        record(metric, 'hits')
+        return EncodedResponse(entry.content_coding, entry.body)
+
+    token = acquire_fill_lock(key)
+    if token is None:
+        if entry is not None:
+            # Another request is rebuilding it; serve what there is meanwhile
+            record(metric, 'stale_hits' if stale else 'hits')
+            return EncodedResponse(entry.content_coding, entry.body)
+        entry = wait_for_fill(key, coding, digest)
+        if entry is not None:
+            record(metric, 'hits')
+            return EncodedResponse(entry.content_coding, entry.body)
+        # The fill is taking too long; build without the lock rather than fail
+
+    try:
+        started = time.perf_counter()
+        data = build()
+        entries = store(key, data, timeout, digest, time.perf_counter() - started)
+    finally:
+        if token is not None:
+            release_fill_lock(key, token)
+    record(metric, 'misses')
+    entry = entries[coding]
+    return EncodedResponse(entry.content_coding, entry.body, data=data)
@@ -0,0 +1,173 @@
+"""
+Primary/replica database routing for NextCRM.
+
+Reads are sent to a replica only when the current request (or code block)
+has opted in: ReplicaRoutingMiddleware opts in safe-method requests, and
+use_replica() does so explicitly for reporting code. Writes, transactions,
+clients that wrote recently (read-your-writes pin) and replicas lagging
+behind REPLICA_MAX_LAG_SECONDS all fall back to the primary.
+"""
+
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_primary_pin'
+
+# Seconds of replay lag; 0 when the replica has replayed everything it received
+REPLICA_LAG_SQL = """
+    SELECT COALESCE(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END, 0)
+"""
+
+ANY_REPLICA = 'any-replica'
+
+# None reads from the primary; ANY_REPLICA allows a replica, which is then
+# replaced by the chosen alias so one request reads from one replica.
+_read_target = ContextVar('read_target', default=None)
+
+# alias -> (checked_at, healthy); refreshed every REPLICA_LAG_CHECK_INTERVAL seconds
+_replica_health = {}
+
+
+@contextmanager
+def use_replica():
+    """Allow reads in this block to go to a replica"""
+    token = _read_target.set(ANY_REPLICA)
+    try:
+        yield
+    finally:
+        _read_target.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Force reads in this block to the primary"""
+    token = _read_target.set(None)
+    try:
+        yield
+    finally:
+        _read_target.reset(token)
+
+
+def measure_replica_lag(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def is_replica_healthy(alias):
+    """Cached per process so the lag query runs at most once per interval"""
+    now = time.monotonic()
+    checked_at, healthy = _replica_health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return healthy
+
+    try:
+        lag = measure_replica_lag(alias)
+        healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            logger.warning('Replica %s lagging %.1fs behind, reading from primary', alias, lag)
+    except DatabaseError as exc:
+        logger.warning('Replica %s unavailable, reading from primary: %r', alias, exc)
+        healthy = False
+
+    _replica_health[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    """Pick a healthy replica at random, or None when none qualifies"""
+    healthy = [alias for alias in settings.DATABASE_REPLICAS if is_replica_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+class PrimaryReplicaRouter:
+    """Route opted-in reads to replicas and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Keep related lookups on the database the instance came from
+            return instance._state.db
+
+        target = _read_target.get()
+        if (target is None or not settings.DATABASE_REPLICAS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        if target == ANY_REPLICA:
+            target = choose_replica() or DEFAULT_DB_ALIAS
+            _read_target.set(target)
+        return target
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe-method requests read from replicas, and pin a client to the
+    primary for REPLICA_PIN_SECONDS after a successful write so it reads
+    its own writes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _read_target.set(self.get_read_target(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_target.reset(token)
+        self.pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _read_target.set(self.get_read_target(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_target.reset(token)
+        self.pin_after_write(request, response)
+        return response
+
+    def get_read_target(self, request):
+        if request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES:
+            return ANY_REPLICA
+        return None
+
+    def pin_after_write(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
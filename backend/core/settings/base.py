@@ -27,7 +27,6 @@ DJANGO_APPS = [
 THIRD_PARTY_APPS = [
     'rest_framework',
     'corsheaders',
-    'django_extensions',
     'drf_spectacular',
     'django_filters',
 ]
@@ -41,7 +40,12 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # Probes and static/docs assets skip everything below (CORS still applies)
+    'core.probes.ProbeMiddleware',
+    # Request ids and per-request timing records (probes are not logged)
+    'core.log.RequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,6 +88,27 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma separated host[:port] list, e.g. "replica1,replica2:5433".
+# Each gets a replica_N alias with the primary's credentials.
+DATABASE_REPLICAS = []
+for replica_index, replica_host in enumerate(
+    [host.strip() for host in config('DB_REPLICA_HOSTS', default='').split(',') if host.strip()],
+    start=1
+):
+    replica_name, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{replica_index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_name,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{replica_index}')
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)  # read-your-writes window
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=5.0, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5.0, cast=float)
+
 # Redis Cache Configuration
 CACHES = {
     'default': {
@@ -152,8 +177,15 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
+    # Decimals as JSON strings (default) or exact JSON numbers
+    'COERCE_DECIMAL_TO_STRING': config('API_DECIMALS_AS_STRINGS', default=True, cast=bool),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 25,
     'DEFAULT_FILTER_BACKENDS': [
@@ -182,7 +214,14 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
-# API Documentation
+# API Documentation (drf-spectacular); API_DOCS_ENABLED=0 leaves the docs
+# URLs, and in production the app, out entirely
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=True, cast=bool)
+# Pre-rendered OpenAPI schema (core/openapi.py), keyed by CODE_VERSION or,
+# when unset, a digest of the sources
+CODE_VERSION = config('CODE_VERSION', default='')
+OPENAPI_SCHEMA_DIR = config('OPENAPI_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'NextCRM API',
     'DESCRIPTION': 'Commodity Trading CRM System API',
@@ -247,7 +286,94 @@ X_FRAME_OPTIONS = 'DENY'
 # Rate Limiting
 RATELIMIT_USE_CACHE = 'default'
 
+# Load the URL resolver, ContentTypes, trade settings and exchange rates
+# when a WSGI/ASGI worker starts, before it takes traffic (core/startup.py)
+STARTUP_WARMUP = config('STARTUP_WARMUP', default=True, cast=bool)
+
+# Readiness probe (core/probes.py, /api/auth/ready/): results are reused for
+# CACHE_TIMEOUT seconds; a check slower than MAX_LATENCY_MS counts as failed
+READINESS_CACHE_TIMEOUT = config('READINESS_CACHE_TIMEOUT', default=5.0, cast=float)  # seconds
+READINESS_MAX_LATENCY_MS = config('READINESS_MAX_LATENCY_MS', default=500.0, cast=float)
+
+# Suspicious activity alerts (apps/authentication/detection.py): the first
+# alert per IP and rule in WINDOW is logged, then one in SAMPLE_EVERY
+# repeats (0 logs no repeats). Rows are written by a background thread
+# when SECURITY_LOG_ASYNC is set.
+SECURITY_ALERT_WINDOW = config('SECURITY_ALERT_WINDOW', default=300, cast=int)  # seconds
+SECURITY_ALERT_SAMPLE_EVERY = config('SECURITY_ALERT_SAMPLE_EVERY', default=100, cast=int)
+SECURITY_LOG_ASYNC = config('SECURITY_LOG_ASYNC', default=True, cast=bool)
+SECURITY_LOG_QUEUE_SIZE = config('SECURITY_LOG_QUEUE_SIZE', default=10000, cast=int)
+SECURITY_LOG_BATCH_SIZE = config('SECURITY_LOG_BATCH_SIZE', default=100, cast=int)
+
+# Retries for serialization failures and deadlocks in critical sections
+TRANSACTION_RETRY_ATTEMPTS = config('TRANSACTION_RETRY_ATTEMPTS', default=5, cast=int)
+TRANSACTION_RETRY_BASE_DELAY = config('TRANSACTION_RETRY_BASE_DELAY', default=0.02, cast=float)  # seconds
+
+# Dashboard: blocks run concurrently, each on its own DB connection
+DASHBOARD_MAX_WORKERS = config('DASHBOARD_MAX_WORKERS', default=5, cast=int)
+DASHBOARD_BLOCK_TIMEOUT = config('DASHBOARD_BLOCK_TIMEOUT', default=5.0, cast=float)  # seconds
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=30, cast=int)  # seconds
+
+# Currency that dashboard and report totals are converted to (see apps/nextcrm/fx.py)
+FX_BASE_CURRENCY = config('FX_BASE_CURRENCY', default='USD')
+
+# Contract reports (contracts/report/) are cached per filter combination
+CONTRACT_REPORT_CACHE_TIMEOUT = config('CONTRACT_REPORT_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+
+# List pages are cached per permission set and query string until a change
+# to the data they render (cache tags) or at most this long
+CONTRACT_LIST_CACHE_TIMEOUT = config('CONTRACT_LIST_CACHE_TIMEOUT', default=120, cast=int)  # seconds
+REFERENCE_LIST_CACHE_TIMEOUT = config('REFERENCE_LIST_CACHE_TIMEOUT', default=3600, cast=int)  # seconds
+
+# Response cache (core/response_cache.py): content codings stored per entry,
+# in preference order, and the smallest body worth compressing
+RESPONSE_CACHE_ENCODINGS = [
+    coding.strip() for coding in config('RESPONSE_CACHE_ENCODINGS', default='br,zstd,gzip').split(',')
+    if coding.strip()
+]
+RESPONSE_CACHE_MIN_COMPRESS_SIZE = config('RESPONSE_CACHE_MIN_COMPRESS_SIZE', default=1024, cast=int)  # bytes
+RESPONSE_CACHE_PERMISSIONS_TIMEOUT = config('RESPONSE_CACHE_PERMISSIONS_TIMEOUT', default=300, cast=int)  # seconds
+# Coalesced fills: stale entries are served this long past expiry while one
+# request holds the fill lock (at most LOCK_TIMEOUT); requests finding no
+# entry wait up to LOCK_WAIT for it. BETA scales early refresh (0 disables).
+RESPONSE_CACHE_STALE_TIMEOUT = config('RESPONSE_CACHE_STALE_TIMEOUT', default=300, cast=int)  # seconds
+RESPONSE_CACHE_LOCK_TIMEOUT = config('RESPONSE_CACHE_LOCK_TIMEOUT', default=30, cast=int)  # seconds
+RESPONSE_CACHE_LOCK_WAIT = config('RESPONSE_CACHE_LOCK_WAIT', default=5.0, cast=float)  # seconds
+RESPONSE_CACHE_EARLY_REFRESH_BETA = config('RESPONSE_CACHE_EARLY_REFRESH_BETA', default=1.0, cast=float)
+
 # Logging Configuration
+# Logging: loggers write to a queue in each process and a listener thread
+# writes the records to the JSON log file and the console (core/log.py).
+# Every worker process appends to the same file, so by default it is not
+# rotated in-process (concurrent rollovers lose records): rotate it with
+# logrotate, which WatchedFileHandler follows. With a single process,
+# LOG_MAX_BYTES > 0 rotates by size or LOG_ROTATE_WHEN ('midnight', 'H',
+# ...) by time, keeping LOG_BACKUP_COUNT files.
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_INFO_SAMPLE_RATE = config('LOG_INFO_SAMPLE_RATE', default=1.0, cast=float)  # share of INFO/DEBUG kept
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=0, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=10, cast=int)
+LOG_ROTATE_WHEN = config('LOG_ROTATE_WHEN', default='')
+
+LOG_FILE_HANDLER = {
+    'level': 'INFO',
+    'class': 'logging.handlers.WatchedFileHandler',
+    'filename': BASE_DIR / 'logs' / 'nextcrm.log',
+    'formatter': 'json',
+}
+if LOG_ROTATE_WHEN:
+    LOG_FILE_HANDLER.update({
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': LOG_ROTATE_WHEN,
+        'backupCount': LOG_BACKUP_COUNT,
+    })
+elif LOG_MAX_BYTES:
+    LOG_FILE_HANDLER.update({
+        'class': 'logging.handlers.RotatingFileHandler',
+        'maxBytes': LOG_MAX_BYTES,
+        'backupCount': LOG_BACKUP_COUNT,
+    })
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -260,32 +386,46 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
     },
-    'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'nextcrm.log',
-            'formatter': 'verbose',
+    'filters': {
+        'request_context': {
+            '()': 'core.log.RequestContextFilter',
         },
+        'sample_info': {
+            '()': 'core.log.InfoSampler',
+            'rate': LOG_INFO_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        # Only written to by the listener thread of 'queue'
+        'file': LOG_FILE_HANDLER,
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'queue': {
+            '()': 'core.log.QueueHandler',
+            'handlers': ['console', 'file'],
+            'queue_size': LOG_QUEUE_SIZE,
+            'filters': ['request_context', 'sample_info'],
+        },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'apps.authentication': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
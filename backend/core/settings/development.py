@@ -11,6 +11,7 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0', 'backend', 'nextcrm_backen
 
 # Development specific apps
 INSTALLED_APPS += [
+    'django_extensions',
     'debug_toolbar',
 ]
 
@@ -3,8 +3,6 @@ Production settings for NextCRM project.
 """
 
 from .base import *
-import sentry_sdk
-from sentry_sdk.integrations.django import DjangoIntegration
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -30,13 +28,40 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@nextcrm.com')
 
-# Database optimization for production
-DATABASES['default'].update({
-    'CONN_MAX_AGE': 60,
-    'OPTIONS': {
-        'OPTIONS': '-c default_transaction_isolation=serializable'
-    }
-})
+# Database connection pooling for production (psycopg 3 ConnectionPool).
+# Pooled connections are returned to the pool at the end of each request, so
+# CONN_MAX_AGE must stay 0; CONN_HEALTH_CHECKS makes the pool check a
+# connection before handing it out. Replicas get a pool of their own.
+STATEMENT_TIMEOUT_OPTION = f"-c statement_timeout={config('DB_STATEMENT_TIMEOUT_MS', default=30000, cast=int)}"
+# Requests run at READ COMMITTED; critical sections opt into locks or
+# SERIALIZABLE through apps.nextcrm.transactions.retry_on_conflict. Replicas
+# are hot standbys, which refuse SERIALIZABLE, so they are pinned to READ
+# COMMITTED even when the primary's database or role default (replicated to
+# the standbys) says otherwise.
+SESSION_OPTIONS = {
+    'default': STATEMENT_TIMEOUT_OPTION,
+    'replica': f'{STATEMENT_TIMEOUT_OPTION} -c default_transaction_isolation=read\\ committed',
+}
+for database_alias, database in DATABASES.items():
+    database.update({
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'options': SESSION_OPTIONS['replica' if database_alias in DATABASE_REPLICAS else 'default'],
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10.0, cast=float),  # seconds to wait for a free connection
+                'max_idle': config('DB_POOL_MAX_IDLE', default=300.0, cast=float),
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600.0, cast=float),
+                'name': f'nextcrm-{database_alias}',
+            },
+        },
+    })
+
+# Docs-only apps: the docs views are imported on first request either way
+if not API_DOCS_ENABLED:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'drf_spectacular']
 
 # Static files for production
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
@@ -44,6 +69,10 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 # Sentry Error Tracking (optional)
 SENTRY_DSN = config('SENTRY_DSN', default='')
 if SENTRY_DSN:
+    # Only imported when enabled: sentry_sdk and its integrations are slow to import
+    import sentry_sdk
+    from sentry_sdk.integrations.django import DjangoIntegration
+
     sentry_sdk.init(
         dsn=SENTRY_DSN,
         integrations=[DjangoIntegration()],
@@ -51,9 +80,10 @@ if SENTRY_DSN:
         send_default_pii=True
     )
 
-# Production logging
-LOGGING['handlers']['file']['level'] = 'WARNING'
+# Production logging; LOG_LEVEL=INFO adds request records (see LOG_INFO_SAMPLE_RATE)
+LOGGING['handlers']['file']['level'] = config('LOG_LEVEL', default='WARNING')
 LOGGING['handlers']['console']['level'] = 'ERROR'
+LOGGING['handlers']['console']['formatter'] = 'json'
 
 # Cache timeout for production
 CACHES['default']['TIMEOUT'] = 300  # 5 minutes
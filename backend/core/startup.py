@@ -0,0 +1,226 @@
+"""
+Worker startup: cache warming, lazily imported views, and the timings
+behind ``python manage.py profile_startup``.
+
+core/wsgi.py and core/asgi.py call warm() once the application is built,
+so the URL resolver (every URLconf and view module), ContentTypes, the
+trade settings snapshot and the exchange rate table are loaded before the
+worker accepts traffic instead of by its first requests
+(STARTUP_WARMUP). A failing step is logged and skipped; startup never
+fails on it. Database connections opened while warming are closed again,
+so a master that preloads the app (gunicorn --preload) does not hand
+them to its forked workers. ASGI servers such as uvicorn import the
+application inside their running event loop, where the ORM refuses to
+run, so there the steps run in a separate thread.
+
+lazy_view() keeps rarely used, import-heavy views (the API docs) out of
+warming and worker startup: their module is imported on first request.
+
+This module is imported before apps are loaded (by the profiler), so it
+only imports project modules inside functions.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import django
+from django.apps import AppConfig
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+def lazy_view(import_path, **initkwargs):
+    """View that imports the class-based view at import_path on its first request"""
+    view = None
+
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(import_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return dispatch
+
+
+def warm_url_resolver():
+    """Import every URLconf and view module and build the reverse lookup tables"""
+    from django.urls import get_resolver
+
+    return f'{len(get_resolver().reverse_dict)} url names'
+
+
+def warm_content_types():
+    from django.apps import apps
+    from django.contrib.contenttypes.models import ContentType
+
+    return f'{len(ContentType.objects.get_for_models(*apps.get_models()))} content types'
+
+
+def warm_trade_settings():
+    from apps.nextcrm import trade_settings
+
+    return f'{len(trade_settings.reload().values)} trade settings'
+
+
+def warm_rate_table():
+    from apps.nextcrm import fx
+
+    return f'{len(fx.get_rate_table().series)} currency pairs'
+
+
+WARMUPS = [
+    ('url resolver', warm_url_resolver),
+    ('content types', warm_content_types),
+    ('trade settings snapshot', warm_trade_settings),
+    ('exchange rate table', warm_rate_table),
+]
+
+
+def release_connections():
+    """Close the connections (and connection pools) warming opened"""
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        close_pool = getattr(connection, 'close_pool', None)
+        if close_pool is not None:
+            close_pool()
+
+
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def warm(force=False):
+    """
+    Run every warmup step unless STARTUP_WARMUP is off; returns
+    {step: (seconds, detail)} with (None, error) for failed steps
+    """
+    if not (force or settings.STARTUP_WARMUP):
+        return {}
+    if in_event_loop():
+        # Blocks the loop, but it is not serving requests yet
+        timings = {}
+        thread = threading.Thread(
+            target=lambda: timings.update(run_warmups()), name='startup-warmup'
+        )
+        thread.start()
+        thread.join()
+        return timings
+    return run_warmups()
+
+
+def run_warmups():
+    timings = {}
+    for name, step in WARMUPS:
+        started = time.perf_counter()
+        try:
+            detail = step()
+        except Exception as exc:
+            logger.warning('Startup warmup step %r failed', name, exc_info=True)
+            timings[name] = (None, exc.__class__.__name__)
+            continue
+        timings[name] = (time.perf_counter() - started, detail)
+    try:
+        release_connections()
+    except Exception:
+        logger.warning('Could not close the connections opened by the startup warmup', exc_info=True)
+    logger.info('Startup warmup: %s', ', '.join(
+        f'{name} {seconds * 1000:.0f} ms' for name, (seconds, _) in timings.items() if seconds is not None
+    ))
+    return timings
+
+
+def timed_setup():
+    """
+    django.setup() timing, per app, the import of its module and AppConfig,
+    of its models module, and its ready(); returns (seconds, {label: {phase: seconds}})
+    """
+    apps_timings = {}
+    original_create = AppConfig.create.__func__
+
+    def timed(config, method_name, phase):
+        method = getattr(config, method_name)
+
+        def run(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                apps_timings[config.label][phase] = time.perf_counter() - started
+
+        setattr(config, method_name, run)
+
+    def create(cls, entry):
+        started = time.perf_counter()
+        config = original_create(cls, entry)
+        apps_timings[config.label] = {'import': time.perf_counter() - started}
+        timed(config, 'import_models', 'models')
+        timed(config, 'ready', 'ready')
+        return config
+
+    AppConfig.create = classmethod(create)
+    try:
+        started = time.perf_counter()
+        django.setup()
+        return time.perf_counter() - started, apps_timings
+    finally:
+        AppConfig.create = classmethod(original_create)
+
+
+def profile():
+    """Startup phase timings of this (fresh) process, run under ``python -X importtime``"""
+    started = time.perf_counter()
+    settings.INSTALLED_APPS  # imports the settings module
+    settings_seconds = time.perf_counter() - started
+    setup_seconds, apps_timings = timed_setup()
+    warmups = {} if '--skip-warm' in sys.argv else warm(force=True)
+    return {
+        'settings': settings_seconds,
+        'setup': setup_seconds,
+        'apps': apps_timings,
+        'warm': warmups,
+    }
+
+
+def main():
+    """Entry point of the profile_startup child process: timings as JSON on stdout"""
+    json.dump(profile(), sys.stdout)
+
+
+def parse_importtime(output):
+    """
+    [(module, self seconds, cumulative seconds, depth)] from ``-X importtime``
+    output (stderr), skipping any other lines
+    """
+    modules = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    return modules
+
+
+def package_totals(modules):
+    """{top-level package: (self seconds summed over its modules, module count)}"""
+    totals = defaultdict(lambda: [0.0, 0])
+    for module, self_seconds, _, _ in modules:
+        total = totals[module.split('.')[0]]
+        total[0] += self_seconds
+        total[1] += 1
+    return {package: tuple(total) for package, total in totals.items()}
@@ -6,19 +6,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+
+from core.openapi import schema_view
+from core.probes import ping_payload
+from core.startup import lazy_view
 
 def ping_view(request):
-    """Simple ping endpoint for connectivity testing"""
-    return JsonResponse({
-        'status': 'ok',
-        'message': 'NextCRM Backend is running',
-        'version': '1.0.0'
-    })
+    """Simple ping endpoint for connectivity testing (answered by ProbeMiddleware)"""
+    return JsonResponse(ping_payload(request))
 
 urlpatterns = [
     # Admin
@@ -27,16 +22,22 @@ urlpatterns = [
     # Ping endpoint for connectivity testing
     path('ping/', ping_view, name='ping'),
     
-    # API Documentation
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
-    
     # API Endpoints
     path('api/auth/', include('apps.authentication.urls')),
     path('api/', include('apps.nextcrm.urls')),
 ]
 
+# API Documentation; the docs views are imported on their first request
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [
+        # Pre-rendered per code version; regenerate with generate_openapi_schema
+        path('api/schema/', schema_view, name='schema'),
+        path('api/docs/', lazy_view('drf_spectacular.views.SpectacularSwaggerView', url_name='schema'),
+             name='swagger-ui'),
+        path('api/redoc/', lazy_view('drf_spectacular.views.SpectacularRedocView', url_name='schema'),
+             name='redoc'),
+    ]
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -13,4 +13,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings.production')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Load caches before the worker takes traffic (STARTUP_WARMUP)
+from core.startup import warm  # noqa: E402
+
+warm()
\ No newline at end of file